@@ -24,7 +24,8 @@ from tools import (
     nebula_description,
     opensearch_description,
     dynamodb_description,
-    search_description
+    search_description,
+    similar_funds_description
 )
 from memory import FundAdvisorMemorySystem
 
@@ -105,7 +106,7 @@ fund_recommender = BedrockLLMAgent(BedrockLLMAgentOptions(
     model_id="anthropic.claude-3-sonnet-20240229-v1:0",
     streaming=True,
     tool_config={
-        'tool': nebula_description + dynamodb_description,
+        'tool': nebula_description + dynamodb_description + similar_funds_description,
         'toolMaxRecursions': 5,
         'useToolHandler': tool_handler
     }
@@ -125,6 +126,7 @@ fund_recommender.set_system_prompt("""
 - 根据用户的风险偏好和投资需求，生成查询知识图谱的SQL语句
 - 使用Nebula工具查询基金知识图谱，获取符合条件的基金产品
 - 分析基金的历史表现、风险指标和投资策略
+- 用户询问某只基金的替代品或希望分散持仓时，使用相似基金工具查找持仓相似的基金，并说明相似度和持仓重合度
 - 推荐最适合用户的基金产品组合
 - 解释推荐理由和预期收益风险
 
@@ -1,6 +1,7 @@
 from typing import Dict, List, Any
 import asyncio
 import json
+import os
 import random
 from datetime import datetime
 import boto3
@@ -122,9 +123,37 @@ search_description = [{
     }
 }]
 
+# 相似基金工具描述
+similar_funds_description = [{
+    "toolSpec": {
+        "name": "query_similar_funds",
+        "description": "根据最新一期持仓查找与指定基金持仓最相似的基金，用于推荐替代基金",
+        "inputSchema": {
+            "json": {
+                "type": "object",
+                "properties": {
+                    "fund_id": {
+                        "type": "string",
+                        "description": "基金代码"
+                    },
+                    "top_k": {
+                        "type": "number",
+                        "description": "返回的相似基金数量，默认为5，最多为每只基金保存的相似基金数（默认10只）"
+                    },
+                    "min_overlap": {
+                        "type": "number",
+                        "description": "最低持仓重合度（0到1之间的小数，如0.3表示至少30%的持仓重合），默认不限制；只在每只基金保存的最相似基金中筛选，不会返回相似度排名之外的基金"
+                    }
+                },
+                "required": ["fund_id"]
+            }
+        }
+    }
+}]
+
 # 模拟数据
 
-# 模拟基金数据
+# 模拟基金数据，风险指标文件中有该基金时，波动率、夏普比率和最大回撤以根据净值计算的值为准
 fund_data = {
     "000001": {
         "fund_name": "华夏成长混合",
@@ -253,6 +282,129 @@ fund_data = {
     }
 }
 
+# 基金风险指标文件，由fund_data_project中的risk模块根据净值计算生成
+FUND_RISK_METRICS_FILE = os.environ.get(
+    "FUND_RISK_METRICS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fund_data_project", "data", "fund_risk_metrics.json")
+)
+
+# 基金相似度文件，由fund_data_project中的similarity模块根据持仓计算生成
+FUND_SIMILARITY_FILE = os.environ.get(
+    "FUND_SIMILARITY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fund_data_project", "data", "fund_similarity.json")
+)
+
+# 已加载的风险指标和相似基金，文件修改后重新加载
+_risk_metrics_cache = {"mtime": None, "data": {}}
+_similarity_cache = {"mtime": None, "data": {}}
+
+# 相似度文件中没有记录每只基金保存的相似基金数时使用的默认值，与similarity模块的默认值相同
+DEFAULT_SIMILAR_FUNDS_TOP_K = 10
+
+def load_cached_json(file_path: str, cache: Dict[str, Any], description: str) -> Dict[str, Any]:
+    """
+    加载JSON数据文件，文件修改时间未变时使用缓存
+    
+    参数:
+    - file_path: 文件路径
+    - cache: 该文件的缓存，包括mtime和data
+    - description: 文件说明，用于错误信息
+    
+    返回:
+    - 文件内容；文件不存在时返回空字典，无法读取时返回上次加载的内容
+    """
+    try:
+        mtime = os.path.getmtime(file_path)
+    except OSError:
+        return {}
+    if cache["mtime"] != mtime:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                cache["data"] = json.load(f)
+            cache["mtime"] = mtime
+        except (OSError, ValueError) as e:
+            print(f"读取{description}文件失败: {e}")
+            return cache["data"]
+    return cache["data"]
+
+def load_fund_risk_metrics() -> Dict[str, Any]:
+    """
+    加载基金风险指标文件
+    
+    返回:
+    - 风险指标数据，包括as_of和各基金各区间的指标；文件不存在或无法读取时返回空字典
+    """
+    return load_cached_json(FUND_RISK_METRICS_FILE, _risk_metrics_cache, "基金风险指标")
+
+def load_fund_similarity() -> Dict[str, Any]:
+    """
+    加载基金相似度文件
+    
+    返回:
+    - 相似基金数据，包括各基金按相似度排序的相似基金、相似度、持仓重合度和共同持仓数；文件不存在时返回空字典
+    """
+    return load_cached_json(FUND_SIMILARITY_FILE, _similarity_cache, "基金相似度")
+
+def get_similar_funds_limit() -> int:
+    """
+    获取相似度文件中每只基金保存的相似基金数，即get_similar_funds最多能返回的基金数
+    """
+    return int(load_fund_similarity().get("top_k") or DEFAULT_SIMILAR_FUNDS_TOP_K)
+
+def apply_fund_risk_metrics(fund_id: str, fund: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    用根据净值计算的风险指标替换基金数据中的波动率、夏普比率和最大回撤
+    
+    参数:
+    - fund_id: 基金代码
+    - fund: 基金数据
+    
+    返回:
+    - 更新后的基金数据副本；没有该基金的风险指标时返回原数据
+    """
+    risk_data = load_fund_risk_metrics()
+    windows = risk_data.get("funds", {}).get(fund_id)
+    if not windows:
+        return fund
+    
+    # 优先使用近1年的指标，成立不足1年的基金使用成立以来的指标
+    metrics = windows.get("1y") or windows.get("inception") or {}
+    result = dict(fund)
+    for key in ["volatility", "sharpe_ratio", "sortino_ratio", "max_drawdown", "calmar_ratio"]:
+        if metrics.get(key) is not None:
+            result[key] = metrics[key]
+    result["risk_metrics"] = windows
+    result["risk_metrics_as_of"] = risk_data.get("as_of")
+    return result
+
+def get_similar_funds(fund_id: str, top_k: int = 5, min_overlap: float = None) -> List[Dict[str, Any]]:
+    """
+    获取与指定基金持仓最相似的基金
+    
+    参数:
+    - fund_id: 基金代码
+    - top_k: 返回的相似基金数量，超过get_similar_funds_limit()时按该值返回
+    - min_overlap: 最低持仓重合度（小数），None表示不限制；只在保存的最相似基金中筛选，
+      重合度满足条件但相似度排名在保存范围之外的基金不会返回
+    
+    返回:
+    - 相似基金列表，按相似度从高到低排序；有该基金数据时附带基金名称、类型、风险等级和风险指标
+    """
+    top_k = min(top_k, get_similar_funds_limit())
+    similar_funds = []
+    for item in load_fund_similarity().get("funds", {}).get(fund_id, []):
+        if min_overlap is not None and item["overlap"] < min_overlap:
+            continue
+        similar = dict(item)
+        if item["fund_id"] in fund_data:
+            fund = apply_fund_risk_metrics(item["fund_id"], fund_data[item["fund_id"]])
+            for key in ["fund_name", "fund_type", "risk_level", "volatility", "sharpe_ratio", "max_drawdown"]:
+                similar[key] = fund.get(key)
+        similar_funds.append(similar)
+        if len(similar_funds) >= top_k:
+            break
+    return similar_funds
+
 # 模拟用户数据
 user_data = {
     "user123": {
@@ -482,6 +634,18 @@ async def tool_handler(response, conversation):
                         "content": [{"text": tool_response}],
                     }
                 })
+            elif tool_use_name == "query_similar_funds":
+                tool_response = await query_similar_funds(
+                    tool_use_block["input"].get("fund_id", ""),
+                    tool_use_block["input"].get("top_k", 5),
+                    tool_use_block["input"].get("min_overlap")
+                )
+                tool_results.append({
+                    "toolResult": {
+                        "toolUseId": tool_use_block["toolUseId"],
+                        "content": [{"text": tool_response}],
+                    }
+                })
             elif tool_use_name == "search_financial_info":
                 tool_response = await search_financial_info(
                     tool_use_block["input"].get("query", ""),
@@ -530,8 +694,8 @@ async def query_nebula_knowledge_graph(query: str) -> str:
         "results": []
     }
     
-    # 根据查询类型返回不同的结果
-    if "match (f:fund)" in query:
+    # 根据查询类型返回不同的结果，关系查询和特定基金查询也以match (f:fund)开头，需先排除
+    if "match (f:fund)" in query and "match (f:fund)-" not in query and "match (f:fund {" not in query:
         # 基金查询
         risk_level = None
         fund_type = None
@@ -592,6 +756,7 @@ async def query_nebula_knowledge_graph(query: str) -> str:
         performances = []
         
         for fund_id, fund in fund_data.items():
+            fund = apply_fund_risk_metrics(fund_id, fund)
             performances.append({
                 "fund_id": fund_id,
                 "fund_name": fund["fund_name"],
@@ -600,7 +765,10 @@ async def query_nebula_knowledge_graph(query: str) -> str:
                 "annual_return_5y": fund["annual_return"]["5y"],
                 "volatility": fund["volatility"],
                 "sharpe_ratio": fund["sharpe_ratio"],
-                "max_drawdown": fund["max_drawdown"]
+                "max_drawdown": fund["max_drawdown"],
+                "sortino_ratio": fund.get("sortino_ratio"),
+                "calmar_ratio": fund.get("calmar_ratio"),
+                "risk_metrics_as_of": fund.get("risk_metrics_as_of")
             })
         
         result["results"] = performances
@@ -614,7 +782,10 @@ async def query_nebula_knowledge_graph(query: str) -> str:
                 break
         
         if fund_id and fund_id in fund_data:
-            result["results"] = [fund_data[fund_id]]
+            fund = dict(apply_fund_risk_metrics(fund_id, fund_data[fund_id]))
+            # 附带持仓最相似的基金，供推荐替代基金
+            fund["similar_funds"] = get_similar_funds(fund_id)
+            result["results"] = [fund]
         else:
             result["status"] = "error"
             result["message"] = "未找到指定基金"
@@ -645,6 +816,47 @@ Nebula知识图谱查询结果
     
     return result_str
 
+# 查询相似基金
+async def query_similar_funds(fund_id: str, top_k: int = 5, min_overlap: float = None) -> str:
+    """
+    根据持仓查找与指定基金最相似的基金
+    
+    参数:
+    - fund_id: 基金代码
+    - top_k: 返回的相似基金数量，默认为5
+    - min_overlap: 最低持仓重合度（小数），默认为None表示不限制
+    
+    返回:
+    - 相似基金（字符串格式）
+    """
+    similarity_data = load_fund_similarity()
+    limit = get_similar_funds_limit()
+    top_k = int(top_k)
+    if top_k < 1:
+        return f"参数错误: top_k必须为正整数，当前为 {top_k}"
+    if min_overlap is not None and not 0 <= min_overlap <= 1:
+        return f"参数错误: min_overlap必须在0到1之间，当前为 {min_overlap}"
+    similar_funds = get_similar_funds(fund_id, top_k, min_overlap)
+    status = "success" if fund_id in similarity_data.get("funds", {}) else "error"
+    
+    notes = [f"每只基金只保存了相似度最高的 {limit} 只基金，持仓重合度筛选只在其中进行"]
+    if top_k > limit:
+        notes.append(f"请求的 {top_k} 只超过保存的数量，最多返回 {limit} 只")
+    
+    result_str = f"""
+相似基金查询结果
+时间戳: {datetime.now().isoformat()}
+基金代码: {fund_id}
+状态: {status}
+数据更新时间: {similarity_data.get('last_update')}
+说明: {'；'.join(notes)}
+
+相似基金（相似度为持仓权重的余弦相似度，持仓重合度为两只基金共同持有部分占披露持仓的比例）:
+{json.dumps(similar_funds, ensure_ascii=False, indent=2) if status == "success" else "未找到该基金的持仓相似度数据"}
+"""
+    
+    return result_str
+
 # 查询OpenSearch金融知识
 async def query_opensearch_knowledge(query: str, size: int = 5) -> str:
     """
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+AKShare接口缓存模块，将接口返回结果压缩保存到本地磁盘
+按接口设置缓存有效期，并支持只读取缓存的离线回放模式
+"""
+import os
+import gzip
+import json
+import time
+import pickle
+import hashlib
+import threading
+from metrics import metrics, get_data_bytes
+
+# 默认缓存目录
+CACHE_DIR = "./cache"
+
+# 未单独配置的接口的缓存有效期（秒）
+DEFAULT_TTL = 6 * 3600
+
+# 各接口的缓存有效期（秒）：净值每天更新，持仓、行业配置按季度披露，基金经理信息变化较慢
+ENDPOINT_TTLS = {
+    'fund_name_em': 24 * 3600,
+    'fund_open_fund_info_em': 6 * 3600,
+    'fund_etf_hist_em': 6 * 3600,
+    'fund_open_fund_rank_em': 12 * 3600,
+    'fund_portfolio_hold_em': 30 * 24 * 3600,
+    'fund_portfolio_bond_hold_em': 30 * 24 * 3600,
+    'fund_portfolio_industry_allocation_em': 30 * 24 * 3600,
+    'fund_manager_em': 7 * 24 * 3600,
+}
+
+
+class CacheMissError(Exception):
+    """离线模式下请求的数据不在缓存中"""
+
+
+class CachedAkshare:
+    """
+    带本地缓存的AKShare接口代理，用法与akshare模块相同，如 ak.fund_name_em()
+    
+    参数:
+        cache_dir (str): 缓存目录，默认为CACHE_DIR
+        ttls (dict): 接口名称到缓存有效期（秒）的映射，默认为None表示使用ENDPOINT_TTLS
+        offline (bool): 是否为离线回放模式，只读取缓存且忽略有效期，默认为False
+        enabled (bool): 是否启用缓存，默认为True
+    """
+    
+    def __init__(self, cache_dir=CACHE_DIR, ttls=None, offline=False, enabled=True):
+        self.cache_dir = cache_dir
+        self.ttls = dict(ENDPOINT_TTLS if ttls is None else ttls)
+        self.offline = offline
+        self.enabled = enabled
+        self.backend = None
+        self.lock = threading.Lock()
+    
+    def configure(self, cache_dir=None, offline=None, enabled=None, ttls=None):
+        """
+        修改缓存配置
+        
+        参数:
+            cache_dir (str): 缓存目录，默认为None表示不修改
+            offline (bool): 是否为离线回放模式，默认为None表示不修改
+            enabled (bool): 是否启用缓存，默认为None表示不修改
+            ttls (dict): 要修改的接口缓存有效期（秒），默认为None表示不修改
+        """
+        if cache_dir is not None:
+            self.cache_dir = cache_dir
+        if offline is not None:
+            self.offline = offline
+        if enabled is not None:
+            self.enabled = enabled
+        if ttls:
+            self.ttls.update(ttls)
+    
+    def get_backend(self):
+        """
+        获取实际的akshare模块，首次调用时才导入
+        
+        返回:
+            module: akshare模块
+        """
+        with self.lock:
+            if self.backend is None:
+                import akshare
+                self.backend = akshare
+            return self.backend
+    
+    def get_cache_file(self, name, args, kwargs):
+        """
+        根据接口名称和参数计算缓存文件路径
+        
+        参数:
+            name (str): 接口名称
+            args (tuple): 位置参数
+            kwargs (dict): 关键字参数
+        
+        返回:
+            str: 缓存文件路径
+        """
+        key_text = json.dumps([name, list(args), kwargs], ensure_ascii=False, sort_keys=True, default=str)
+        key = hashlib.sha1(key_text.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name, f"{key}.pkl.gz")
+    
+    def is_cached(self, name, *args, **kwargs):
+        """
+        判断调用结果是否可以直接从缓存读取
+        
+        参数:
+            name (str): 接口名称
+            *args, **kwargs: 接口参数
+        
+        返回:
+            bool: 缓存存在且未过期（离线模式下只要求存在）时返回True
+        """
+        if not self.enabled:
+            return False
+        cache_file = self.get_cache_file(name, args, kwargs)
+        if not os.path.exists(cache_file):
+            return False
+        if self.offline:
+            return True
+        return time.time() - os.path.getmtime(cache_file) < self.ttls.get(name, DEFAULT_TTL)
+    
+    def call(self, name, *args, **kwargs):
+        """
+        调用AKShare接口，缓存有效时直接返回缓存结果
+        
+        参数:
+            name (str): 接口名称
+            *args, **kwargs: 接口参数
+        
+        返回:
+            接口的返回值
+        """
+        if not self.enabled:
+            return self.fetch(name, *args, **kwargs)
+        
+        cache_file = self.get_cache_file(name, args, kwargs)
+        if self.is_cached(name, *args, **kwargs):
+            try:
+                with metrics.track('akshare_request', 'akshare_requests_total', endpoint=name, source='cache') as op:
+                    with gzip.open(cache_file, 'rb') as f:
+                        result = pickle.load(f)
+                    op['rows'] = len(result) if hasattr(result, '__len__') else None
+                    op['bytes'] = get_data_bytes(result)
+                return result
+            except Exception as e:
+                print(f"读取缓存文件 {cache_file} 失败: {e}")
+        
+        if self.offline:
+            raise CacheMissError(f"离线模式下缓存中没有 {name}{args or ''}{kwargs or ''} 的数据")
+        
+        result = self.fetch(name, *args, **kwargs)
+        
+        # 先写临时文件再替换，避免并发读取到不完整的缓存
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_file, 'wb', compresslevel=6) as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        return result
+    
+    def fetch(self, name, *args, **kwargs):
+        """
+        直接调用AKShare接口，不读写缓存，记录耗时、记录数和字节数
+        
+        参数:
+            name (str): 接口名称
+            *args, **kwargs: 接口参数
+        
+        返回:
+            接口的返回值
+        """
+        with metrics.track('akshare_request', 'akshare_requests_total', endpoint=name, source='network') as op:
+            result = getattr(self.get_backend(), name)(*args, **kwargs)
+            op['rows'] = len(result) if hasattr(result, '__len__') else None
+            op['bytes'] = get_data_bytes(result)
+        return result
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        
+        def cached_call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        
+        cached_call.__name__ = name
+        cached_call.is_cached = lambda *args, **kwargs: self.is_cached(name, *args, **kwargs)
+        return cached_call
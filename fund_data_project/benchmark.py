@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基金数据爬取性能测试工具
+使用模拟的AKShare接口代替网络请求，在临时目录中运行净值、持仓和行业配置数据的获取流程，
+统计每秒处理基金数、写入字节数、内存峰值以及抓取、临时文件写入、进度记录和合并各阶段的耗时
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 每个季度披露的股票持仓、债券持仓和行业配置条数
+STOCKS_PER_QUARTER = 10
+BONDS_PER_QUARTER = 5
+INDUSTRIES_PER_QUARTER = 8
+
+INDUSTRY_NAMES = ['制造业', '金融业', '信息传输、软件和信息技术服务业', '房地产业', '批发和零售业',
+                  '采矿业', '交通运输、仓储和邮政业', '电力、热力、燃气及水生产和供应业',
+                  '卫生和社会工作', '农、林、牧、渔业']
+
+
+class SimulatedAkshare:
+    """
+    模拟的AKShare接口，返回与真实接口列名一致的数据
+    
+    同一接口和参数每次返回相同的数据，便于测试增量更新和内容哈希；
+    可以设置每次调用的延迟、失败概率和服务端限流阈值
+    
+    参数:
+        num_funds (int): 基金数量
+        nav_days (int): 每只基金的净值天数
+        latency (float): 每次调用的平均延迟（秒）
+        jitter (float): 延迟的随机波动范围（秒）
+        error_rate (float): 每次调用失败的概率
+        throttle_rate (float): 每秒最多接受的调用次数，超过时调用失败，默认为None表示不限流
+        seed (int): 随机数种子
+    """
+    
+    def __init__(self, num_funds=1000, nav_days=750, latency=0.05, jitter=0.02, error_rate=0.0,
+                 throttle_rate=None, seed=0):
+        self.num_funds = num_funds
+        self.nav_days = nav_days
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self.fund_codes = [f"{i:06d}" for i in range(1, num_funds + 1)]
+        self.recent_calls = deque()
+        self.call_count = 0
+        self.error_count = 0
+        self.throttled_count = 0
+        self.lock = threading.Lock()
+        self.random = np.random.default_rng(seed)
+    
+    def get_rng(self, *keys):
+        """根据接口参数生成固定的随机数发生器，使相同参数返回相同数据"""
+        key = '|'.join(str(key) for key in keys)
+        return np.random.default_rng([self.seed, zlib.crc32(key.encode('utf-8'))])
+    
+    def simulate_request(self, allow_failure=True):
+        """
+        模拟网络延迟、随机失败和服务端限流
+        
+        参数:
+            allow_failure (bool): 是否模拟随机失败和限流，基金列表接口不模拟失败，避免整个测试中止
+        """
+        with self.lock:
+            self.call_count += 1
+            now = time.monotonic()
+            if self.throttle_rate and allow_failure:
+                while self.recent_calls and now - self.recent_calls[0] > 1.0:
+                    self.recent_calls.popleft()
+                if len(self.recent_calls) >= self.throttle_rate:
+                    self.throttled_count += 1
+                    raise ConnectionError("请求过于频繁，请稍后再试")
+                self.recent_calls.append(now)
+            failed = allow_failure and self.random.random() < self.error_rate
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        
+        time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.error_count += 1
+            raise ConnectionError("模拟的接口调用失败")
+    
+    def fund_name_em(self):
+        self.simulate_request(allow_failure=False)
+        rng = self.get_rng('fund_name_em')
+        types = rng.choice(['混合型-偏股', '股票型', '债券型-长债', '指数型-股票', '货币型-普通货币'],
+                           size=self.num_funds, p=[0.35, 0.2, 0.25, 0.15, 0.05])
+        names = [f"模拟基金{code}" + ('ETF' if fund_type.startswith('指数') and i % 2 else '')
+                 for i, (code, fund_type) in enumerate(zip(self.fund_codes, types))]
+        return pd.DataFrame({
+            '基金代码': self.fund_codes,
+            '拼音缩写': [f"MNJJ{code}" for code in self.fund_codes],
+            '基金简称': names,
+            '基金类型': types,
+            '拼音全称': [f"MONIJIJIN{code}" for code in self.fund_codes],
+        })
+    
+    def fund_open_fund_info_em(self, symbol, indicator="单位净值走势"):
+        self.simulate_request()
+        rng = self.get_rng('nav', symbol)
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.nav_days)
+        returns = rng.normal(0.0003, 0.012, len(dates))
+        nav = np.round(np.cumprod(1 + returns), 4)
+        return pd.DataFrame({
+            '净值日期': dates.date,
+            '单位净值': nav,
+            '日增长率': np.round(returns * 100, 2),
+        })
+    
+    def fund_etf_hist_em(self, symbol, period="daily", start_date="20000101", end_date="20500101", adjust=""):
+        self.simulate_request()
+        rng = self.get_rng('etf', symbol)
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.nav_days)
+        close = np.round(np.cumprod(1 + rng.normal(0.0003, 0.015, len(dates))), 3)
+        return pd.DataFrame({
+            '日期': dates.strftime('%Y-%m-%d'),
+            '开盘': close,
+            '收盘': close,
+            '最高': close,
+            '最低': close,
+            '成交量': rng.integers(1000, 100000, len(dates)),
+            '成交额': np.round(rng.random(len(dates)) * 1e7, 2),
+        })
+    
+    def fund_portfolio_hold_em(self, symbol, date="2024"):
+        self.simulate_request()
+        rng = self.get_rng('stock', symbol, date)
+        rows = []
+        for quarter in range(1, 5):
+            for i, stock in enumerate(rng.choice(3000, STOCKS_PER_QUARTER, replace=False)):
+                rows.append([i + 1, f"{600000 + stock:06d}", f"股票{stock}", round(rng.random() * 10, 2),
+                             round(rng.random() * 1000, 2), round(rng.random() * 1e5, 2),
+                             f"{date}年{quarter}季度股票投资明细"])
+        return pd.DataFrame(rows, columns=['序号', '股票代码', '股票名称', '占净值比例', '持股数', '持仓市值', '季度'])
+    
+    def fund_portfolio_bond_hold_em(self, symbol, date="2024"):
+        self.simulate_request()
+        rng = self.get_rng('bond', symbol, date)
+        rows = []
+        for quarter in range(1, 5):
+            for i, bond in enumerate(rng.choice(2000, BONDS_PER_QUARTER, replace=False)):
+                rows.append([i + 1, f"{19000 + bond:06d}", f"债券{bond}", round(rng.random() * 5, 2),
+                             round(rng.random() * 1e5, 2), f"{date}年{quarter}季度债券投资明细"])
+        return pd.DataFrame(rows, columns=['序号', '债券代码', '债券名称', '占净值比例', '持仓市值', '季度'])
+    
+    def fund_portfolio_industry_allocation_em(self, symbol, date="2024"):
+        self.simulate_request()
+        rng = self.get_rng('industry', symbol, date)
+        rows = []
+        for quarter, month_day in zip(range(1, 5), ['03-31', '06-30', '09-30', '12-31']):
+            for i, industry in enumerate(rng.choice(INDUSTRY_NAMES, INDUSTRIES_PER_QUARTER, replace=False)):
+                rows.append([i + 1, industry, round(rng.random() * 30, 2), round(rng.random() * 1e6, 2),
+                             f"{date}-{month_day}"])
+        return pd.DataFrame(rows, columns=['序号', '行业类别', '占净值比例', '市值', '截止时间'])
+    
+    def fund_manager_em(self):
+        self.simulate_request()
+        return pd.DataFrame({
+            '序号': range(1, self.num_funds + 1),
+            '姓名': [f"经理{i % 500}" for i in range(self.num_funds)],
+            '所属公司': [f"基金公司{i % 50}" for i in range(self.num_funds)],
+            '现任基金代码': self.fund_codes,
+            '累计从业时间': [(i * 37) % 5000 for i in range(self.num_funds)],
+        })
+    
+    def fund_open_fund_rank_em(self, symbol="全部"):
+        self.simulate_request()
+        rng = self.get_rng('rank')
+        return pd.DataFrame({
+            '序号': range(1, self.num_funds + 1),
+            '基金代码': self.fund_codes,
+            '基金简称': [f"模拟基金{code}" for code in self.fund_codes],
+            '近1年': np.round(rng.normal(5, 15, self.num_funds), 2),
+            '近3年': np.round(rng.normal(10, 25, self.num_funds), 2),
+        })
+
+
+class PhaseTimer:
+    """
+    阶段耗时统计，通过替换模块中的函数累计各阶段的耗时，线程安全
+    
+    并发执行的阶段累计的是各线程的耗时之和，可能大于墙钟时间
+    """
+    
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.patched = []
+    
+    def add(self, phase, seconds):
+        with self.lock:
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+    
+    def wrap(self, owner, name, phase):
+        """
+        替换owner的name属性，使每次调用的耗时计入phase
+        
+        参数:
+            owner: 模块或类
+            name (str): 函数或方法名称
+            phase (str): 阶段名称
+        """
+        original = getattr(owner, name)
+        
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        
+        timed.__name__ = getattr(original, '__name__', name)
+        setattr(owner, name, timed)
+        self.patched.append((owner, name, original))
+    
+    def restore(self):
+        """恢复所有被替换的函数"""
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+
+
+def get_directory_size(path):
+    """
+    计算目录中所有文件的总字节数，同一文件的多个硬链接只计算一次
+    
+    参数:
+        path (str): 文件或目录路径
+    
+    返回:
+        int: 总字节数
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    
+    total = 0
+    seen = set()
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            stat = os.stat(os.path.join(root, file_name))
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            total += stat.st_size
+    return total
+
+
+def get_peak_rss_mb():
+    """
+    获取进程的内存峰值（MB）
+    
+    返回:
+        float: 内存峰值，当前平台不支持时返回None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上单位为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(args):
+    """
+    在临时目录中运行一次性能测试
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+    
+    返回:
+        dict: 性能测试结果
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='fund_benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    if project_dir not in sys.path:
+        sys.path.insert(0, project_dir)
+    
+    # fund_crawler在导入时创建相对路径的进度和临时数据目录，需要先切换到工作目录
+    original_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        import fund_crawler
+        import fetch_engine
+        
+        simulator = SimulatedAkshare(num_funds=args.funds, nav_days=args.nav_days, latency=args.latency,
+                                     jitter=args.jitter, error_rate=args.error_rate,
+                                     throttle_rate=args.throttle_rate, seed=args.seed)
+        fund_crawler.ak.backend = simulator
+        fund_crawler.configure_akshare_cache(cache_dir=os.path.join(work_dir, 'cache'), enabled=args.cache)
+        fund_crawler.RETRY_MAX_WAIT = args.retry_wait
+        
+        timer = PhaseTimer()
+        timer.wrap(fetch_engine.FetchEngine, 'call', '抓取')
+        timer.wrap(fund_crawler, 'save_temp_data', '临时文件写入')
+        timer.wrap(fund_crawler, 'merge_temp_data', '合并')
+        for name in ('append', 'sync', 'compact', 'close'):
+            timer.wrap(fund_crawler.ProgressJournal, name, '进度记录')
+        timer.wrap(fund_crawler, 'get_remaining_codes', '进度记录')
+        
+        data_dir = os.path.join(work_dir, 'data')
+        os.makedirs(data_dir, exist_ok=True)
+        extension = {'csv': 'csv', 'parquet': 'parquet'}.get(args.output)
+        db_name = os.path.join(work_dir, 'fund_data.db') if args.output == 'sqlite' else None
+        
+        def target(name):
+            if db_name:
+                return {'output_file': None, 'db_name': db_name, 'table_name': name}
+            return {'output_file': os.path.join(data_dir, f"{name}.{extension}"), 'db_name': None, 'table_name': None}
+        
+        crawls = {
+            'nav': lambda engine: fund_crawler.get_fund_nav_info(
+                start_date="20000101", incremental=args.incremental, engine=engine, return_df=False,
+                **target('fund_nav_info')),
+            'position': lambda engine: fund_crawler.get_fund_position_info(
+                year=args.year, incremental=args.incremental, engine=engine, return_df=False,
+                **target('fund_position_info')),
+            'industry': lambda engine: fund_crawler.get_fund_industry_allocation(
+                year=args.year, incremental=args.incremental, engine=engine, return_df=False,
+                **target('fund_industry_allocation')),
+        }
+        
+        engine = fund_crawler.create_fetch_engine(max_workers=args.workers, rate_limit=args.rate_limit,
+                                                  global_rate_limit=args.global_rate_limit)
+        start_time = time.perf_counter()
+        fund_crawler.get_fund_universe(refresh=True)
+        module_results = {}
+        for module in args.modules:
+            module_start = time.perf_counter()
+            rows = crawls[module](engine)
+            module_results[module] = {
+                'seconds': time.perf_counter() - module_start,
+                'rows': int(rows) if rows is not None else 0,
+                'funds': len(fund_crawler.get_universe_codes(fund_crawler.TASK_FUND_CATEGORIES.get(module)) or []),
+            }
+        total_seconds = time.perf_counter() - start_time
+        timer.restore()
+        
+        bytes_written = {
+            'temp_data': get_directory_size(fund_crawler.TEMP_DATA_DIR),
+            'data': get_directory_size(data_dir) + (get_directory_size(db_name) if db_name and os.path.exists(db_name) else 0),
+            'progress': get_directory_size(fund_crawler.PROGRESS_DIR),
+        }
+        total_funds = sum(result['funds'] for result in module_results.values())
+        results = {
+            'funds': args.funds,
+            'modules': module_results,
+            'total_seconds': total_seconds,
+            'funds_per_second': total_funds / total_seconds if total_seconds > 0 else 0.0,
+            'bytes_written': bytes_written,
+            'peak_rss_mb': get_peak_rss_mb(),
+            'phase_seconds': timer.totals,
+            'api_calls': simulator.call_count,
+            'api_errors': simulator.error_count,
+            'api_throttled': simulator.throttled_count,
+            'work_dir': work_dir,
+        }
+    finally:
+        os.chdir(original_dir)
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return results
+
+
+def print_results(results):
+    """打印性能测试结果"""
+    print("\n性能测试结果:")
+    print(f"  基金数: {results['funds']}，总耗时 {results['total_seconds']:.2f} 秒，"
+          f"平均 {results['funds_per_second']:.1f} 只基金/秒")
+    for module, result in results['modules'].items():
+        funds_per_second = result['funds'] / result['seconds'] if result['seconds'] > 0 else 0.0
+        print(f"  {module:<10} {result['funds']} 只基金，{result['rows']} 条记录，耗时 {result['seconds']:.2f} 秒，"
+              f"{funds_per_second:.1f} 只基金/秒")
+    
+    bytes_written = results['bytes_written']
+    print(f"  写入字节数: 临时数据 {bytes_written['temp_data'] / 1024 / 1024:.2f} MB，"
+          f"输出数据 {bytes_written['data'] / 1024 / 1024:.2f} MB，进度文件 {bytes_written['progress'] / 1024:.1f} KB")
+    if results['peak_rss_mb'] is not None:
+        print(f"  内存峰值: {results['peak_rss_mb']:.1f} MB")
+    print(f"  接口调用 {results['api_calls']} 次，失败 {results['api_errors']} 次，被限流 {results['api_throttled']} 次")
+    
+    print("  各阶段耗时（并发阶段为各线程耗时之和）:")
+    for phase, seconds in sorted(results['phase_seconds'].items(), key=lambda item: -item[1]):
+        print(f"    {phase}: {seconds:.2f} 秒")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='基金数据爬取性能测试工具')
+    parser.add_argument('--funds', type=int, default=1000,
+                        help='模拟的基金数量 (默认: 1000)')
+    parser.add_argument('--modules', type=str, nargs='+', default=['nav', 'position', 'industry'],
+                        choices=['nav', 'position', 'industry'],
+                        help='要测试的数据模块 (默认: nav position industry)')
+    parser.add_argument('--output', type=str, default='parquet', choices=['csv', 'sqlite', 'parquet'],
+                        help='数据存储格式 (默认: parquet)')
+    parser.add_argument('--nav-days', type=int, default=750,
+                        help='每只基金的净值天数 (默认: 750)')
+    parser.add_argument('--year', type=str, default='2024',
+                        help='持仓和行业配置数据的年份 (默认: 2024)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='模拟接口的平均延迟，单位秒 (默认: 0.05)')
+    parser.add_argument('--jitter', type=float, default=0.02,
+                        help='模拟接口延迟的波动范围，单位秒 (默认: 0.02)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='模拟接口调用失败的概率 (默认: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=None,
+                        help='模拟接口每秒最多接受的调用次数，超过时调用失败 (默认: 不限流)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='并发请求线程数 (默认: 8)')
+    parser.add_argument('--rate-limit', type=float, default=1000.0,
+                        help='每个接口每秒最大请求数 (默认: 1000)')
+    parser.add_argument('--global-rate-limit', type=float, default=1000.0,
+                        help='所有接口合计每秒最大请求数 (默认: 1000)')
+    parser.add_argument('--retry-wait', type=float, default=5.0,
+                        help='每个模块结束时最多等待多少秒重试失败的调用 (默认: 5)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='使用增量更新模式，工作目录中已有进度时只处理剩余基金')
+    parser.add_argument('--cache', action='store_true',
+                        help='启用AKShare接口缓存')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='随机数种子 (默认: 0)')
+    parser.add_argument('--work-dir', type=str, default=None,
+                        help='工作目录，指定时保留运行结果，可用于测试重复运行 (默认: 临时目录)')
+    parser.add_argument('--keep', action='store_true',
+                        help='保留临时工作目录')
+    parser.add_argument('--json', type=str, default=None,
+                        help='将测试结果保存为JSON文件')
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    results = run_benchmark(args)
+    print_results(results)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"测试结果已保存到: {args.json}")
+    if args.keep or args.work_dir:
+        print(f"工作目录: {results['work_dir']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+常驻抓取服务模块，进程常驻并保持基金列表、接口缓存和数据库连接，
+按计划在收盘后更新净值、在定期报告披露窗口内更新持仓，
+并在本机提供查看运行状态和手动触发任务的HTTP接口
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import metrics
+
+# 状态接口默认端口，只监听本机地址
+DEFAULT_STATUS_HOST = '127.0.0.1'
+DEFAULT_STATUS_PORT = 8765
+
+# 开放式基金净值一般在交易日晚间公布，持仓更新安排在净值更新之后
+DEFAULT_NAV_TIME = '20:30'
+DEFAULT_HOLDINGS_TIME = '22:00'
+
+# 检查计划任务的间隔（秒）
+POLL_SECONDS = 30
+
+# 基金定期报告的披露窗口 (月, 开始日, 结束日)：季报在季度结束后15个工作日内披露，
+# 年报在3月底前，中报在8月底前
+HOLDINGS_REPORT_WINDOWS = [
+    (1, 1, 25),
+    (3, 15, 31),
+    (4, 1, 25),
+    (7, 1, 25),
+    (8, 15, 31),
+    (10, 1, 25),
+]
+
+# 披露窗口内每天更新持仓，持仓类接口的缓存有效期缩短为12小时，使每天的更新都重新请求接口
+HOLDINGS_REFRESH_TTLS = {
+    'fund_portfolio_hold_em': 12 * 3600,
+    'fund_portfolio_bond_hold_em': 12 * 3600,
+    'fund_portfolio_industry_allocation_em': 12 * 3600,
+}
+
+# 计划任务的运行记录
+DAEMON_STATE_FILE = "./progress/daemon_state.json"
+
+
+def parse_time_of_day(text):
+    """
+    解析HH:MM格式的时间
+    
+    参数:
+        text (str): 时间，如"20:30"
+    
+    返回:
+        tuple: (小时, 分钟)
+    """
+    hour, minute = text.split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"无效的时间: {text}")
+    return hour, minute
+
+
+def is_trading_day(date):
+    """
+    判断是否为交易日，只排除周末，节假日当天运行时接口没有新数据，增量更新不会写入
+    
+    参数:
+        date (datetime.date): 日期
+    
+    返回:
+        bool: 周一到周五返回True
+    """
+    return date.weekday() < 5
+
+
+def in_holdings_window(date):
+    """
+    判断日期是否在基金定期报告的披露窗口内
+    
+    参数:
+        date (datetime.date): 日期
+    
+    返回:
+        bool: 在HOLDINGS_REPORT_WINDOWS的某个窗口内时返回True
+    """
+    return any(date.month == month and start <= date.day <= end for month, start, end in HOLDINGS_REPORT_WINDOWS)
+
+
+def get_holdings_year(date):
+    """
+    获取披露窗口内应更新的持仓年份：一季度披露的是上一年的四季报和年报
+    
+    参数:
+        date (datetime.date): 日期
+    
+    返回:
+        str: 年份
+    """
+    return str(date.year - 1 if date.month <= 3 else date.year)
+
+
+class ScheduledJob:
+    """
+    每天在指定时间运行一次的计划任务
+    
+    参数:
+        name (str): 任务名称
+        modules (list): 要运行的数据模块
+        time_of_day (str): 运行时间，HH:MM格式
+        is_run_day (callable): 判断某天是否运行的函数，签名为is_run_day(date)
+        get_overrides (callable): 返回该次运行要覆盖的命令行参数的函数，签名为get_overrides(date)，默认为None
+    """
+    
+    def __init__(self, name, modules, time_of_day, is_run_day, get_overrides=None):
+        self.name = name
+        self.modules = list(modules)
+        self.time_of_day = time_of_day
+        self.hour, self.minute = parse_time_of_day(time_of_day)
+        self.is_run_day = is_run_day
+        self.get_overrides = get_overrides or (lambda date: {})
+    
+    def get_run_time(self, date):
+        return datetime(date.year, date.month, date.day, self.hour, self.minute)
+    
+    def is_due(self, now, last_run_date):
+        """
+        判断任务是否应该运行：当天是运行日、已到运行时间且当天还没有运行过；
+        服务在运行时间之后才启动时当天会补跑一次
+        
+        参数:
+            now (datetime): 当前时间
+            last_run_date (str): 上次运行的日期(YYYY-MM-DD)，没有运行过时为None
+        
+        返回:
+            bool: 应该运行时返回True
+        """
+        today = now.date()
+        return (self.is_run_day(today) and now >= self.get_run_time(today)
+                and last_run_date != today.isoformat())
+    
+    def get_next_run(self, now, last_run_date):
+        """
+        计算下一次计划运行的时间
+        
+        参数:
+            now (datetime): 当前时间
+            last_run_date (str): 上次运行的日期(YYYY-MM-DD)
+        
+        返回:
+            datetime: 下一次运行时间，一年内没有运行日时返回None
+        """
+        if self.is_due(now, last_run_date):
+            return now
+        for offset in range(0, 367):
+            date = now.date() + timedelta(days=offset)
+            run_time = self.get_run_time(date)
+            if self.is_run_day(date) and run_time > now and last_run_date != date.isoformat():
+                return run_time
+        return None
+
+
+def create_default_jobs(nav_time=DEFAULT_NAV_TIME, holdings_time=DEFAULT_HOLDINGS_TIME):
+    """
+    创建默认的计划任务：交易日收盘后更新净值并重新计算风险指标，定期报告披露窗口内每天更新持仓和行业配置
+    
+    参数:
+        nav_time (str): 净值更新时间，默认为DEFAULT_NAV_TIME
+        holdings_time (str): 持仓更新时间，默认为DEFAULT_HOLDINGS_TIME
+    
+    返回:
+        list: ScheduledJob列表
+    """
+    return [
+        ScheduledJob('nav', ['nav', 'risk'], nav_time, is_trading_day,
+                     lambda date: {'daily_update': True}),
+        # 披露窗口内每天重新获取所有基金的持仓，内容没有变化的基金不会重写
+        ScheduledJob('holdings', ['position', 'industry', 'similarity', 'crowding'], holdings_time, in_holdings_window,
+                     lambda date: {'year': get_holdings_year(date), 'incremental': False}),
+    ]
+
+
+class CrawlerDaemon:
+    """
+    常驻抓取服务，按计划依次运行任务，同一时间只运行一个任务
+    
+    参数:
+        jobs (list): ScheduledJob列表
+        run_job (callable): 运行任务的函数，签名为run_job(job, date, wrap_task)，返回各模块的运行结果
+                            {模块名称: {'status': ...}}；wrap_task(name, func)返回会记录模块运行状态的函数
+        state_file (str): 运行记录文件路径，默认为DAEMON_STATE_FILE
+        get_extra_status (callable): 返回附加状态（如任务队列深度）的函数，默认为None
+    """
+    
+    def __init__(self, jobs, run_job, state_file=DAEMON_STATE_FILE, get_extra_status=None):
+        self.jobs = {job.name: job for job in jobs}
+        self.run_job = run_job
+        self.state_file = state_file
+        self.get_extra_status = get_extra_status
+        self.started_at = datetime.now()
+        self.current = None
+        self.triggered = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.server = None
+        self.state = self.load_state()
+    
+    def load_state(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"读取运行记录失败: {e}")
+        return {}
+    
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+    
+    def trigger(self, job_name):
+        """
+        手动触发任务，在当前任务结束后运行
+        
+        参数:
+            job_name (str): 任务名称
+        
+        返回:
+            bool: 任务存在时返回True
+        """
+        if job_name not in self.jobs:
+            return False
+        with self.lock:
+            if job_name not in self.triggered:
+                self.triggered.append(job_name)
+        self.wakeup.set()
+        return True
+    
+    def stop(self):
+        """停止服务，正在运行的任务完成后退出"""
+        self.stopping.set()
+        self.wakeup.set()
+    
+    def get_next_job(self):
+        """
+        获取下一个要运行的任务，手动触发的任务优先
+        
+        返回:
+            tuple: (ScheduledJob, 是否为手动触发)，没有要运行的任务时返回(None, False)
+        """
+        with self.lock:
+            if self.triggered:
+                return self.jobs[self.triggered.pop(0)], True
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.is_due(now, self.state.get(job.name, {}).get('last_run_date')):
+                    return job, False
+        return None, False
+    
+    def wrap_task(self, name, func):
+        """返回会在当前任务的状态中记录模块开始、结束和结果的函数"""
+        def run():
+            with self.lock:
+                self.current['modules'][name] = {'status': 'running', 'started_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+            status = 'failed'
+            try:
+                result = func()
+                status = 'success'
+                return result
+            finally:
+                with self.lock:
+                    self.current['modules'][name].update(status=status, finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        return run
+    
+    def run_once(self, job, manual=False):
+        """
+        运行一次任务并记录结果
+        
+        参数:
+            job (ScheduledJob): 任务
+            manual (bool): 是否为手动触发，手动触发不影响当天的计划运行
+        """
+        today = datetime.now().date()
+        with self.lock:
+            self.current = {'job': job.name, 'manual': manual, 'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'modules': {}}
+        print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 开始运行任务 {job.name}（{', '.join(job.modules)}）"
+              f"{'，手动触发' if manual else ''}")
+        start = time.monotonic()
+        try:
+            results = self.run_job(job, today, self.wrap_task)
+            failed = [name for name, result in results.items() if result.get('status') != 'success']
+            status = 'failed' if failed else 'success'
+        except Exception as e:
+            print(f"任务 {job.name} 运行失败: {e}")
+            status = 'failed'
+        duration = time.monotonic() - start
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 任务 {job.name} 运行结束: {status}，耗时 {duration:.1f}s")
+        
+        with self.lock:
+            job_state = self.state.setdefault(job.name, {})
+            if not manual:
+                job_state['last_run_date'] = today.isoformat()
+            job_state.update(last_status=status, last_started_at=self.current['started_at'],
+                             last_duration_seconds=round(duration, 1))
+            self.current = None
+            self.save_state()
+    
+    def get_status(self):
+        """
+        获取服务状态
+        
+        返回:
+            dict: 包含正在运行的任务及其各模块状态、等待运行的任务、各任务的上次运行结果和下次运行时间
+        """
+        now = datetime.now()
+        with self.lock:
+            status = {
+                'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'uptime_seconds': round((now - self.started_at).total_seconds(), 1),
+                'running': json.loads(json.dumps(self.current)) if self.current else None,
+                'triggered': list(self.triggered),
+                'jobs': {},
+            }
+            for job in self.jobs.values():
+                job_state = dict(self.state.get(job.name, {}))
+                last_run_date = job_state.get('last_run_date')
+                if self.current and self.current['job'] == job.name and not self.current['manual']:
+                    # 正在运行当天的计划任务
+                    last_run_date = now.date().isoformat()
+                next_run = job.get_next_run(now, last_run_date)
+                status['jobs'][job.name] = {
+                    'modules': job.modules,
+                    'time_of_day': job.time_of_day,
+                    'next_run': next_run.strftime('%Y-%m-%d %H:%M:%S') if next_run else None,
+                    **job_state,
+                }
+        if self.get_extra_status is not None:
+            try:
+                status.update(self.get_extra_status())
+            except Exception as e:
+                status['extra_status_error'] = str(e)
+        return status
+    
+    def start_status_server(self, host=DEFAULT_STATUS_HOST, port=DEFAULT_STATUS_PORT):
+        """
+        在后台线程中启动状态接口
+        
+        参数:
+            host (str): 监听地址，默认为DEFAULT_STATUS_HOST
+            port (int): 监听端口，默认为DEFAULT_STATUS_PORT
+        
+        返回:
+            ThreadingHTTPServer: HTTP服务
+        """
+        daemon = self
+        
+        class StatusHandler(BaseHTTPRequestHandler):
+            def send_body(self, code, body, content_type='application/json; charset=utf-8'):
+                data = body.encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def send_json(self, code, data):
+                self.send_body(code, json.dumps(data, ensure_ascii=False, indent=2, default=str))
+            
+            def do_GET(self):
+                if self.path in ('/', '/status'):
+                    self.send_json(200, daemon.get_status())
+                elif self.path == '/metrics':
+                    self.send_body(200, metrics.to_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+                else:
+                    self.send_json(404, {'error': f"未知的路径: {self.path}"})
+            
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'run':
+                    if daemon.trigger(parts[1]):
+                        self.send_json(202, {'triggered': parts[1]})
+                    else:
+                        self.send_json(404, {'error': f"未知的任务: {parts[1]}", 'jobs': list(daemon.jobs)})
+                elif parts == ['stop']:
+                    daemon.stop()
+                    self.send_json(202, {'stopping': True})
+                else:
+                    self.send_json(404, {'error': f"未知的路径: {self.path}"})
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer((host, port), StatusHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='status-server', daemon=True).start()
+        print(f"状态接口已启动: http://{host}:{self.server.server_address[1]}/status")
+        return self.server
+    
+    def serve_forever(self):
+        """按计划运行任务，直到调用stop()或收到Ctrl+C"""
+        for job in self.jobs.values():
+            next_run = job.get_next_run(datetime.now(), self.state.get(job.name, {}).get('last_run_date'))
+            print(f"计划任务 {job.name}（{', '.join(job.modules)}）下次运行: "
+                  f"{next_run.strftime('%Y-%m-%d %H:%M') if next_run else '无'}")
+        try:
+            while not self.stopping.is_set():
+                job, manual = self.get_next_job()
+                if job is not None:
+                    self.run_once(job, manual)
+                    continue
+                self.wakeup.wait(POLL_SECONDS)
+                self.wakeup.clear()
+        except KeyboardInterrupt:
+            print("收到中断信号，停止服务")
+        finally:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+        print("常驻服务已停止")
@@ -2,201 +2,302 @@
 # -*- coding: utf-8 -*-
 """
 基金数据分析模块，提供基金数据分析和可视化功能
+
+图表先整理为只包含数据的图表描述，再按输出格式渲染：PNG和SVG由matplotlib绘制，
+多张图表时分配到进程池中并行渲染；JSON只保存图表数据，供网页前端绘制，不需要matplotlib。
+matplotlib在第一次绘图时才导入
 """
 import os
+import json
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-from data_storage import read_from_csv, read_from_sqlite
+from data_storage import read_data, read_fund_codes, get_storage_backend
+import nav_store  # 注册净值存储后端，净值走势分析可直接读取.navstore目录
+from holdings_crowding import load_holdings_crowding, select_crowded_securities
+from risk_metrics import TRADING_DAYS_PER_YEAR
+
+# 中文字体文件候选路径，依次为Windows、macOS和常见Linux发行版，都不存在时使用matplotlib默认字体
+CHART_FONT_PATHS = [
+    r"C:\Windows\Fonts\msyh.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+]
+
+# 支持的图表输出格式及默认分辨率，JSON只保存图表数据
+CHART_FORMATS = {'png': 300, 'svg': 100, 'json': None}
+
+# 图表数量达到该值时使用进程池渲染，数量较少时进程启动的开销大于收益
+CHART_POOL_MIN_CHARTS = 4
+
+# 净值记录少于该数的基金不绘制走势图
+NAV_TREND_MIN_RECORDS = 10
+
+# 净值走势统计中计算的均线天数
+NAV_TREND_MA_WINDOWS = [20, 60]
+
+_pyplot = None
+_font = None
+
+def get_pyplot():
+    """
+    导入matplotlib并设置中文字体，只在第一次调用时执行
+    
+    返回:
+        tuple: (matplotlib.pyplot模块, 中文字体FontProperties)
+    """
+    global _pyplot, _font
+    if _pyplot is None:
+        import matplotlib
+        matplotlib.use('Agg')  # 只输出文件，不需要图形界面
+        import matplotlib.pyplot as plt
+        from matplotlib.font_manager import FontProperties
+        
+        # 设置中文字体，解决中文显示问题
+        font_path = next((path for path in CHART_FONT_PATHS if os.path.exists(path)), None)
+        _font = FontProperties(fname=font_path) if font_path else FontProperties()
+        plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Heiti SC', 'Arial Unicode MS',
+                                              'DejaVu Sans']
+        plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+        _pyplot = plt
+    return _pyplot, _font
 
-# 设置中文字体，解决中文显示问题
-try:
-    # 尝试设置微软雅黑字体
-    font = FontProperties(fname=r"C:\Windows\Fonts\msyh.ttc")
-except:
-    try:
-        # 尝试设置苹果系统中文字体
-        font = FontProperties(fname=r"/System/Library/Fonts/PingFang.ttc")
-    except:
-        # 使用系统默认字体
-        font = FontProperties()
+def to_json_values(values):
+    """将数值序列转换为JSON列表，NaN转换为null"""
+    return [None if value != value else value for value in np.asarray(values, dtype=np.float64).tolist()]
+
+def get_chart_data(chart):
+    """
+    获取图表的JSON数据：直方图保存分组边界和计数，不保存原始数据
+    
+    参数:
+        chart (dict): 图表描述
+    
+    返回:
+        dict: 可直接写入JSON的图表数据
+    """
+    data = {key: chart[key] for key in ['kind', 'title', 'xlabel', 'ylabel'] if key in chart}
+    if chart['kind'] == 'hist':
+        values = np.asarray(chart['values'], dtype=np.float64)
+        counts, edges = np.histogram(values[~np.isnan(values)], bins=chart.get('bins', 30))
+        data['bin_edges'] = to_json_values(edges)
+        data['counts'] = counts.tolist()
+    elif chart['kind'] == 'bar':
+        data['labels'] = [str(label) for label in chart['labels']]
+        data['values'] = to_json_values(chart['values'])
+    else:
+        x = np.asarray(chart['x'])
+        data['x'] = np.datetime_as_string(x, unit='D').tolist() if x.dtype.kind == 'M' else [str(value) for value in x]
+        data['series'] = [{'label': series['label'], 'values': to_json_values(series['values'])}
+                          for series in chart['series']]
+    return data
+
+def render_chart(chart, output_dir, output_format='png', dpi=None):
+    """
+    渲染一张图表并保存
+    
+    参数:
+        chart (dict): 图表描述，kind为'hist'（values、bins）、'bar'（labels、values）或'line'（x、series），
+                      name为不含扩展名的文件名，另有title、xlabel、ylabel、color等绘图参数
+        output_dir (str): 输出目录
+        output_format (str): 输出格式，'png'、'svg'或'json'
+        dpi (int): 分辨率，默认为None表示使用CHART_FORMATS中的默认值
+    
+    返回:
+        str: 保存的文件路径
+    """
+    file_path = os.path.join(output_dir, f"{chart['name']}.{output_format}")
+    if output_format == 'json':
+        # json.dumps使用C实现的编码器，比直接写文件的json.dump快得多
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(get_chart_data(chart), ensure_ascii=False))
+        return file_path
+    
+    plt, font = get_pyplot()
+    fig = plt.figure(figsize=chart.get('figsize', (12, 8)))
+    if chart['kind'] == 'hist':
+        plt.hist(chart['values'], bins=chart.get('bins', 30), alpha=0.7, color=chart.get('color'))
+        plt.grid(True, linestyle='--', alpha=0.7)
+    elif chart['kind'] == 'bar':
+        plt.bar(range(len(chart['values'])), chart['values'], color=chart.get('color'), alpha=0.7)
+        plt.xticks(range(len(chart['labels'])), chart['labels'], rotation=45, ha='right', fontproperties=font)
+        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
+    else:
+        for series in chart['series']:
+            plt.plot(chart['x'], series['values'], label=series['label'], color=series.get('color'), linewidth=2,
+                     linestyle=series.get('linestyle', '-'))
+        plt.grid(True, linestyle='--', alpha=0.7)
+        plt.legend(prop=font)
+    plt.title(chart['title'], fontproperties=font, fontsize=16)
+    plt.xlabel(chart['xlabel'], fontproperties=font, fontsize=14)
+    plt.ylabel(chart['ylabel'], fontproperties=font, fontsize=14)
+    if chart['kind'] != 'hist':
+        plt.tight_layout()
+    plt.savefig(file_path, dpi=dpi or CHART_FORMATS[output_format], bbox_inches='tight', format=output_format)
+    plt.close(fig)
+    return file_path
 
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Heiti SC', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+def render_charts(charts, output_dir, output_format='png', dpi=None, workers=None):
+    """
+    渲染多张图表：PNG和SVG在图表较多时分配到进程池中并行渲染，JSON直接在当前进程中写出
+    
+    参数:
+        charts (list): 图表描述列表，格式见render_chart
+        output_dir (str): 输出目录
+        output_format (str): 输出格式，'png'、'svg'或'json'
+        dpi (int): 分辨率，默认为None表示使用CHART_FORMATS中的默认值
+        workers (int): 渲染进程数，默认为None表示使用CPU核数，为1时不使用进程池
+    
+    返回:
+        list: 保存的文件路径
+    """
+    if output_format not in CHART_FORMATS:
+        raise ValueError(f"不支持的图表格式: {output_format}，可选 {', '.join(CHART_FORMATS)}")
+    workers = min(workers or os.cpu_count() or 1, len(charts))
+    if output_format == 'json' or workers <= 1 or len(charts) < CHART_POOL_MIN_CHARTS:
+        return [render_chart(chart, output_dir, output_format, dpi) for chart in charts]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_chart, charts, [output_dir] * len(charts), [output_format] * len(charts),
+                                 [dpi] * len(charts), chunksize=max(1, len(charts) // (workers * 4))))
 
-def analyze_fund_performance(data_source, output_dir='./analysis_results'):
+def analyze_fund_performance(data_source, output_dir='./analysis_results', output_format='png', workers=None):
     """
     分析基金业绩表现
     
     参数:
-        data_source (str): 数据源，可以是CSV文件路径或SQLite数据库名称
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径或SQLite数据库名称
         output_dir (str): 分析结果输出目录
+        output_format (str): 图表格式，'png'、'svg'或'json'
+        workers (int): 图表渲染进程数，默认为None表示使用CPU核数
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 读取基金业绩数据
-    if data_source.endswith('.csv'):
-        performance_df = read_from_csv(data_source)
-    else:
-        performance_df = read_from_sqlite(data_source, 'fund_performance_info')
+    # 聚合在存储后端中执行，只读取收益率分布用到的列
+    backend = get_storage_backend(data_source)
+    performance_df = backend.read('fund_performance_info', columns=['近1年'])
     
     # 确保数据不为空
-    if performance_df.empty:
+    if performance_df.empty or '近1年' not in performance_df.columns:
         print("基金业绩数据为空，无法进行分析")
         return
     
     # 分析近1年收益率分布
-    plt.figure(figsize=(12, 8))
-    plt.hist(performance_df['近1年'], bins=50, alpha=0.7, color='blue')
-    plt.title('基金近1年收益率分布', fontproperties=font, fontsize=16)
-    plt.xlabel('收益率(%)', fontproperties=font, fontsize=14)
-    plt.ylabel('基金数量', fontproperties=font, fontsize=14)
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.savefig(os.path.join(output_dir, '基金近1年收益率分布.png'), dpi=300, bbox_inches='tight')
-    plt.close()
+    charts = [{
+        'name': '基金近1年收益率分布', 'kind': 'hist', 'bins': 50, 'color': 'blue',
+        'values': pd.to_numeric(performance_df['近1年'], errors='coerce').dropna().to_numpy(),
+        'title': '基金近1年收益率分布', 'xlabel': '收益率(%)', 'ylabel': '基金数量',
+    }]
     
     # 分析不同类型基金的平均收益率
-    if '基金类型' in performance_df.columns:
-        type_performance = performance_df.groupby('基金类型')['近1年', '近3年', '近5年'].mean().sort_values('近1年', ascending=False)
+    if '基金类型' in backend.get_columns('fund_performance_info'):
+        type_performance = backend.group_mean('fund_performance_info', '基金类型', ['近1年', '近3年', '近5年'], sort_by='近1年')
         
         # 绘制不同类型基金的平均收益率柱状图
-        plt.figure(figsize=(14, 10))
-        type_performance['近1年'].plot(kind='bar', color='blue', alpha=0.7)
-        plt.title('不同类型基金近1年平均收益率', fontproperties=font, fontsize=16)
-        plt.xlabel('基金类型', fontproperties=font, fontsize=14)
-        plt.ylabel('平均收益率(%)', fontproperties=font, fontsize=14)
-        plt.xticks(rotation=45, ha='right', fontproperties=font)
-        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '不同类型基金近1年平均收益率.png'), dpi=300, bbox_inches='tight')
-        plt.close()
+        charts.append({
+            'name': '不同类型基金近1年平均收益率', 'kind': 'bar', 'figsize': (14, 10), 'color': 'blue',
+            'labels': type_performance.index.tolist(), 'values': type_performance['近1年'].to_numpy(),
+            'title': '不同类型基金近1年平均收益率', 'xlabel': '基金类型', 'ylabel': '平均收益率(%)',
+        })
+    render_charts(charts, output_dir, output_format, workers=workers)
     
     # 输出业绩排名前20的基金
-    top_funds = performance_df.sort_values('近1年', ascending=False).head(20)
+    top_funds = backend.top_rows('fund_performance_info', '近1年', 20)
     top_funds.to_csv(os.path.join(output_dir, '业绩排名前20基金.csv'), index=False, encoding='utf-8-sig')
     
     print(f"基金业绩分析完成，结果已保存到 {output_dir} 目录")
 
-def analyze_fund_holdings(data_source, output_dir='./analysis_results'):
+def analyze_fund_holdings(data_source, output_dir='./analysis_results', output_format='png', workers=None):
     """
     分析基金持仓情况
     
     参数:
-        data_source (str): 数据源，可以是CSV文件路径或SQLite数据库名称
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径或SQLite数据库名称
         output_dir (str): 分析结果输出目录
+        output_format (str): 图表格式，'png'、'svg'或'json'
+        workers (int): 图表渲染进程数，默认为None表示使用CPU核数
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 读取基金持仓数据
-    if data_source.endswith('.csv'):
-        holdings_df = read_from_csv(data_source)
-    else:
-        holdings_df = read_from_sqlite(data_source, 'fund_position_info')
+    # 按证券代码和季度汇总持仓，同名证券不会合并，同一基金多个季度的持仓不会重复计数
+    crowding_df = load_holdings_crowding(data_source)
+    # 退出记录的持有基金数为0，不参与排名
+    crowding_df = crowding_df[crowding_df['持有基金数'] > 0]
     
     # 确保数据不为空
-    if holdings_df.empty:
+    if crowding_df.empty:
         print("基金持仓数据为空，无法进行分析")
         return
     
-    # 分析股票持仓
-    if '持仓类型' in holdings_df.columns and '股票名称' in holdings_df.columns:
-        stock_holdings = holdings_df[holdings_df['持仓类型'] == '股票']
-        
-        # 统计出现频率最高的股票（最受基金青睐的股票）
-        top_stocks = stock_holdings['股票名称'].value_counts().head(20)
-        
-        # 绘制最受基金青睐的股票柱状图
-        plt.figure(figsize=(14, 10))
-        top_stocks.plot(kind='bar', color='red', alpha=0.7)
-        plt.title('最受基金青睐的前20只股票', fontproperties=font, fontsize=16)
-        plt.xlabel('股票名称', fontproperties=font, fontsize=14)
-        plt.ylabel('持有基金数量', fontproperties=font, fontsize=14)
-        plt.xticks(rotation=45, ha='right', fontproperties=font)
-        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '最受基金青睐的前20只股票.png'), dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        # 保存最受基金青睐的股票数据
-        top_stocks_df = pd.DataFrame({'股票名称': top_stocks.index, '持有基金数量': top_stocks.values})
-        top_stocks_df.to_csv(os.path.join(output_dir, '最受基金青睐的前20只股票.csv'), index=False, encoding='utf-8-sig')
-    
-    # 分析债券持仓
-    if '持仓类型' in holdings_df.columns and '债券名称' in holdings_df.columns:
-        bond_holdings = holdings_df[holdings_df['持仓类型'] == '债券']
-        
-        # 统计出现频率最高的债券
-        top_bonds = bond_holdings['债券名称'].value_counts().head(20)
+    charts = []
+    # 分别统计最新季度持有基金数最多的股票和债券（最受基金青睐的证券）
+    for holding_type, color in [('股票', 'red'), ('债券', 'green')]:
+        top_df = select_crowded_securities(crowding_df, holding_type=holding_type, sort_by='持有基金数', limit=20)
+        if top_df.empty:
+            continue
+        title = f'最受基金青睐的前20只{holding_type}'
+        labels = top_df['证券名称'].where(top_df['证券名称'].notna() & (top_df['证券名称'] != ''), top_df['证券代码'])
         
-        # 绘制最受基金青睐的债券柱状图
-        plt.figure(figsize=(14, 10))
-        top_bonds.plot(kind='bar', color='green', alpha=0.7)
-        plt.title('最受基金青睐的前20只债券', fontproperties=font, fontsize=16)
-        plt.xlabel('债券名称', fontproperties=font, fontsize=14)
-        plt.ylabel('持有基金数量', fontproperties=font, fontsize=14)
-        plt.xticks(rotation=45, ha='right', fontproperties=font)
-        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '最受基金青睐的前20只债券.png'), dpi=300, bbox_inches='tight')
-        plt.close()
+        # 绘制最受基金青睐的证券柱状图
+        charts.append({
+            'name': title, 'kind': 'bar', 'figsize': (14, 10), 'color': color,
+            'labels': labels.astype(str).tolist(), 'values': top_df['持有基金数'].to_numpy(),
+            'title': f"{title}（{top_df['季度'].iloc[0]}）", 'xlabel': f'{holding_type}名称', 'ylabel': '持有基金数量',
+        })
         
-        # 保存最受基金青睐的债券数据
-        top_bonds_df = pd.DataFrame({'债券名称': top_bonds.index, '持有基金数量': top_bonds.values})
-        top_bonds_df.to_csv(os.path.join(output_dir, '最受基金青睐的前20只债券.csv'), index=False, encoding='utf-8-sig')
+        # 保存最受基金青睐的证券数据
+        top_df = pd.DataFrame({
+            f'{holding_type}代码': top_df['证券代码'],
+            f'{holding_type}名称': top_df['证券名称'],
+            '季度': top_df['季度'],
+            '持有基金数量': top_df['持有基金数'],
+            '持仓市值合计': top_df['持仓市值合计'],
+        })
+        top_df.to_csv(os.path.join(output_dir, f'{title}.csv'), index=False, encoding='utf-8-sig')
+    render_charts(charts, output_dir, output_format, workers=workers)
     
     print(f"基金持仓分析完成，结果已保存到 {output_dir} 目录")
 
-def analyze_fund_managers(data_source, output_dir='./analysis_results'):
+def analyze_fund_managers(data_source, output_dir='./analysis_results', output_format='png', workers=None):
     """
     分析基金经理情况
     
     参数:
-        data_source (str): 数据源，可以是CSV文件路径或SQLite数据库名称
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径或SQLite数据库名称
         output_dir (str): 分析结果输出目录
+        output_format (str): 图表格式，'png'、'svg'或'json'
+        workers (int): 图表渲染进程数，默认为None表示使用CPU核数
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 读取基金经理数据
-    if data_source.endswith('.csv'):
-        managers_df = read_from_csv(data_source)
-    else:
-        managers_df = read_from_sqlite(data_source, 'fund_manager_info')
+    # 读取基金经理数据，只读取分析用到的列
+    managers_df = read_data(data_source, 'fund_manager_info', columns=['姓名', '累计从业时间'])
     
     # 确保数据不为空
     if managers_df.empty:
         print("基金经理数据为空，无法进行分析")
         return
     
+    charts = []
     # 分析基金经理管理基金数量分布
     if '姓名' in managers_df.columns:
         manager_fund_counts = managers_df['姓名'].value_counts()
-        
-        plt.figure(figsize=(12, 8))
-        plt.hist(manager_fund_counts.values, bins=30, alpha=0.7, color='purple')
-        plt.title('基金经理管理基金数量分布', fontproperties=font, fontsize=16)
-        plt.xlabel('管理基金数量', fontproperties=font, fontsize=14)
-        plt.ylabel('基金经理数量', fontproperties=font, fontsize=14)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.savefig(os.path.join(output_dir, '基金经理管理基金数量分布.png'), dpi=300, bbox_inches='tight')
-        plt.close()
+        charts.append({
+            'name': '基金经理管理基金数量分布', 'kind': 'hist', 'bins': 30, 'color': 'purple',
+            'values': manager_fund_counts.to_numpy(),
+            'title': '基金经理管理基金数量分布', 'xlabel': '管理基金数量', 'ylabel': '基金经理数量',
+        })
         
         # 管理基金数量最多的前20名基金经理
         top_managers = manager_fund_counts.head(20)
-        
-        plt.figure(figsize=(14, 10))
-        top_managers.plot(kind='bar', color='orange', alpha=0.7)
-        plt.title('管理基金数量最多的前20名基金经理', fontproperties=font, fontsize=16)
-        plt.xlabel('基金经理', fontproperties=font, fontsize=14)
-        plt.ylabel('管理基金数量', fontproperties=font, fontsize=14)
-        plt.xticks(rotation=45, ha='right', fontproperties=font)
-        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '管理基金数量最多的前20名基金经理.png'), dpi=300, bbox_inches='tight')
-        plt.close()
+        charts.append({
+            'name': '管理基金数量最多的前20名基金经理', 'kind': 'bar', 'figsize': (14, 10), 'color': 'orange',
+            'labels': top_managers.index.tolist(), 'values': top_managers.to_numpy(),
+            'title': '管理基金数量最多的前20名基金经理', 'xlabel': '基金经理', 'ylabel': '管理基金数量',
+        })
         
         # 保存管理基金数量最多的基金经理数据
         top_managers_df = pd.DataFrame({'基金经理': top_managers.index, '管理基金数量': top_managers.values})
@@ -204,79 +305,187 @@ def analyze_fund_managers(data_source, output_dir='./analysis_results'):
     
     # 分析基金经理的平均任职时间
     if '累计从业时间' in managers_df.columns:
-        plt.figure(figsize=(12, 8))
-        plt.hist(managers_df['累计从业时间'].values, bins=30, alpha=0.7, color='brown')
-        plt.title('基金经理累计从业时间分布', fontproperties=font, fontsize=16)
-        plt.xlabel('累计从业时间(天)', fontproperties=font, fontsize=14)
-        plt.ylabel('基金经理数量', fontproperties=font, fontsize=14)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.savefig(os.path.join(output_dir, '基金经理累计从业时间分布.png'), dpi=300, bbox_inches='tight')
-        plt.close()
+        charts.append({
+            'name': '基金经理累计从业时间分布', 'kind': 'hist', 'bins': 30, 'color': 'brown',
+            'values': pd.to_numeric(managers_df['累计从业时间'], errors='coerce').dropna().to_numpy(),
+            'title': '基金经理累计从业时间分布', 'xlabel': '累计从业时间(天)', 'ylabel': '基金经理数量',
+        })
+    render_charts(charts, output_dir, output_format, workers=workers)
     
     print(f"基金经理分析完成，结果已保存到 {output_dir} 目录")
 
-def analyze_fund_nav_trend(data_source, fund_codes=None, output_dir='./analysis_results'):
+def load_nav_frame(data_source, fund_codes=None, start_date=None, end_date=None):
+    """
+    读取净值数据并整理为按基金连续、基金内按日期排序的数据，日期只解析一次；
+    净值存储读出的数据已按基金和日期排列，不再排序
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、SQLite数据库名称或净值存储目录
+        fund_codes (list): 基金代码列表，默认为None表示全部基金
+        start_date (str): 开始日期，默认为None表示不限
+        end_date (str): 结束日期，默认为None表示不限
+    
+    返回:
+        pandas.DataFrame: 包含基金代码、净值日期、单位净值和累计净值的数据
+    """
+    backend = get_storage_backend(data_source)
+    nav_df = backend.read('fund_nav_info', columns=['基金代码', '净值日期', '单位净值', '累计净值'],
+                          fund_codes=fund_codes, start_date=start_date, end_date=end_date)
+    if nav_df.empty:
+        return nav_df
+    nav_df['基金代码'] = nav_df['基金代码'].astype(str)
+    nav_df['净值日期'] = pd.to_datetime(nav_df['净值日期'])
+    if '累计净值' not in nav_df.columns:
+        nav_df['累计净值'] = np.nan
+    if not isinstance(backend, nav_store.NavStoreBackend):
+        nav_df = nav_df.sort_values(['基金代码', '净值日期'], kind='stable', ignore_index=True)
+    return nav_df
+
+def compute_nav_trend_stats(nav_df):
+    """
+    在整理好的净值数据上按基金分组一次计算所有基金的走势统计：区间收益率、年化收益率、年化波动率、
+    最大回撤、当前回撤、对数净值线性回归得到的趋势年化收益率以及最新的均线。
+    有累计净值的基金使用累计净值，否则使用单位净值
+    
+    参数:
+        nav_df (pandas.DataFrame): load_nav_frame返回的净值数据
+    
+    返回:
+        pandas.DataFrame: 每只基金一行的走势统计
+    """
+    ma_columns = [f'{window}日均线' for window in NAV_TREND_MA_WINDOWS]
+    stat_columns = ['基金代码', '开始日期', '结束日期', '记录数', '最新单位净值', '区间收益率', '年化收益率', '年化波动率',
+                    '最大回撤', '当前回撤', '趋势年化收益率'] + ma_columns
+    if nav_df.empty:
+        return pd.DataFrame(columns=stat_columns)
+    
+    codes = nav_df['基金代码']
+    unit_nav = pd.to_numeric(nav_df['单位净值'], errors='coerce')
+    acc_nav = pd.to_numeric(nav_df['累计净值'], errors='coerce') if '累计净值' in nav_df.columns else unit_nav * np.nan
+    has_acc = acc_nav.notna().groupby(codes, sort=False).transform('any')
+    price = acc_nav.where(has_acc, unit_nav)
+    valid = price.notna()
+    filled = price.groupby(codes, sort=False).ffill()
+    filled_groups = filled.groupby(codes, sort=False)
+    returns = (filled / filled_groups.shift(1) - 1.0).where(valid)
+    drawdown = filled / filled_groups.cummax() - 1.0
+    
+    # 只在有效净值上统计日期和首尾净值
+    dates = nav_df['净值日期'].where(valid)
+    price_groups = price.groupby(codes, sort=False)
+    first_date = dates.groupby(codes, sort=False).min()
+    last_date = dates.groupby(codes, sort=False).max()
+    total_return = price_groups.last() / price_groups.first() - 1.0
+    years = (last_date - first_date).dt.days / 365.25
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual_return = np.power(1.0 + total_return, 1.0 / years.where(years > 0)) - 1.0
+        
+        # 对数净值对时间（年）做最小二乘回归，斜率换算为年化收益率
+        t = ((nav_df['净值日期'] - nav_df['净值日期'].groupby(codes, sort=False).transform('min')).dt.days / 365.25).where(valid)
+        y = np.log(price.where(price > 0))
+        sums = pd.DataFrame({'n': (t.notna() & y.notna()).astype(float), 't': t, 'y': y, 'ty': t * y, 'tt': t * t}) \
+            .where(y.notna() & t.notna()).groupby(codes, sort=False).sum()
+        slope = (sums['n'] * sums['ty'] - sums['t'] * sums['y']) / (sums['n'] * sums['tt'] - sums['t'] ** 2)
+        trend_return = np.exp(slope) - 1.0
+    
+    result = pd.DataFrame({
+        '开始日期': first_date.dt.date,
+        '结束日期': last_date.dt.date,
+        '记录数': price_groups.count(),
+        '最新单位净值': unit_nav.groupby(codes, sort=False).last(),
+        '区间收益率': total_return,
+        '年化收益率': annual_return,
+        '年化波动率': returns.groupby(codes, sort=False).std() * np.sqrt(TRADING_DAYS_PER_YEAR),
+        '最大回撤': -drawdown.groupby(codes, sort=False).min(),
+        '当前回撤': -drawdown.groupby(codes, sort=False).last(),
+        '趋势年化收益率': trend_return,
+    })
+    # 均线取每只基金最后若干条有效净值的平均值，记录不足时为空
+    valid_prices = price[valid]
+    valid_codes = codes[valid]
+    for window, column in zip(NAV_TREND_MA_WINDOWS, ma_columns):
+        tail = valid_prices.groupby(valid_codes, sort=False).tail(window)
+        result[column] = tail.groupby(valid_codes[tail.index], sort=False).mean().where(result['记录数'] >= window)
+    result.index.name = '基金代码'
+    return result.reset_index()[stat_columns]
+
+def get_nav_trend_stats(data_source, fund_codes=None, start_date=None, end_date=None):
+    """
+    批量获取基金净值走势统计，只读取一次净值数据
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、SQLite数据库名称或净值存储目录
+        fund_codes (list): 基金代码列表，默认为None表示全部基金
+        start_date (str): 统计区间开始日期，默认为None表示不限
+        end_date (str): 统计区间结束日期，默认为None表示不限
+    
+    返回:
+        pandas.DataFrame: 每只基金一行的走势统计，格式见compute_nav_trend_stats
+    """
+    if fund_codes is not None:
+        fund_codes = [str(fund_code) for fund_code in fund_codes]
+    return compute_nav_trend_stats(load_nav_frame(data_source, fund_codes, start_date, end_date))
+
+def analyze_fund_nav_trend(data_source, fund_codes=None, output_dir='./analysis_results', start_date=None, end_date=None,
+                           output_format='png', workers=None):
     """
     分析基金净值走势
     
     参数:
-        data_source (str): 数据源，可以是CSV文件路径或SQLite数据库名称
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、SQLite数据库名称或净值存储目录
         fund_codes (list): 要分析的基金代码列表，默认为None表示随机选择10只基金
         output_dir (str): 分析结果输出目录
+        start_date (str): 分析区间开始日期，默认为None表示不限
+        end_date (str): 分析区间结束日期，默认为None表示不限
+        output_format (str): 图表格式，'png'、'svg'或'json'；基金较多时建议使用'json'或'svg'
+        workers (int): 图表渲染进程数，默认为None表示使用CPU核数
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 读取基金净值数据
-    if data_source.endswith('.csv'):
-        nav_df = read_from_csv(data_source)
-    else:
-        nav_df = read_from_sqlite(data_source, 'fund_nav_info')
-    
-    # 确保数据不为空
-    if nav_df.empty:
-        print("基金净值数据为空，无法进行分析")
-        return
-    
     # 如果未指定基金代码，则随机选择10只基金
     if fund_codes is None:
-        all_fund_codes = nav_df['基金代码'].unique()
+        all_fund_codes = read_fund_codes(data_source, 'fund_nav_info')
         if len(all_fund_codes) > 10:
             fund_codes = np.random.choice(all_fund_codes, 10, replace=False)
         else:
             fund_codes = all_fund_codes
+    fund_codes = [str(fund_code) for fund_code in fund_codes]
+    
+    # 只读取所选基金的净值数据，日期解析和排序只做一次
+    nav_df = load_nav_frame(data_source, fund_codes, start_date, end_date)
+    
+    # 确保数据不为空
+    if nav_df.empty:
+        print("基金净值数据为空，无法进行分析")
+        return
+    
+    # 保存所选基金的走势统计
+    trend_stats = compute_nav_trend_stats(nav_df)
+    trend_stats.to_csv(os.path.join(output_dir, '基金净值走势统计.csv'), index=False, encoding='utf-8-sig')
     
-    # 分析每只基金的净值走势
+    # 按基金分组一次，整理每只基金的净值走势，图表统一渲染
+    fund_navs = dict(iter(nav_df.groupby('基金代码', sort=False)))
+    charts = []
     for fund_code in fund_codes:
-        fund_nav = nav_df[nav_df['基金代码'] == fund_code].copy()
+        fund_nav = fund_navs.get(fund_code)
         
         # 确保有足够的数据
-        if len(fund_nav) < 10:
+        if fund_nav is None or len(fund_nav) < NAV_TREND_MIN_RECORDS:
             print(f"基金 {fund_code} 的净值数据不足，跳过分析")
             continue
         
-        # 确保日期列是日期类型
-        if '净值日期' in fund_nav.columns:
-            fund_nav['净值日期'] = pd.to_datetime(fund_nav['净值日期'])
-            fund_nav = fund_nav.sort_values('净值日期')
-            
-            # 绘制净值走势图
-            plt.figure(figsize=(14, 8))
-            
-            if '单位净值' in fund_nav.columns:
-                plt.plot(fund_nav['净值日期'], fund_nav['单位净值'], label='单位净值', color='blue', linewidth=2)
-            
-            if '累计净值' in fund_nav.columns and not fund_nav['累计净值'].isna().all():
-                plt.plot(fund_nav['净值日期'], fund_nav['累计净值'], label='累计净值', color='red', linewidth=2, linestyle='--')
-            
-            plt.title(f'基金 {fund_code} 净值走势', fontproperties=font, fontsize=16)
-            plt.xlabel('日期', fontproperties=font, fontsize=14)
-            plt.ylabel('净值', fontproperties=font, fontsize=14)
-            plt.grid(True, linestyle='--', alpha=0.7)
-            plt.legend(prop=font)
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, f'基金{fund_code}净值走势.png'), dpi=300, bbox_inches='tight')
-            plt.close()
+        # 绘制净值走势图
+        series = [{'label': '单位净值', 'values': fund_nav['单位净值'].to_numpy(), 'color': 'blue'}]
+        if not fund_nav['累计净值'].isna().all():
+            series.append({'label': '累计净值', 'values': fund_nav['累计净值'].to_numpy(), 'color': 'red', 'linestyle': '--'})
+        
+        charts.append({
+            'name': f'基金{fund_code}净值走势', 'kind': 'line', 'figsize': (14, 8),
+            'x': fund_nav['净值日期'].to_numpy().astype('datetime64[D]'), 'series': series,
+            'title': f'基金 {fund_code} 净值走势', 'xlabel': '日期', 'ylabel': '净值',
+        })
+    render_charts(charts, output_dir, output_format, workers=workers)
     
     print(f"基金净值走势分析完成，结果已保存到 {output_dir} 目录")
 
@@ -1,11 +1,301 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-数据存储模块，提供CSV和SQLite存储功能
+数据存储模块，提供CSV、SQLite、Parquet和DuckDB存储功能
 """
 import os
+import json
+import time
+import shutil
+import hashlib
+import datetime
+import threading
+from abc import ABC, abstractmethod
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from metrics import metrics, get_data_bytes
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Parquet中的列类型：日期列存为date32，数值列存为float64，代码类列使用字典编码
+DATE_COLUMNS = ['净值日期', '日期', '截止时间']
+FLOAT_COLUMNS = ['单位净值', '累计净值', '日增长率', '占净值比例', '持股数', '持仓市值', '市值',
+                 '开盘', '收盘', '最高', '最低', '成交额', '涨跌幅']
+DICTIONARY_COLUMNS = ['基金代码', '股票代码', '债券代码', '持仓类型', '季度', '行业类别']
+
+# SQLite同一时间只允许一个写入者，多个模块并发运行时按进程串行写入，避免database is locked错误
+SQLITE_WRITE_LOCK = threading.Lock()
+
+# 每个数据库文件共用一个SQLAlchemy引擎，常驻运行时复用连接池中的连接
+_sqlite_engines = {}
+_sqlite_engines_lock = threading.Lock()
+
+# 每个SQLite连接建立时执行的设置：WAL模式下读写互不阻塞，synchronous=NORMAL在WAL模式下只在检查点同步磁盘
+SQLITE_PRAGMAS = ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL']
+
+# 各数据表的主键，写入时按主键插入或更新，保留表中已有的其他记录
+SQLITE_PRIMARY_KEYS = {
+    'fund_basic_info': ['基金代码'],
+    'fund_nav_info': ['基金代码', '净值日期'],
+    'fund_position_info': ['基金代码', '持仓类型', '季度', '序号'],
+    'fund_industry_allocation': ['基金代码', '截止时间', '行业类别'],
+    'fund_performance_info': ['基金代码'],
+    'fund_risk_metrics': ['基金代码', '区间'],
+    'fund_similarity': ['基金代码', '相似基金代码'],
+    'fund_holdings_crowding': ['持仓类型', '证券代码', '季度'],
+}
+
+# 批量写入SQLite时每次executemany的行数
+SQLITE_BATCH_ROWS = 5000
+
+# 各数据表主键以外的二级索引，按日期、季度、股票、债券或行业筛选时使用
+SQLITE_INDEXES = {
+    'fund_nav_info': [['净值日期']],
+    'fund_position_info': [['股票代码'], ['债券代码']],
+    'fund_industry_allocation': [['行业类别']],
+    'fund_holdings_crowding': [['季度']],
+}
+
+# 按基金代码筛选SQLite时每条查询包含的代码个数，不超过SQLite的参数个数上限
+SQLITE_MAX_VARIABLES = 900
+
+# 带筛选条件读取CSV时每块的行数
+CSV_READ_CHUNK_ROWS = 200000
+
+# 带筛选条件读取CSV时按字符串读取的代码列，保留代码开头的0
+CSV_CODE_COLUMNS = ['基金代码', '股票代码', '债券代码', '证券代码', '相似基金代码']
+
+# DuckDB数据库文件同一时间只允许一个进程写入，进程内更新视图时串行执行
+DUCKDB_WRITE_LOCK = threading.Lock()
+
+def parquet_available():
+    """
+    检查是否安装了pyarrow
+    
+    返回:
+        bool: 可以读写Parquet时返回True
+    """
+    return pa is not None
+
+def duckdb_available():
+    """
+    检查是否安装了duckdb
+    
+    返回:
+        bool: 可以使用DuckDB后端时返回True
+    """
+    return duckdb is not None
+
+def get_sqlite_engine(db_name):
+    """
+    获取数据库文件对应的SQLAlchemy引擎，同一文件只创建一次
+    
+    参数:
+        db_name (str): 数据库文件名
+        
+    返回:
+        sqlalchemy.engine.Engine: 数据库引擎
+    """
+    key = os.path.abspath(db_name)
+    with _sqlite_engines_lock:
+        engine = _sqlite_engines.get(key)
+        if engine is None:
+            engine = create_engine(f'sqlite:///{db_name}')
+            event.listen(engine, 'connect', set_sqlite_pragmas)
+            _sqlite_engines[key] = engine
+        return engine
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """新建SQLite连接时启用WAL模式和synchronous=NORMAL"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def get_primary_key(table_name, columns):
+    """
+    获取数据表的主键列
+    
+    参数:
+        table_name (str): 表名
+        columns (list): 要写入的列
+        
+    返回:
+        list: 主键列，表没有配置主键或数据中缺少主键列时返回None
+    """
+    key_columns = SQLITE_PRIMARY_KEYS.get(table_name)
+    if not key_columns or any(column not in columns for column in key_columns):
+        return None
+    return key_columns
+
+def get_sqlite_type(series):
+    """按pandas列类型确定SQLite列类型"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(series):
+        return 'REAL'
+    return 'TEXT'
+
+def to_sqlite_value(value):
+    """将单个值转换为sqlite3可以直接绑定的类型，日期保存为YYYY-MM-DD文本，带时间的保存为YYYY-MM-DD HH:MM:SS"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d' if value.time() == datetime.time() else '%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+def to_sqlite_rows(df):
+    """
+    按列将DataFrame转换为sqlite3可以直接绑定的行元组，缺失值转换为None
+    
+    参数:
+        df (pandas.DataFrame): 要写入的数据
+        
+    返回:
+        list: 行元组列表
+    """
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            has_time = (series.dropna() != series.dropna().dt.normalize()).any()
+            values = series.dt.strftime('%Y-%m-%d %H:%M:%S' if has_time else '%Y-%m-%d')
+            columns.append([None if pd.isna(value) else value for value in values])
+        elif series.dtype == object:
+            columns.append([to_sqlite_value(value) for value in series])
+        else:
+            values = series.astype(object).where(series.notna(), None)
+            columns.append([value.item() if hasattr(value, 'item') else value for value in values])
+    return list(zip(*columns))
+
+def ensure_sqlite_table(cursor, table_name, df, key_columns):
+    """
+    确保数据表存在且包含要写入的列：表不存在时按主键建表，缺少的列追加到表中，
+    已有的表没有主键时建立主键列的唯一索引（先删除主键重复的旧记录）
+    
+    参数:
+        cursor (sqlite3.Cursor): 数据库游标
+        table_name (str): 表名
+        df (pandas.DataFrame): 要写入的数据
+        key_columns (list): 主键列，为None时不建立主键
+    """
+    existing = cursor.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    if not existing:
+        column_defs = [f'"{column}" {get_sqlite_type(df[column])}' for column in df.columns]
+        if key_columns:
+            column_defs.append(f"PRIMARY KEY ({quote_columns(key_columns)})")
+        cursor.execute(f'CREATE TABLE "{table_name}" ({", ".join(column_defs)})')
+        create_sqlite_indexes(cursor, table_name, list(df.columns))
+        return
+    
+    existing_columns = [row[1] for row in existing]
+    for column in df.columns:
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{column}" {get_sqlite_type(df[column])}')
+    create_sqlite_indexes(cursor, table_name, existing_columns + [c for c in df.columns if c not in existing_columns])
+    
+    primary_key = [row[1] for row in sorted(existing, key=lambda row: row[5]) if row[5]]
+    if not key_columns or primary_key == key_columns:
+        return
+    index_name = f"{table_name}_primary_key"
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,)).fetchone():
+        return
+    # 旧版本用to_sql建立的表没有主键，可能存在重复记录，保留最后写入的一条
+    cursor.execute(f'DELETE FROM "{table_name}" WHERE rowid NOT IN '
+                   f'(SELECT MAX(rowid) FROM "{table_name}" GROUP BY {quote_columns(key_columns)})')
+    cursor.execute(f'CREATE UNIQUE INDEX "{index_name}" ON "{table_name}" ({quote_columns(key_columns)})')
+
+def create_sqlite_indexes(cursor, table_name, columns):
+    """
+    建立SQLITE_INDEXES中配置的二级索引，跳过表中不存在的列
+    
+    参数:
+        cursor (sqlite3.Cursor): 数据库游标
+        table_name (str): 表名
+        columns (list): 表中的列
+    """
+    for index_columns in SQLITE_INDEXES.get(table_name, []):
+        if all(column in columns for column in index_columns):
+            index_name = f"{table_name}_{'_'.join(index_columns)}"
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({quote_columns(index_columns)})')
+
+def quote_columns(columns):
+    """将列名加上双引号并用逗号连接，用于SQL语句"""
+    return ', '.join(f'"{column}"' for column in columns)
+
+def upsert_to_sqlite(df, db_name, table_name, key_columns=None, replace=False, batch_rows=None):
+    """
+    批量写入SQLite：有主键时按主键插入或更新（内容相同的记录不会重写），没有主键时直接追加
+    
+    参数:
+        df (pandas.DataFrame): 要写入的数据
+        db_name (str): 数据库文件名
+        table_name (str): 表名
+        key_columns (list): 主键列，默认为None表示使用SQLITE_PRIMARY_KEYS中的配置
+        replace (bool): 是否先删除整张表再写入，默认为False
+        batch_rows (int): 每次executemany的行数，默认为None表示使用SQLITE_BATCH_ROWS
+        
+    返回:
+        int: 写入的记录数
+    """
+    columns = list(df.columns)
+    key_columns = key_columns or get_primary_key(table_name, columns)
+    batch_rows = batch_rows or SQLITE_BATCH_ROWS
+    sql = f'INSERT INTO "{table_name}" ({quote_columns(columns)}) VALUES ({", ".join("?" for _ in columns)})'
+    if key_columns:
+        value_columns = [column for column in columns if column not in key_columns]
+        conflict = quote_columns(key_columns)
+        if value_columns:
+            updates = ', '.join(f'"{column}" = excluded."{column}"' for column in value_columns)
+            changed = ' OR '.join(f'"{column}" IS NOT excluded."{column}"' for column in value_columns)
+            sql += f' ON CONFLICT ({conflict}) DO UPDATE SET {updates} WHERE {changed}'
+        else:
+            sql += f' ON CONFLICT ({conflict}) DO NOTHING'
+    
+    connection = get_sqlite_engine(db_name).raw_connection()
+    try:
+        cursor = connection.cursor()
+        if replace:
+            cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        ensure_sqlite_table(cursor, table_name, df, key_columns)
+        for start in range(0, len(df), batch_rows):
+            batch = df.iloc[start:start + batch_rows]
+            cursor.executemany(sql, to_sqlite_rows(batch))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return len(df)
+
+def save_to_file(df, file_path):
+    """
+    按文件扩展名将DataFrame保存为Parquet或CSV文件
+    
+    参数:
+        df (pandas.DataFrame): 要保存的数据
+        file_path (str): 文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV
+    """
+    if file_path.endswith('.parquet'):
+        save_to_parquet(df, file_path)
+    else:
+        save_to_csv(df, file_path)
 
 def save_to_csv(df, file_path):
     """
@@ -19,10 +309,13 @@ def save_to_csv(df, file_path):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
     # 保存为CSV，使用UTF-8编码
-    df.to_csv(file_path, index=False, encoding='utf-8-sig')
+    with metrics.track('storage_operation', 'storage_operations_total', operation='save_to_csv') as op:
+        df.to_csv(file_path, index=False, encoding='utf-8-sig')
+        op['rows'] = len(df)
+        op['bytes'] = os.path.getsize(file_path)
     print(f"数据已保存到: {file_path}")
 
-def save_to_sqlite(df, db_name, table_name, if_exists='replace'):
+def save_to_sqlite(df, db_name, table_name, if_exists='upsert'):
     """
     将DataFrame保存到SQLite数据库
     
@@ -30,37 +323,1008 @@ def save_to_sqlite(df, db_name, table_name, if_exists='replace'):
         df (pandas.DataFrame): 要保存的数据
         db_name (str): 数据库文件名
         table_name (str): 表名
-        if_exists (str): 如果表已存在的处理方式，可选值: 'fail', 'replace', 'append'
+        if_exists (str): 如果表已存在的处理方式，可选值: 'upsert'（按主键插入或更新，保留其他记录；
+                         表没有配置主键时按'replace'处理）, 'fail', 'replace', 'append'
     """
-    # 创建SQLite连接
-    engine = create_engine(f'sqlite:///{db_name}')
-    
-    # 保存到数据库
-    df.to_sql(table_name, engine, if_exists=if_exists, index=False)
+    with SQLITE_WRITE_LOCK, metrics.track('storage_operation', 'storage_operations_total', operation='save_to_sqlite') as op:
+        if if_exists == 'fail':
+            df.to_sql(table_name, get_sqlite_engine(db_name), if_exists=if_exists, index=False)
+        else:
+            replace = if_exists == 'replace' or (if_exists == 'upsert' and not get_primary_key(table_name, df.columns))
+            upsert_to_sqlite(df, db_name, table_name, replace=replace)
+        op['rows'] = len(df)
+        op['bytes'] = get_data_bytes(df)
     print(f"数据已保存到数据库: {db_name}, 表: {table_name}")
 
-def read_from_csv(file_path):
+class ChunkedWriter:
     """
-    从CSV文件读取数据
+    分块写入器，将数据逐块追加到CSV文件、SQLite表或Parquet文件，不在内存中保留已写入的数据
+    
+    参数:
+        output_file (str): 输出文件路径，以.parquet结尾时写入Parquet，否则写入CSV，默认为None
+        db_name (str): 数据库文件名，默认为None
+        table_name (str): 表名，默认为None
+        columns (list): 输出的列，各块数据按此列顺序对齐，默认为None表示使用第一块数据的列
+        if_exists (str): 数据库表已存在时第一块数据的处理方式，'replace'（重建表）或'append'（按主键插入或更新），
+                         默认为'replace'
+    """
+    
+    def __init__(self, output_file=None, db_name=None, table_name=None, columns=None, if_exists='replace'):
+        self.output_file = output_file
+        self.db_name = db_name
+        self.table_name = table_name
+        self.if_exists = if_exists
+        self.columns = list(columns) if columns is not None else None
+        self.rows_written = 0
+        self.parquet_writer = None
+        
+        if output_file:
+            # 确保目录存在
+            os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    
+    def write(self, df):
+        """
+        追加一块数据
+        
+        参数:
+            df (pandas.DataFrame): 要写入的数据
+        """
+        if df.empty:
+            return
+        
+        if self.columns is None:
+            self.columns = list(df.columns)
+        df = df.reindex(columns=self.columns)
+        first_chunk = self.rows_written == 0
+        
+        if self.output_file and self.output_file.endswith('.parquet'):
+            with metrics.track('storage_operation', 'storage_operations_total', operation='write_parquet_chunk') as op:
+                table = to_arrow_table(df)
+                if self.parquet_writer is None:
+                    remove_path(self.output_file)
+                    self.parquet_writer = pq.ParquetWriter(self.output_file, table.schema)
+                else:
+                    table = table.cast(self.parquet_writer.schema, safe=False)
+                self.parquet_writer.write_table(table)
+                op['rows'] = len(df)
+                op['bytes'] = table.nbytes
+        elif self.output_file:
+            with metrics.track('storage_operation', 'storage_operations_total', operation='write_csv_chunk') as op:
+                size_before = 0 if first_chunk or not os.path.exists(self.output_file) else os.path.getsize(self.output_file)
+                df.to_csv(self.output_file, mode='w' if first_chunk else 'a', header=first_chunk,
+                          index=False, encoding='utf-8-sig')
+                op['rows'] = len(df)
+                op['bytes'] = os.path.getsize(self.output_file) - size_before
+        
+        if self.db_name and self.table_name:
+            with SQLITE_WRITE_LOCK, metrics.track('storage_operation', 'storage_operations_total', operation='write_sqlite_chunk') as op:
+                upsert_to_sqlite(df, self.db_name, self.table_name, replace=first_chunk and self.if_exists == 'replace')
+                op['rows'] = len(df)
+                op['bytes'] = get_data_bytes(df)
+        
+        self.rows_written += len(df)
+    
+    def close(self):
+        """结束写入，关闭打开的文件"""
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        
+        if self.rows_written:
+            if self.output_file:
+                print(f"数据已保存到: {self.output_file}")
+            if self.db_name and self.table_name:
+                print(f"数据已保存到数据库: {self.db_name}, 表: {self.table_name}")
+
+def get_filter_date_column(columns, date_column=None):
+    """
+    确定按日期筛选时使用的列
+    
+    参数:
+        columns (list): 数据中的列
+        date_column (str): 指定的日期列，默认为None表示使用DATE_COLUMNS中第一个存在的列
+        
+    返回:
+        str: 日期列，数据中没有日期列时返回None
+    """
+    if date_column is not None:
+        return date_column if date_column in columns else None
+    return next((column for column in DATE_COLUMNS if column in columns), None)
+
+def get_date_range(start_date=None, end_date=None):
+    """
+    将日期范围转换为左闭右开区间 [开始日期, 结束日期次日)
+    
+    参数:
+        start_date (str): 开始日期，YYYYMMDD或YYYY-MM-DD格式，默认为None表示不限
+        end_date (str): 结束日期（包含），默认为None表示不限
+        
+    返回:
+        tuple: (pandas.Timestamp或None, pandas.Timestamp或None)
+    """
+    start = pd.Timestamp(start_date) if start_date else None
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else None
+    return start, end
+
+def read_data(data_source, table_name, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+    """
+    按数据源类型选择存储后端读取数据，只读取需要的列和满足条件的记录
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、DuckDB数据库文件或SQLite数据库名称
+        table_name (str): 表名，数据源为CSV或Parquet文件时忽略
+        columns (list): 要读取的列，默认为None表示读取全部列；不存在的列会被忽略
+        fund_codes (list): 只读取这些基金的记录，默认为None表示不限
+        start_date (str): 只读取日期不早于该日期的记录，默认为None表示不限
+        end_date (str): 只读取日期不晚于该日期的记录，默认为None表示不限
+        date_column (str): 按日期筛选的列，默认为None表示使用DATE_COLUMNS中第一个存在的列
+        
+    返回:
+        pandas.DataFrame: 读取的数据
+    """
+    return get_storage_backend(data_source).read(table_name, columns=columns, fund_codes=fund_codes,
+                                                 start_date=start_date, end_date=end_date, date_column=date_column)
+
+def read_from_csv(file_path, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+    """
+    从CSV文件读取数据，指定筛选条件时逐块读取并筛选，不在内存中保留其他记录
     
     参数:
         file_path (str): CSV文件路径
+        columns (list): 要读取的列，默认为None表示读取全部列；不存在的列会被忽略
+        fund_codes (list): 只读取这些基金的记录，默认为None表示不限
+        start_date (str): 只读取日期不早于该日期的记录，默认为None表示不限
+        end_date (str): 只读取日期不晚于该日期的记录，默认为None表示不限
+        date_column (str): 按日期筛选的列，默认为None表示使用DATE_COLUMNS中第一个存在的列
+        
+    返回:
+        pandas.DataFrame: 读取的数据
+    """
+    with metrics.track('storage_operation', 'storage_operations_total', operation='read_from_csv') as op:
+        if columns is None and fund_codes is None and not start_date and not end_date:
+            df = pd.read_csv(file_path, encoding='utf-8-sig')
+        else:
+            header = list(pd.read_csv(file_path, encoding='utf-8-sig', nrows=0).columns)
+            output_columns = [column for column in columns if column in header] if columns is not None else header
+            date_column = get_filter_date_column(header, date_column) if start_date or end_date else None
+            start, end = get_date_range(start_date, end_date)
+            code_filter = set(str(code) for code in fund_codes) if fund_codes is not None and '基金代码' in header else None
+            read_columns = set(output_columns) | {date_column, '基金代码' if code_filter is not None else None}
+            
+            chunks = []
+            for chunk_df in pd.read_csv(file_path, encoding='utf-8-sig', usecols=lambda column: column in read_columns,
+                                        dtype={column: str for column in CSV_CODE_COLUMNS}, chunksize=CSV_READ_CHUNK_ROWS):
+                mask = pd.Series(True, index=chunk_df.index)
+                if code_filter is not None:
+                    mask &= chunk_df['基金代码'].isin(code_filter)
+                if date_column is not None:
+                    dates = pd.to_datetime(chunk_df[date_column], errors='coerce')
+                    if start is not None:
+                        mask &= dates >= start
+                    if end is not None:
+                        mask &= dates < end
+                chunks.append(chunk_df.loc[mask, output_columns])
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=output_columns)
+        op['rows'] = len(df)
+        op['bytes'] = os.path.getsize(file_path)
+    return df
+
+def read_from_sqlite(db_name, table_name, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+    """
+    从SQLite数据库读取数据，筛选条件在数据库中执行，可使用基金代码和日期上的索引
+    
+    参数:
+        db_name (str): 数据库文件名
+        table_name (str): 表名
+        columns (list): 要读取的列，默认为None表示读取全部列；不存在的列会被忽略
+        fund_codes (list): 只读取这些基金的记录，默认为None表示不限
+        start_date (str): 只读取日期不早于该日期的记录，默认为None表示不限
+        end_date (str): 只读取日期不晚于该日期的记录，默认为None表示不限
+        date_column (str): 按日期筛选的列，默认为None表示使用DATE_COLUMNS中第一个存在的列
         
     返回:
         pandas.DataFrame: 读取的数据
     """
-    return pd.read_csv(file_path, encoding='utf-8-sig')
+    engine = get_sqlite_engine(db_name)
+    with metrics.track('storage_operation', 'storage_operations_total', operation='read_from_sqlite') as op:
+        if columns is None and fund_codes is None and not start_date and not end_date:
+            df = pd.read_sql_table(table_name, engine)
+        else:
+            table_columns = get_sqlite_columns(db_name, table_name)
+            if table_columns is None:
+                raise ValueError(f"数据库 {db_name} 中没有表 {table_name}")
+            output_columns = [column for column in columns if column in table_columns] if columns is not None else table_columns
+            
+            # 日期以YYYY-MM-DD文本保存，按文本比较即可使用日期列上的索引
+            conditions = []
+            params = {}
+            date_column = get_filter_date_column(table_columns, date_column) if start_date or end_date else None
+            start, end = get_date_range(start_date, end_date)
+            if date_column is not None and start is not None:
+                conditions.append(f'"{date_column}" >= :start_date')
+                params['start_date'] = start.strftime('%Y-%m-%d')
+            if date_column is not None and end is not None:
+                conditions.append(f'"{date_column}" < :end_date')
+                params['end_date'] = end.strftime('%Y-%m-%d')
+            
+            code_batches = [None]
+            if fund_codes is not None and '基金代码' in table_columns:
+                codes = sorted(set(str(code) for code in fund_codes))
+                code_batches = [codes[i:i + SQLITE_MAX_VARIABLES] for i in range(0, len(codes), SQLITE_MAX_VARIABLES)]
+            
+            frames = []
+            with engine.connect() as conn:
+                for batch in code_batches:
+                    batch_conditions = list(conditions)
+                    batch_params = dict(params)
+                    if batch is not None:
+                        batch_conditions.append(f'"基金代码" IN ({", ".join(f":c{i}" for i in range(len(batch)))})')
+                        batch_params.update({f"c{i}": code for i, code in enumerate(batch)})
+                    query = f'SELECT {quote_columns(output_columns)} FROM "{table_name}"'
+                    if batch_conditions:
+                        query += f" WHERE {' AND '.join(batch_conditions)}"
+                    frames.append(pd.read_sql_query(text(query), conn, params=batch_params))
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0] if frames else pd.DataFrame(columns=output_columns)
+        op['rows'] = len(df)
+        op['bytes'] = get_data_bytes(df)
+    return df
+
+def read_fund_codes(data_source, table_name):
+    """
+    读取数据中出现的所有基金代码，只读取基金代码列
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、DuckDB数据库文件或SQLite数据库名称
+        table_name (str): 表名，数据源为CSV或Parquet文件时忽略
+        
+    返回:
+        list: 去重后的基金代码列表
+    """
+    return get_storage_backend(data_source).read_fund_codes(table_name)
 
-def read_from_sqlite(db_name, table_name):
+def get_sqlite_columns(db_name, table_name):
     """
-    从SQLite数据库读取数据
+    获取SQLite表的列名
     
     参数:
         db_name (str): 数据库文件名
         table_name (str): 表名
         
+    返回:
+        list: 列名列表，数据库或表不存在时返回None
+    """
+    if not os.path.exists(db_name):
+        return None
+    inspector = inspect(get_sqlite_engine(db_name))
+    if not inspector.has_table(table_name):
+        return None
+    return [column['name'] for column in inspector.get_columns(table_name)]
+
+def count_sqlite_rows(db_name, table_name):
+    """
+    统计SQLite表的记录数
+    
+    参数:
+        db_name (str): 数据库文件名
+        table_name (str): 表名
+        
+    返回:
+        int: 记录数
+    """
+    with get_sqlite_engine(db_name).connect() as conn:
+        return conn.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+
+def delete_from_sqlite(db_name, table_name, column, values, batch_size=500):
+    """
+    删除SQLite表中指定列取值在给定列表中的记录
+    
+    参数:
+        db_name (str): 数据库文件名
+        table_name (str): 表名
+        column (str): 列名
+        values (list): 要删除的取值列表
+        batch_size (int): 每条DELETE语句包含的取值个数，默认为500
+        
+    返回:
+        int: 删除的记录数
+    """
+    values = list(values)
+    deleted = 0
+    with SQLITE_WRITE_LOCK, get_sqlite_engine(db_name).begin() as conn, \
+            metrics.track('storage_operation', 'storage_operations_total', operation='delete_from_sqlite') as op:
+        for i in range(0, len(values), batch_size):
+            batch = values[i:i + batch_size]
+            params = {f"v{j}": value for j, value in enumerate(batch)}
+            placeholders = ', '.join(f":v{j}" for j in range(len(batch)))
+            result = conn.execute(text(f'DELETE FROM "{table_name}" WHERE "{column}" IN ({placeholders})'), params)
+            deleted += result.rowcount
+        op['rows'] = deleted
+    return deleted
+
+def hash_dataframe(df):
+    """
+    计算DataFrame内容的哈希值，列名、列顺序和各单元格取值相同时哈希值相同
+    
+    参数:
+        df (pandas.DataFrame): 数据
+        
+    返回:
+        str: 十六进制哈希值
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(column) for column in df.columns], ensure_ascii=False).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).values.tobytes())
+    return digest.hexdigest()
+
+def remove_path(path):
+    """
+    删除文件或目录，不存在时忽略
+    
+    参数:
+        path (str): 文件或目录路径
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def to_arrow_table(df):
+    """
+    将DataFrame转换为带类型的Arrow表：日期列为date32，净值等数值列为float64，代码类列为字典编码字符串
+    
+    参数:
+        df (pandas.DataFrame): 要转换的数据
+        
+    返回:
+        pyarrow.Table: 转换后的Arrow表
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column in DATE_COLUMNS:
+            df[column] = pd.to_datetime(df[column], errors='coerce').dt.date
+        elif column in FLOAT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        elif column in DICTIONARY_COLUMNS:
+            df[column] = df[column].astype('string')
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for column in DICTIONARY_COLUMNS:
+        if column in table.column_names:
+            index = table.column_names.index(column)
+            table = table.set_column(index, column, pc.dictionary_encode(table[column]))
+    return table.replace_schema_metadata(None)
+
+def save_to_parquet(df, file_path):
+    """
+    将DataFrame保存为Parquet文件，先写临时文件再替换
+    
+    参数:
+        df (pandas.DataFrame): 要保存的数据
+        file_path (str): Parquet文件路径
+    """
+    # 确保目录存在
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    
+    tmp_file = f"{file_path}.tmp"
+    with metrics.track('storage_operation', 'storage_operations_total', operation='save_to_parquet') as op:
+        pq.write_table(to_arrow_table(df), tmp_file, compression='zstd')
+        op['rows'] = len(df)
+        op['bytes'] = os.path.getsize(tmp_file)
+    if os.path.isdir(file_path):
+        shutil.rmtree(file_path)
+    os.replace(tmp_file, file_path)
+
+def link_parquet_dataset(files, dataset_dir):
+    """
+    用硬链接将一组Parquet文件组织为数据集目录，并写入统一的表结构元数据，不复制数据
+    
+    数据集目录已存在时只更新有变化的文件：已经链接到同一源文件的文件保持不动，
+    没有文件变化时也不重写表结构元数据
+    
+    参数:
+        files (list): (源文件路径, 数据集中的相对路径) 列表
+        dataset_dir (str): 数据集目录
+        
+    返回:
+        int: 数据集的总记录数
+    """
+    with metrics.track('storage_operation', 'storage_operations_total', operation='link_parquet_dataset') as op:
+        op['rows'] = build_parquet_dataset(files, dataset_dir)
+    return op['rows']
+
+def build_parquet_dataset(files, dataset_dir):
+    """
+    建立或更新数据集目录，参数和返回值与link_parquet_dataset相同
+    """
+    if os.path.isdir(dataset_dir):
+        return update_parquet_dataset(files, dataset_dir)
+    
+    tmp_dir = f"{dataset_dir}.tmp"
+    remove_path(tmp_dir)
+    os.makedirs(tmp_dir)
+    
+    schemas = []
+    total_rows = 0
+    for source_file, relative_path in files:
+        target_file = os.path.join(tmp_dir, relative_path)
+        os.makedirs(os.path.dirname(target_file), exist_ok=True)
+        try:
+            os.link(source_file, target_file)
+        except OSError:
+            # 不支持硬链接（如跨文件系统）时复制文件
+            shutil.copyfile(source_file, target_file)
+        metadata = pq.read_metadata(target_file)
+        schemas.append(metadata.schema.to_arrow_schema())
+        total_rows += metadata.num_rows
+    
+    if schemas:
+        pq.write_metadata(pa.unify_schemas(schemas), os.path.join(tmp_dir, '_common_metadata'))
+    
+    remove_path(dataset_dir)
+    os.replace(tmp_dir, dataset_dir)
+    return total_rows
+
+def update_parquet_dataset(files, dataset_dir):
+    """
+    原地更新已存在的数据集目录，只替换与源文件不同的文件并删除多余的文件
+    
+    参数:
+        files (list): (源文件路径, 数据集中的相对路径) 列表
+        dataset_dir (str): 数据集目录
+        
+    返回:
+        int: 数据集的总记录数
+    """
+    schemas = []
+    total_rows = 0
+    changed = 0
+    expected = set()
+    for source_file, relative_path in files:
+        target_file = os.path.join(dataset_dir, relative_path)
+        expected.add(os.path.normpath(target_file))
+        if not (os.path.exists(target_file) and os.path.samefile(source_file, target_file)):
+            os.makedirs(os.path.dirname(target_file), exist_ok=True)
+            tmp_file = f"{target_file}.tmp"
+            remove_path(tmp_file)
+            try:
+                os.link(source_file, tmp_file)
+            except OSError:
+                shutil.copyfile(source_file, tmp_file)
+            os.replace(tmp_file, target_file)
+            changed += 1
+        metadata = pq.read_metadata(target_file)
+        schemas.append(metadata.schema.to_arrow_schema())
+        total_rows += metadata.num_rows
+    
+    # 删除已不在源文件列表中的文件
+    for root, _, file_names in os.walk(dataset_dir):
+        for file_name in file_names:
+            file_path = os.path.normpath(os.path.join(root, file_name))
+            if file_name.endswith('.parquet') and file_path not in expected:
+                os.remove(file_path)
+                changed += 1
+    
+    if changed and schemas:
+        save_path = os.path.join(dataset_dir, '_common_metadata')
+        tmp_file = f"{save_path}.tmp"
+        pq.write_metadata(pa.unify_schemas(schemas), tmp_file)
+        os.replace(tmp_file, save_path)
+    print(f"数据集 {dataset_dir} 中有 {changed} 个文件发生变化")
+    return total_rows
+
+def read_from_parquet(file_path, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+    """
+    从Parquet文件或数据集目录读取数据，筛选条件下推到扫描过程，只解码需要的列和行组
+    
+    参数:
+        file_path (str): Parquet文件或数据集目录路径
+        columns (list): 要读取的列，默认为None表示读取全部列；不存在的列会被忽略
+        fund_codes (list): 只读取这些基金的记录，默认为None表示不限
+        start_date (str): 只读取日期不早于该日期的记录，默认为None表示不限
+        end_date (str): 只读取日期不晚于该日期的记录，默认为None表示不限
+        date_column (str): 按日期筛选的列，默认为None表示使用DATE_COLUMNS中第一个存在的列
+        
     返回:
         pandas.DataFrame: 读取的数据
     """
-    engine = create_engine(f'sqlite:///{db_name}')
-    return pd.read_sql_table(table_name, engine)
+    common_metadata = os.path.join(file_path, '_common_metadata')
+    schema = pq.read_schema(common_metadata) if os.path.exists(common_metadata) else None
+    dataset = ds.dataset(file_path, schema=schema, format='parquet')
+    names = dataset.schema.names
+    if columns is not None:
+        columns = [column for column in columns if column in names]
+    
+    expression = None
+    if fund_codes is not None and '基金代码' in names:
+        codes = pa.array(sorted(set(str(code) for code in fund_codes)), type=pa.string())
+        field = pc.field('基金代码')
+        if pa.types.is_dictionary(dataset.schema.field('基金代码').type):
+            field = field.cast(pa.string())
+        expression = field.isin(codes)
+    date_column = get_filter_date_column(names, date_column) if start_date or end_date else None
+    if date_column is not None:
+        start, end = get_date_range(start_date, end_date)
+        date_type = dataset.schema.field(date_column).type
+        for bound, compare in ((start, pc.field(date_column).__ge__), (end, pc.field(date_column).__lt__)):
+            if bound is None:
+                continue
+            # 日期列按date32保存，旧数据集中的文本日期按YYYY-MM-DD比较
+            if pa.types.is_date(date_type) or pa.types.is_timestamp(date_type):
+                value = pa.scalar(bound.date(), type=pa.date32()).cast(date_type)
+            else:
+                value = bound.strftime('%Y-%m-%d')
+            condition = compare(value)
+            expression = condition if expression is None else expression & condition
+    
+    with metrics.track('storage_operation', 'storage_operations_total', operation='read_from_parquet') as op:
+        table = dataset.to_table(columns=columns, filter=expression)
+        op['rows'] = table.num_rows
+        op['bytes'] = table.nbytes
+    return table.to_pandas()
+
+def build_filter_sql(columns, fund_codes=None, start_date=None, end_date=None, date_column=None):
+    """
+    生成按基金代码和日期范围筛选的WHERE子句，使用?占位符
+    
+    参数:
+        columns (list): 表中的列
+        fund_codes (list): 只读取这些基金的记录，默认为None表示不限
+        start_date (str): 开始日期，默认为None表示不限
+        end_date (str): 结束日期（包含），默认为None表示不限
+        date_column (str): 按日期筛选的列，默认为None表示使用DATE_COLUMNS中第一个存在的列
+        
+    返回:
+        tuple: (WHERE子句，没有条件时为空字符串, 参数列表)
+    """
+    conditions = []
+    params = []
+    if fund_codes is not None and '基金代码' in columns:
+        codes = sorted(set(str(code) for code in fund_codes))
+        if not codes:
+            return ' WHERE 1 = 0', []
+        conditions.append(f'"基金代码" IN ({", ".join("?" for _ in codes)})')
+        params.extend(codes)
+    date_column = get_filter_date_column(columns, date_column) if start_date or end_date else None
+    if date_column is not None:
+        start, end = get_date_range(start_date, end_date)
+        if start is not None:
+            conditions.append(f'"{date_column}" >= CAST(? AS DATE)')
+            params.append(start.strftime('%Y-%m-%d'))
+        if end is not None:
+            conditions.append(f'"{date_column}" < CAST(? AS DATE)')
+            params.append(end.strftime('%Y-%m-%d'))
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where, params
+
+class StorageBackend(ABC):
+    """
+    存储后端接口：保存和按条件读取数据表，并提供分组平均和频数统计两种聚合
+    
+    子类需实现save和read；能用SQL聚合的后端继承SqlStorageBackend，
+    聚合在后端中执行，只返回聚合结果，否则读取所需的列后用pandas聚合
+    """
+    
+    @abstractmethod
+    def save(self, df, table_name):
+        """
+        保存数据表
+        
+        参数:
+            df (pandas.DataFrame): 要保存的数据
+            table_name (str): 表名
+        """
+    
+    @abstractmethod
+    def read(self, table_name, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+        """
+        按条件读取数据表，参数与read_data相同
+        
+        返回:
+            pandas.DataFrame: 读取的数据
+        """
+    
+    def get_columns(self, table_name):
+        """
+        获取数据表的列
+        
+        参数:
+            table_name (str): 表名
+            
+        返回:
+            list: 列名列表
+        """
+        return list(self.read(table_name, columns=[]).columns)
+    
+    def get_relation(self, table_name):
+        """
+        获取SQL中引用数据表的FROM子句
+        
+        参数:
+            table_name (str): 表名
+            
+        返回:
+            str: FROM子句中的表达式，后端不支持SQL聚合时返回None
+        """
+        return None
+    
+    def cast_numeric(self, column):
+        """
+        生成将列转换为数值的SQL表达式，无法转换的值为NULL
+        
+        参数:
+            column (str): 列名
+            
+        返回:
+            str: SQL表达式
+        """
+        return f'TRY_CAST("{column}" AS DOUBLE)'
+    
+    def read_fund_codes(self, table_name):
+        """
+        读取数据表中出现的所有基金代码
+        
+        参数:
+            table_name (str): 表名
+            
+        返回:
+            list: 去重后的基金代码列表
+        """
+        relation = self.get_relation(table_name)
+        if relation is not None:
+            if '基金代码' not in self.get_columns(table_name):
+                return []
+            return self.query(f'SELECT DISTINCT "基金代码" FROM {relation}')['基金代码'].astype(str).tolist()
+        codes_df = self.read(table_name, columns=['基金代码'])
+        return codes_df['基金代码'].dropna().astype(str).unique().tolist() if '基金代码' in codes_df.columns else []
+    
+    def group_mean(self, table_name, by, columns, sort_by=None):
+        """
+        按列分组计算各数值列的平均值
+        
+        参数:
+            table_name (str): 表名
+            by (str): 分组列
+            columns (list): 计算平均值的列，不存在的列会被忽略
+            sort_by (str): 按该列的平均值从高到低排序，默认为None表示按分组列排序
+            
+        返回:
+            pandas.DataFrame: 以分组列为索引、各列平均值为列的数据
+        """
+        table_columns = self.get_columns(table_name)
+        columns = [column for column in columns if column in table_columns]
+        relation = self.get_relation(table_name)
+        if relation is None:
+            df = self.read(table_name, columns=[by] + columns)
+            for column in columns:
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+            result = df.groupby(by)[columns].mean()
+        else:
+            averages = ', '.join(f'AVG({self.cast_numeric(column)}) AS "{column}"' for column in columns)
+            result = self.query(f'SELECT "{by}", {averages} FROM {relation} GROUP BY "{by}"').set_index(by)
+        if sort_by in result.columns:
+            return result.sort_values(sort_by, ascending=False)
+        return result.sort_index()
+    
+    def top_rows(self, table_name, column, limit):
+        """
+        读取某列数值最大的若干条记录
+        
+        参数:
+            table_name (str): 表名
+            column (str): 排序的列
+            limit (int): 记录数
+            
+        返回:
+            pandas.DataFrame: 按该列从高到低排列的记录，该列为空的记录排在最后
+        """
+        relation = self.get_relation(table_name)
+        if relation is None:
+            df = self.read(table_name)
+            order = pd.to_numeric(df[column], errors='coerce').sort_values(ascending=False, na_position='last')
+            return df.loc[order.index[:limit]].reset_index(drop=True)
+        return self.query(f'SELECT * FROM {relation} ORDER BY {self.cast_numeric(column)} DESC NULLS LAST '
+                          f'LIMIT {int(limit)}')
+    
+    def value_counts(self, table_name, column, where=None, limit=None):
+        """
+        统计某列各取值出现的次数
+        
+        参数:
+            table_name (str): 表名
+            column (str): 统计的列
+            where (dict): 列名到取值的映射，只统计满足全部条件的记录，默认为None表示不限
+            limit (int): 只返回出现次数最多的前若干个取值，默认为None表示全部返回
+            
+        返回:
+            pandas.Series: 以取值为索引、出现次数为值，按次数从高到低排列
+        """
+        where = where or {}
+        relation = self.get_relation(table_name)
+        if relation is None:
+            df = self.read(table_name, columns=[column] + list(where))
+            for name, value in where.items():
+                df = df[df[name] == value]
+            counts = df[column].value_counts()
+            return counts.head(limit) if limit else counts
+        
+        conditions = [f'"{column}" IS NOT NULL'] + [f'"{name}" = ?' for name in where]
+        sql = (f'SELECT "{column}", COUNT(*) AS count FROM {relation} WHERE {" AND ".join(conditions)} '
+               f'GROUP BY "{column}" ORDER BY count DESC, "{column}"')
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        result = self.query(sql, list(where.values()))
+        return pd.Series(result['count'].values, index=pd.Index(result[column], name=column), name='count')
+
+class SqlStorageBackend(StorageBackend):
+    """
+    能用SQL聚合的存储后端接口，get_relation返回FROM子句时聚合以query在后端中执行
+    """
+    
+    @abstractmethod
+    def get_relation(self, table_name):
+        """
+        获取SQL中引用数据表的FROM子句
+        
+        参数:
+            table_name (str): 表名
+            
+        返回:
+            str: FROM子句中的表达式，当前环境不支持SQL聚合时返回None
+        """
+    
+    @abstractmethod
+    def query(self, sql, params=None):
+        """
+        执行SQL查询
+        
+        参数:
+            sql (str): 使用?占位符的SQL语句
+            params (list): 参数列表，默认为None
+            
+        返回:
+            pandas.DataFrame: 查询结果
+        """
+
+class CsvBackend(StorageBackend):
+    """
+    CSV存储后端，一个文件保存一张表，聚合在pandas中进行
+    
+    参数:
+        file_path (str): CSV文件路径
+    """
+    
+    def __init__(self, file_path):
+        self.file_path = file_path
+    
+    def save(self, df, table_name):
+        save_to_csv(df, self.file_path)
+    
+    def read(self, table_name, **filters):
+        return read_from_csv(self.file_path, **filters)
+    
+    def get_columns(self, table_name):
+        return list(pd.read_csv(self.file_path, encoding='utf-8-sig', nrows=0).columns)
+
+class ParquetBackend(SqlStorageBackend):
+    """
+    Parquet存储后端，一个文件或数据集目录保存一张表；安装了duckdb时聚合直接在Parquet文件上以SQL执行
+    
+    参数:
+        file_path (str): Parquet文件或数据集目录路径
+    """
+    
+    def __init__(self, file_path):
+        self.file_path = file_path
+    
+    def save(self, df, table_name):
+        save_to_parquet(df, self.file_path)
+    
+    def read(self, table_name, **filters):
+        return read_from_parquet(self.file_path, **filters)
+    
+    def get_columns(self, table_name):
+        common_metadata = os.path.join(self.file_path, '_common_metadata')
+        schema = pq.read_schema(common_metadata) if os.path.exists(common_metadata) else None
+        return ds.dataset(self.file_path, schema=schema, format='parquet').schema.names
+    
+    def get_relation(self, table_name):
+        if not duckdb_available():
+            return None
+        return get_duckdb_parquet_scan(self.file_path)
+    
+    def query(self, sql, params=None):
+        with metrics.track('storage_operation', 'storage_operations_total', operation='query_parquet') as op:
+            with duckdb.connect() as conn:
+                result = conn.execute(sql, params or []).fetchdf()
+            op['rows'] = len(result)
+            op['bytes'] = get_data_bytes(result)
+        return result
+
+class SqliteBackend(SqlStorageBackend):
+    """
+    SQLite存储后端，聚合在数据库中以SQL执行
+    
+    参数:
+        db_name (str): 数据库文件名
+    """
+    
+    def __init__(self, db_name):
+        self.db_name = db_name
+    
+    def save(self, df, table_name):
+        save_to_sqlite(df, self.db_name, table_name)
+    
+    def read(self, table_name, **filters):
+        return read_from_sqlite(self.db_name, table_name, **filters)
+    
+    def get_columns(self, table_name):
+        columns = get_sqlite_columns(self.db_name, table_name)
+        if columns is None:
+            raise ValueError(f"数据库 {self.db_name} 中没有表 {table_name}")
+        return columns
+    
+    def get_relation(self, table_name):
+        return f'"{table_name}"'
+    
+    def cast_numeric(self, column):
+        # SQLite没有TRY_CAST，只对按数值保存的值求平均，其他值视为NULL
+        return f'CASE WHEN typeof("{column}") IN (\'integer\', \'real\') THEN "{column}" END'
+    
+    def query(self, sql, params=None):
+        with metrics.track('storage_operation', 'storage_operations_total', operation='query_sqlite') as op:
+            with get_sqlite_engine(self.db_name).connect() as conn:
+                result = pd.read_sql_query(sql, conn, params=tuple(params or ()))
+            op['rows'] = len(result)
+            op['bytes'] = get_data_bytes(result)
+        return result
+
+class DuckDBBackend(SqlStorageBackend):
+    """
+    DuckDB存储后端：数据以Parquet文件保存在数据目录中，DuckDB数据库中为每张表建立读取这些文件的视图，
+    筛选和聚合以向量化SQL直接在Parquet文件上执行
+    
+    参数:
+        db_name (str): DuckDB数据库文件
+        data_dir (str): Parquet文件所在目录，默认为None表示数据库文件所在目录
+    """
+    
+    def __init__(self, db_name, data_dir=None):
+        if not duckdb_available():
+            raise ImportError("使用DuckDB存储需要安装duckdb: pip install duckdb")
+        self.db_name = db_name
+        self.data_dir = data_dir or os.path.dirname(db_name) or '.'
+    
+    def connect(self, read_only=True):
+        """
+        打开数据库连接
+        
+        参数:
+            read_only (bool): 是否以只读方式打开，默认为True
+            
+        返回:
+            duckdb.DuckDBPyConnection: 数据库连接
+        """
+        return duckdb.connect(self.db_name, read_only=read_only)
+    
+    def register(self, table_name, file_path):
+        """
+        建立或替换读取Parquet文件或数据集目录的视图
+        
+        参数:
+            table_name (str): 表名
+            file_path (str): Parquet文件或数据集目录路径
+        """
+        if not os.path.exists(file_path):
+            return
+        os.makedirs(os.path.dirname(self.db_name) or '.', exist_ok=True)
+        with DUCKDB_WRITE_LOCK:
+            conn = self.connect(read_only=False)
+            try:
+                conn.execute(f'CREATE OR REPLACE VIEW "{table_name}" AS SELECT * FROM '
+                             f'{get_duckdb_parquet_scan(os.path.abspath(file_path))}')
+            finally:
+                conn.close()
+        print(f"已在DuckDB数据库 {self.db_name} 中建立视图: {table_name}")
+    
+    def save(self, df, table_name):
+        file_path = os.path.join(self.data_dir, f'{table_name}.parquet')
+        save_to_parquet(df, file_path)
+        self.register(table_name, file_path)
+    
+    def get_columns(self, table_name):
+        return self.query(f'SELECT * FROM "{table_name}" LIMIT 0').columns.tolist()
+    
+    def get_relation(self, table_name):
+        return f'"{table_name}"'
+    
+    def query(self, sql, params=None):
+        with metrics.track('storage_operation', 'storage_operations_total', operation='query_duckdb') as op:
+            conn = self.connect()
+            try:
+                result = conn.execute(sql, params or []).fetchdf()
+            finally:
+                conn.close()
+            op['rows'] = len(result)
+            op['bytes'] = get_data_bytes(result)
+        return result
+    
+    def read(self, table_name, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+        table_columns = self.get_columns(table_name)
+        output_columns = [column for column in columns if column in table_columns] if columns is not None else table_columns
+        where, params = build_filter_sql(table_columns, fund_codes, start_date, end_date, date_column)
+        if not output_columns:
+            return pd.DataFrame()
+        return self.query(f'SELECT {quote_columns(output_columns)} FROM "{table_name}"{where}', params)
+
+def get_duckdb_parquet_scan(file_path):
+    """
+    生成DuckDB读取Parquet文件或数据集目录的表函数调用
+    
+    参数:
+        file_path (str): Parquet文件或数据集目录路径
+        
+    返回:
+        str: read_parquet表函数调用；数据集中不同基金的文件按列名合并，不把code_prefix分区目录作为列
+    """
+    pattern = os.path.join(file_path, '**', '*.parquet') if os.path.isdir(file_path) else file_path
+    pattern = pattern.replace("'", "''")
+    return f"read_parquet('{pattern}', union_by_name=true, hive_partitioning=false)"
+
+# 按数据源的扩展名选择存储后端，其他数据源视为SQLite数据库
+STORAGE_BACKENDS = {
+    '.csv': CsvBackend,
+    '.parquet': ParquetBackend,
+    '.duckdb': DuckDBBackend,
+}
+
+def get_storage_backend(data_source):
+    """
+    按数据源获取存储后端
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、DuckDB数据库文件或SQLite数据库名称
+        
+    返回:
+        StorageBackend: 存储后端
+    """
+    backend_class = STORAGE_BACKENDS.get(os.path.splitext(data_source)[1], SqliteBackend)
+    return backend_class(data_source)
+
+def load_watermarks(file_path):
+    """
+    读取各基金的数据高水位（已保存的最新日期）
+    
+    参数:
+        file_path (str): 高水位文件路径
+        
+    返回:
+        dict: 基金代码到最新日期(YYYY-MM-DD)的映射，文件不存在时返回空字典
+    """
+    if not os.path.exists(file_path):
+        return {}
+    
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('watermarks', {})
+    except Exception as e:
+        print(f"读取高水位文件失败: {e}")
+        return {}
+
+def save_watermarks(watermarks, file_path):
+    """
+    保存各基金的数据高水位，先写临时文件再替换，避免中断时损坏原文件
+    
+    参数:
+        watermarks (dict): 基金代码到最新日期(YYYY-MM-DD)的映射
+        file_path (str): 高水位文件路径
+    """
+    # 确保目录存在
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    
+    tmp_file = f"{file_path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'watermarks': watermarks,
+            'last_update': time.strftime('%Y-%m-%d %H:%M:%S')
+        }, f, ensure_ascii=False)
+    os.replace(tmp_file, file_path)
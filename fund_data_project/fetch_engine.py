@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+并发抓取引擎模块，提供可配置并发度和按接口令牌桶限速的请求调度功能
+同一个引擎可以被多个数据模块同时使用，所有模块共享全局的并发和请求速率预算
+每个接口带有熔断器，接口连续失败时暂停请求，避免一个不稳定的接口拖慢整个抓取过程
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import metrics
+
+# 默认并发线程数
+DEFAULT_MAX_WORKERS = 4
+
+# 默认每个接口每秒请求数
+DEFAULT_RATE_LIMIT = 2.0
+
+# 默认熔断阈值：接口连续失败多少次后熔断，熔断后多少秒允许试探请求
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60.0
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，线程安全
+    
+    参数:
+        rate (float): 每秒补充的令牌数，即允许的平均请求速率
+        capacity (float): 桶容量，即允许的最大突发请求数，默认为None表示与rate相同
+    """
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时阻塞等待
+        
+        参数:
+            tokens (float): 需要的令牌数
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class CircuitBreaker:
+    """
+    接口熔断器，线程安全
+    
+    连续失败达到阈值后进入熔断状态，期间的请求直接失败；经过reset_timeout秒后放行一个试探请求，
+    试探成功则恢复正常，失败则重新熔断
+    
+    参数:
+        failure_threshold (int): 连续失败多少次后熔断
+        reset_timeout (float): 熔断持续的秒数
+    """
+    
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        """
+        判断是否允许发出请求
+        
+        返回:
+            bool: 未熔断，或熔断已到期且当前没有其他试探请求时返回True
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+    
+    def retry_after(self):
+        """
+        获取距离允许试探请求还需等待的秒数
+        
+        返回:
+            float: 等待秒数，未熔断时为0
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+    
+    def record_success(self):
+        """记录一次成功的请求，恢复正常状态"""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+    
+    def record_failure(self):
+        """记录一次失败的请求，连续失败达到阈值或试探请求失败时熔断"""
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+    
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None
+
+
+class FetchEngine:
+    """
+    并发抓取引擎，按接口名称分别限速，并统计实际请求速率
+    
+    参数:
+        max_workers (int): 并发线程数，同时也是所有使用该引擎的模块合计的最大同时请求数
+        rate_limits (dict): 接口名称到每秒请求数的映射，默认为None
+        default_rate (float): 未在rate_limits中配置的接口的每秒请求数
+        global_rate (float): 所有接口合计的每秒请求数，默认为None表示不限制
+        failure_threshold (int): 接口连续失败多少次后熔断
+        reset_timeout (float): 接口熔断持续的秒数
+    """
+    
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, rate_limits=None, default_rate=DEFAULT_RATE_LIMIT,
+                 global_rate=None, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.max_workers = max(1, int(max_workers))
+        self.rate_limits = dict(rate_limits or {})
+        self.default_rate = default_rate
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.request_slots = threading.BoundedSemaphore(self.max_workers)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.buckets = {}
+        self.breakers = {}
+        self.call_executor = None
+        self.request_counts = {}
+        self.cache_hits = {}
+        self.failure_counts = {}
+        self.started_at = None
+        self.lock = threading.Lock()
+    
+    def get_bucket(self, endpoint):
+        """
+        获取指定接口的令牌桶，不存在时创建
+        
+        参数:
+            endpoint (str): 接口名称
+        
+        返回:
+            TokenBucket: 令牌桶
+        """
+        with self.lock:
+            bucket = self.buckets.get(endpoint)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limits.get(endpoint, self.default_rate))
+                self.buckets[endpoint] = bucket
+            return bucket
+    
+    def get_breaker(self, endpoint):
+        """
+        获取指定接口的熔断器，不存在时创建
+        
+        参数:
+            endpoint (str): 接口名称
+        
+        返回:
+            CircuitBreaker: 熔断器
+        """
+        with self.lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self.breakers[endpoint] = breaker
+            return breaker
+    
+    def call(self, endpoint, func, *args, **kwargs):
+        """
+        在限速约束下调用接口
+        
+        参数:
+            endpoint (str): 接口名称，用于选择令牌桶和统计请求数
+            func (callable): 实际调用的函数，带有is_cached属性时，命中缓存的调用不限速也不计入请求数
+            *args, **kwargs: 传递给func的参数
+        
+        返回:
+            func的返回值
+        
+        异常:
+            CircuitOpenError: 接口处于熔断状态
+        """
+        # 命中本地缓存的调用不访问网络，不占用限速令牌
+        is_cached = getattr(func, 'is_cached', None)
+        if is_cached is not None and is_cached(*args, **kwargs):
+            with self.lock:
+                self.cache_hits[endpoint] = self.cache_hits.get(endpoint, 0) + 1
+            return func(*args, **kwargs)
+        
+        breaker = self.get_breaker(endpoint)
+        if not breaker.allow():
+            metrics.inc('fetch_circuit_open_total', endpoint=endpoint)
+            raise CircuitOpenError(f"接口 {endpoint} 连续失败已熔断，{breaker.retry_after():.0f} 秒后重试")
+        
+        wait_start = time.perf_counter()
+        self.get_bucket(endpoint).acquire()
+        if self.global_bucket is not None:
+            self.global_bucket.acquire()
+        metrics.inc('fetch_rate_limit_wait_seconds_total', time.perf_counter() - wait_start, endpoint=endpoint)
+        with self.lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+        # 多个模块并发抓取时，同时进行的网络请求数不超过max_workers
+        with self.request_slots:
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                breaker.record_failure()
+                with self.lock:
+                    self.failure_counts[endpoint] = self.failure_counts.get(endpoint, 0) + 1
+                raise
+        breaker.record_success()
+        return result
+    
+    def call_all(self, calls):
+        """
+        同时发起多个接口调用，每个调用仍受限速和熔断约束
+        
+        参数:
+            calls (list): (endpoint, func, args, kwargs) 四元组列表，参数含义与call()相同
+        
+        返回:
+            list: 与calls顺序一致的 (result, error) 二元组列表，成功时error为None
+        """
+        with self.lock:
+            if self.call_executor is None:
+                self.call_executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        
+        # 最后一个调用在当前线程中执行，其余调用提交到共享线程池
+        futures = [self.call_executor.submit(self.call, endpoint, func, *args, **kwargs)
+                   for endpoint, func, args, kwargs in calls[:-1]]
+        results = []
+        if calls:
+            endpoint, func, args, kwargs = calls[-1]
+            try:
+                last = (self.call(endpoint, func, *args, **kwargs), None)
+            except Exception as e:
+                last = (None, e)
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        if calls:
+            results.append(last)
+        return results
+    
+    def map(self, worker, items):
+        """
+        并发处理一组任务，按完成顺序返回结果
+        
+        参数:
+            worker (callable): 处理单个任务的函数
+            items (list): 任务列表
+        
+        返回:
+            generator: 依次产出 (item, result, error) 三元组，成功时error为None
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(worker, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+    
+    def snapshot(self):
+        """
+        记录当前的请求统计，用于计算某一阶段的请求速率
+        
+        返回:
+            tuple: (时间戳, 各接口请求数, 各接口缓存命中数)
+        """
+        with self.lock:
+            return time.monotonic(), dict(self.request_counts), dict(self.cache_hits)
+    
+    def get_stats(self, since=None):
+        """
+        获取请求统计信息
+        
+        参数:
+            since (tuple): snapshot()返回的统计快照，默认为None表示从第一次请求开始统计
+        
+        返回:
+            dict: 包含总请求数、耗时、总速率、缓存命中数以及各接口请求数和速率
+        """
+        with self.lock:
+            counts = dict(self.request_counts)
+            hits = dict(self.cache_hits)
+            started_at = self.started_at
+        if since is not None:
+            started_at, base_counts, base_hits = since
+            counts = {endpoint: count - base_counts.get(endpoint, 0) for endpoint, count in counts.items()}
+            counts = {endpoint: count for endpoint, count in counts.items() if count > 0}
+            hits = {endpoint: count - base_hits.get(endpoint, 0) for endpoint, count in hits.items()}
+            hits = {endpoint: count for endpoint, count in hits.items() if count > 0}
+        elapsed = time.monotonic() - started_at if started_at is not None else 0.0
+        total = sum(counts.values())
+        return {
+            'total_requests': total,
+            'elapsed_seconds': elapsed,
+            'requests_per_second': total / elapsed if elapsed > 0 else 0.0,
+            'cache_hits': sum(hits.values()),
+            'endpoints': {
+                endpoint: {
+                    'requests': count,
+                    'requests_per_second': count / elapsed if elapsed > 0 else 0.0
+                }
+                for endpoint, count in counts.items()
+            }
+        }
+    
+    def report(self, since=None):
+        """
+        打印实际请求速率
+        
+        参数:
+            since (tuple): snapshot()返回的统计快照，默认为None表示从第一次请求开始统计
+        """
+        stats = self.get_stats(since)
+        print(f"共发起 {stats['total_requests']} 次请求，耗时 {stats['elapsed_seconds']:.1f} 秒，"
+              f"平均 {stats['requests_per_second']:.2f} 次/秒")
+        if stats['cache_hits']:
+            print(f"命中本地缓存 {stats['cache_hits']} 次")
+        for endpoint, endpoint_stats in stats['endpoints'].items():
+            print(f"  {endpoint}: {endpoint_stats['requests']} 次请求，{endpoint_stats['requests_per_second']:.2f} 次/秒")
+        with self.lock:
+            open_endpoints = [endpoint for endpoint, breaker in self.breakers.items() if breaker.is_open]
+        if open_endpoints:
+            print(f"处于熔断状态的接口: {', '.join(open_endpoints)}")
@@ -5,168 +5,1880 @@
 支持增量更新和断点续传功能
 """
 import time
-import random
 import os
 import json
+import threading
 import pandas as pd
 from tqdm import tqdm
-import akshare as ak
-from data_storage import save_to_csv, save_to_sqlite, read_from_csv, read_from_sqlite
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+from data_storage import (
+    save_to_sqlite,
+    read_from_csv,
+    read_from_sqlite,
+    load_watermarks,
+    save_watermarks,
+    save_to_file,
+    save_to_parquet,
+    link_parquet_dataset,
+    parquet_available,
+    remove_path,
+    hash_dataframe,
+    get_sqlite_columns,
+    get_primary_key,
+    count_sqlite_rows,
+    delete_from_sqlite,
+    ChunkedWriter
+)
+from fetch_engine import FetchEngine, CircuitOpenError
+from work_queue import DEFAULT_BATCH_SIZE as DEFAULT_QUEUE_BATCH_SIZE
+from metrics import metrics
+from priority import (
+    DEFAULT_PRIORITY_WEIGHTS,
+    load_watchlist,
+    get_performance_scores,
+    get_staleness_scores,
+    compute_priority_scores,
+    order_by_priority
+)
+from ak_cache import CachedAkshare
+
+# 所有AKShare接口调用都经过本地缓存
+ak = CachedAkshare()
 
 # 定义进度文件和临时数据目录
 PROGRESS_DIR = "./progress"
 TEMP_DATA_DIR = "./temp_data"
 
-# 确保目录存在
-os.makedirs(PROGRESS_DIR, exist_ok=True)
-os.makedirs(TEMP_DATA_DIR, exist_ok=True)
+# 临时数据格式：安装了pyarrow时使用按任务和基金代码前缀分区的Parquet数据集，否则使用CSV
+TEMP_FORMAT = 'parquet' if parquet_available() else 'csv'
+CODE_PREFIX_LENGTH = 2
+
+# 追加写入的临时数据保存为基金分片目录中的新文件，同一基金的分片数达到此值时在合并时压缩为一个文件
+TEMP_COMPACT_PARTS = 20
+
+# 合并临时数据时写入缓冲区的内存上限(MB)和每次读取的行数
+MERGE_MEMORY_LIMIT_MB = 256
+MERGE_CHUNK_ROWS = 100000
+
+# 代码类列按字符串读取，避免丢失前导零
+CODE_COLUMN_DTYPES = {'基金代码': str, '股票代码': str, '债券代码': str}
+
+# 净值数据高水位文件，记录每只基金已保存的最新净值日期
+NAV_WATERMARK_FILE = os.path.join(PROGRESS_DIR, "nav_watermarks.json")
+
+# 基金列表快照文件（不含扩展名）、快照元数据文件和有效期（小时）
+UNIVERSE_FILE = os.path.join(PROGRESS_DIR, "fund_universe")
+UNIVERSE_META_FILE = os.path.join(PROGRESS_DIR, "fund_universe.json")
+UNIVERSE_MAX_AGE_HOURS = 24
+
+# 基金列表获取失败时，过期快照继续使用多少秒后再重新获取
+UNIVERSE_RETRY_SECONDS = 3600
+
+# 各模块适用的基金类别，货币市场基金没有股票持仓和行业配置
+TASK_FUND_CATEGORIES = {
+    'nav': None,
+    'position': ('open', 'etf'),
+    'industry': ('open', 'etf'),
+}
+
+# 抓取并发度、各接口每秒请求数和所有接口合计的每秒请求数
+MAX_WORKERS = 4
+DEFAULT_RATE_LIMIT = 2.0
+GLOBAL_RATE_LIMIT = 6.0
+ENDPOINT_RATE_LIMITS = {
+    'fund_open_fund_info_em': 3.0,
+    'fund_etf_hist_em': 3.0,
+    'fund_portfolio_hold_em': 2.0,
+    'fund_portfolio_bond_hold_em': 2.0,
+    'fund_portfolio_industry_allocation_em': 2.0,
+}
+
+# 进度日志每追加多少条同步一次磁盘，每追加多少条合并到进度快照
+PROGRESS_SYNC_EVERY = 10
+PROGRESS_COMPACT_EVERY = 1000
+
+# 失败接口调用的重试：首次重试等待秒数，最长等待秒数，最多重试次数，单次运行中最多等待多少秒用于重试
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 600.0
+RETRY_MAX_ATTEMPTS = 5
+RETRY_MAX_WAIT = 60.0
+
+# 重试日志每追加多少条合并到重试队列快照
+RETRY_COMPACT_EVERY = 100
+
+# 只追加不删除记录的任务：更新SQLite时按主键插入新记录，不需要先删除有变化的基金的旧记录
+APPEND_ONLY_TASKS = {'nav'}
+
+# 各任务的临时数据名称，用于按临时文件修改时间判断数据的新旧程度
+TASK_TEMP_NAMES = {
+    'nav': ['nav'],
+    'position': ['position_stock', 'position_bond'],
+    'industry': ['industry'],
+}
+
+# 按优先级抓取时发布阶段性结果的检查点，为已处理基金数占待处理基金数的比例
+PRIORITY_CHECKPOINTS = (0.1, 0.25, 0.5)
+
+# 各任务的临时数据内容哈希，按任务名称缓存
+_hash_stores = {}
+_hash_stores_lock = threading.Lock()
+
+# 分布式抓取时使用的任务队列，为None时在本机处理全部基金
+_work_queue = None
+_work_queue_batch_size = None
+
+# 抓取优先级配置、业绩排名得分及其获取时间；默认按基金代码顺序抓取，通过configure_priority开启
+_priority_config = {
+    'enabled': False,
+    'weights': dict(DEFAULT_PRIORITY_WEIGHTS),
+    'watchlist': set(),
+    'checkpoints': (),
+}
+_performance_scores = None
+_performance_scores_timestamp = 0.0
+_performance_scores_lock = threading.Lock()
+
+# 各任务最近一次抓取的进度，供常驻服务的状态接口查询
+_crawl_status = {}
+_crawl_status_lock = threading.Lock()
+
+# 本次运行加载的基金列表快照及其更新时间，常驻运行时超过有效期后重新加载
+_universe_df = None
+_universe_timestamp = 0.0
+_universe_lock = threading.Lock()
+
+# 确保目录存在
+os.makedirs(PROGRESS_DIR, exist_ok=True)
+os.makedirs(TEMP_DATA_DIR, exist_ok=True)
+
+def get_progress_files(task_name):
+    """
+    获取任务的进度快照文件和进度日志文件路径
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        
+    返回:
+        tuple: (进度快照文件路径, 进度日志文件路径)
+    """
+    return (os.path.join(PROGRESS_DIR, f"{task_name}_progress.json"),
+            os.path.join(PROGRESS_DIR, f"{task_name}_progress.journal"))
+
+def save_progress(task_name, processed_codes, total_codes=None):
+    """
+    保存处理进度快照，并清空已合并到快照中的进度日志
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        processed_codes (list): 已处理的基金代码列表
+        total_codes (list): 总的基金代码列表，默认为None
+    """
+    progress_file, journal_file = get_progress_files(task_name)
+    processed_set = set(processed_codes)
+    
+    progress_data = {
+        'processed_codes': list(processed_codes),
+        'last_update': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    
+    if total_codes:
+        remaining_count = sum(1 for code in set(total_codes) if code not in processed_set)
+        progress_data['total_count'] = len(total_codes)
+        progress_data['remaining_count'] = remaining_count
+        progress_data['completion_percentage'] = (len(total_codes) - remaining_count) / len(total_codes) * 100
+    
+    # 先写临时文件再替换，避免中断时损坏快照
+    tmp_file = f"{progress_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(progress_data, f, ensure_ascii=False)
+    os.replace(tmp_file, progress_file)
+    
+    # 快照已包含全部进度，清空进度日志
+    if os.path.exists(journal_file):
+        open(journal_file, 'w', encoding='utf-8').close()
+    
+    print(f"进度已保存到: {progress_file}")
+
+def load_progress(task_name):
+    """
+    加载处理进度，读取进度快照后重放进度日志
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        
+    返回:
+        dict: 进度数据，如果文件不存在则返回空字典
+    """
+    progress_file, journal_file = get_progress_files(task_name)
+    progress_data = {}
+    
+    if os.path.exists(progress_file):
+        try:
+            with open(progress_file, 'r', encoding='utf-8') as f:
+                progress_data = json.load(f)
+            print(f"已加载进度文件: {progress_file}")
+        except Exception as e:
+            print(f"加载进度文件失败: {e}")
+            progress_data = {}
+    else:
+        print(f"进度文件不存在: {progress_file}")
+    
+    if os.path.exists(journal_file):
+        processed_codes = progress_data.get('processed_codes', [])
+        seen_codes = set(processed_codes)
+        replayed = 0
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                # 中断时最后一行可能没有写完，只接受以换行结尾的完整记录
+                code = line.strip()
+                if not line.endswith('\n') or not code or code in seen_codes:
+                    continue
+                seen_codes.add(code)
+                processed_codes.append(code)
+                replayed += 1
+        if replayed:
+            progress_data['processed_codes'] = processed_codes
+            print(f"已从进度日志恢复 {replayed} 条进度: {journal_file}")
+    
+    return progress_data
+
+def compact_progress(task_name, total_codes=None):
+    """
+    压缩进度：将进度日志合并到进度快照中并清空日志
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        total_codes (list): 总的基金代码列表，默认为None
+    """
+    progress_data = load_progress(task_name)
+    save_progress(task_name, progress_data.get('processed_codes', []), total_codes)
+
+class ProgressJournal:
+    """
+    追加式进度日志，每处理完一只基金追加一行，按批次同步到磁盘并定期压缩
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        sync_every (int): 每追加多少条同步一次磁盘，默认为PROGRESS_SYNC_EVERY
+        compact_every (int): 每追加多少条压缩一次进度，默认为PROGRESS_COMPACT_EVERY
+    """
+    
+    def __init__(self, task_name, sync_every=None, compact_every=None):
+        self.task_name = task_name
+        self.sync_every = sync_every or PROGRESS_SYNC_EVERY
+        self.compact_every = compact_every or PROGRESS_COMPACT_EVERY
+        self.journal_file = get_progress_files(task_name)[1]
+        self.file = open(self.journal_file, 'a', encoding='utf-8')
+        self.unsynced = 0
+        self.uncompacted = 0
+    
+    def append(self, fund_code):
+        """
+        记录一只已处理的基金
+        
+        参数:
+            fund_code (str): 基金代码
+        """
+        self.file.write(f"{fund_code}\n")
+        self.unsynced += 1
+        self.uncompacted += 1
+        
+        if self.unsynced >= self.sync_every:
+            self.sync()
+        if self.uncompacted >= self.compact_every:
+            self.compact()
+    
+    def sync(self):
+        """将已追加的进度同步到磁盘"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+    
+    def compact(self, total_codes=None):
+        """
+        将进度日志合并到进度快照中
+        
+        参数:
+            total_codes (list): 总的基金代码列表，默认为None
+        """
+        self.sync()
+        self.file.close()
+        compact_progress(self.task_name, total_codes)
+        self.file = open(self.journal_file, 'a', encoding='utf-8')
+        self.uncompacted = 0
+    
+    def close(self, total_codes=None):
+        """
+        同步并压缩进度，关闭进度日志
+        
+        参数:
+            total_codes (list): 总的基金代码列表，默认为None
+        """
+        self.compact(total_codes)
+        self.file.close()
+
+def get_retry_files(task_name):
+    """
+    获取任务的重试队列快照文件和重试日志文件路径
+    
+    参数:
+        task_name (str): 任务名称，如'position'
+        
+    返回:
+        tuple: (重试队列快照文件路径, 重试日志文件路径)
+    """
+    return (os.path.join(PROGRESS_DIR, f"{task_name}_retry.json"),
+            os.path.join(PROGRESS_DIR, f"{task_name}_retry.journal"))
+
+def load_retry_state(task_name):
+    """
+    读取重试队列快照后重放重试日志
+    
+    参数:
+        task_name (str): 任务名称，如'position'
+        
+    返回:
+        tuple: (待重试记录字典, 超过最大重试次数的记录字典)，键为'基金代码|接口名称'
+    """
+    queue_file, journal_file = get_retry_files(task_name)
+    pending = {}
+    exhausted = {}
+    if os.path.exists(queue_file):
+        with open(queue_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        pending = {RetryQueue.get_key(entry['fund_code'], entry['endpoint']): entry for entry in data.get('pending', [])}
+        exhausted = {RetryQueue.get_key(entry['fund_code'], entry['endpoint']): entry
+                     for entry in data.get('exhausted', [])}
+    
+    if os.path.exists(journal_file):
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                # 中断时最后一行可能没有写完，只接受以换行结尾的完整记录
+                if not line.endswith('\n') or not line.strip():
+                    continue
+                record = json.loads(line)
+                key = record['key']
+                pending.pop(key, None)
+                exhausted.pop(key, None)
+                if record['state'] == 'pending':
+                    pending[key] = record['entry']
+                elif record['state'] == 'exhausted':
+                    exhausted[key] = record['entry']
+    return pending, exhausted
+
+class RetryQueue:
+    """
+    持久化的失败重试队列，记录失败的 (基金代码, 接口名称) 组合，按指数退避安排下次重试时间
+    
+    每次变化向progress/{任务}_retry.journal追加一行记录该组合的最新状态，
+    累计RETRY_COMPACT_EVERY条或关闭时合并到快照progress/{任务}_retry.json，程序重新运行时继续重试；
+    超过最大重试次数的记录移入快照的exhausted列表，不再自动重试
+    
+    参数:
+        task_name (str): 任务名称，如'position'
+        base_delay (float): 首次重试等待秒数，默认为RETRY_BASE_DELAY
+        max_delay (float): 最长等待秒数，默认为RETRY_MAX_DELAY
+        max_attempts (int): 最多重试次数，默认为RETRY_MAX_ATTEMPTS
+    """
+    
+    def __init__(self, task_name, base_delay=None, max_delay=None, max_attempts=None):
+        self.task_name = task_name
+        self.base_delay = base_delay or RETRY_BASE_DELAY
+        self.max_delay = max_delay or RETRY_MAX_DELAY
+        self.max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+        self.queue_file, self.journal_file = get_retry_files(task_name)
+        self.entries = {}
+        self.exhausted = {}
+        self.uncompacted = 0
+        self.lock = threading.Lock()
+        self.load()
+        self.journal = open(self.journal_file, 'a', encoding='utf-8')
+    
+    def load(self):
+        """从快照和重试日志加载重试队列"""
+        try:
+            self.entries, self.exhausted = load_retry_state(self.task_name)
+            if self.entries:
+                print(f"已加载 {len(self.entries)} 条待重试记录: {self.queue_file}")
+        except Exception as e:
+            print(f"加载重试队列失败: {e}")
+    
+    def append(self, key, state, entry=None):
+        """
+        向重试日志追加一条记录并同步到磁盘，累计到RETRY_COMPACT_EVERY条时压缩，调用方需持有锁
+        
+        参数:
+            key (str): 记录的键
+            state (str): 记录的最新状态，'pending'、'exhausted'或'resolved'
+            entry (dict): 记录内容，已解决的记录为None
+        """
+        record = {'key': key, 'state': state}
+        if entry is not None:
+            record['entry'] = entry
+        self.journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.uncompacted += 1
+        if self.uncompacted >= RETRY_COMPACT_EVERY:
+            self.compact()
+    
+    def compact(self):
+        """将重试队列写入快照并清空重试日志，调用方需持有锁"""
+        data = {
+            'pending': list(self.entries.values()),
+            'exhausted': list(self.exhausted.values()),
+            'last_update': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        # 先写临时文件再替换，快照替换后再清空日志，中断时重放日志得到相同的状态
+        tmp_file = f"{self.queue_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.queue_file)
+        self.journal.close()
+        open(self.journal_file, 'w', encoding='utf-8').close()
+        self.journal = open(self.journal_file, 'a', encoding='utf-8')
+        self.uncompacted = 0
+    
+    def close(self):
+        """将重试日志合并到快照中，关闭重试日志"""
+        with self.lock:
+            if self.uncompacted:
+                self.compact()
+            self.journal.close()
+    
+    @staticmethod
+    def get_key(fund_code, endpoint):
+        return f"{fund_code}|{endpoint}"
+    
+    def push(self, fund_code, endpoint, error, retry_after=None):
+        """
+        记录一次失败，安排下次重试时间
+        
+        参数:
+            fund_code (str): 基金代码
+            endpoint (str): 接口名称
+            error (Exception): 失败原因
+            retry_after (float): 至少等待的秒数，如接口熔断的剩余时间，默认为None
+        """
+        key = self.get_key(fund_code, endpoint)
+        with self.lock:
+            entry = self.entries.get(key) or {'fund_code': fund_code, 'endpoint': endpoint, 'attempts': 0}
+            # 熔断期间未实际发出请求，不计入重试次数
+            if not isinstance(error, CircuitOpenError):
+                entry['attempts'] += 1
+            metrics.inc('crawler_retries_total', task=self.task_name, endpoint=endpoint)
+            entry['last_error'] = str(error)
+            
+            if entry['attempts'] > self.max_attempts:
+                self.entries.pop(key, None)
+                self.exhausted[key] = entry
+                print(f"基金 {fund_code} 接口 {endpoint} 已失败 {entry['attempts']} 次，不再自动重试")
+                self.append(key, 'exhausted', entry)
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** max(0, entry['attempts'] - 1))
+                entry['next_retry_at'] = time.time() + max(delay, retry_after or 0)
+                self.entries[key] = entry
+                self.append(key, 'pending', entry)
+    
+    def resolve(self, fund_code, endpoint):
+        """
+        移除已重试成功的记录
+        
+        参数:
+            fund_code (str): 基金代码
+            endpoint (str): 接口名称
+        """
+        key = self.get_key(fund_code, endpoint)
+        with self.lock:
+            if self.entries.pop(key, None) is not None or self.exhausted.pop(key, None) is not None:
+                self.append(key, 'resolved')
+    
+    def pop_due(self):
+        """
+        取出已到重试时间的记录
+        
+        返回:
+            list: 到期的 (基金代码, 接口名称) 列表
+        """
+        now = time.time()
+        with self.lock:
+            return [(entry['fund_code'], entry['endpoint']) for entry in self.entries.values()
+                    if entry.get('next_retry_at', 0) <= now]
+    
+    def next_due_in(self):
+        """
+        获取距离最早一条记录到期的秒数
+        
+        返回:
+            float: 等待秒数，队列为空时返回None
+        """
+        with self.lock:
+            if not self.entries:
+                return None
+            return max(0.0, min(entry.get('next_retry_at', 0) for entry in self.entries.values()) - time.time())
+    
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+def get_retry_counts(task_name):
+    """
+    读取任务重试队列中待重试和已放弃的记录数，不加载到内存中的队列
+    
+    参数:
+        task_name (str): 任务名称，如'position'
+        
+    返回:
+        dict: {'pending': 待重试记录数, 'exhausted': 超过最大重试次数的记录数}
+    """
+    pending, exhausted = load_retry_state(task_name)
+    return {'pending': len(pending), 'exhausted': len(exhausted)}
+
+def drain_retry_queue(retry_queue, fetch_call, engine, max_wait=None):
+    """
+    在本次运行中重试队列中的失败调用，按退避时间等待，等待时间超过max_wait的记录留到下次运行
+    
+    参数:
+        retry_queue (RetryQueue): 重试队列
+        fetch_call (callable): 重试单个调用的函数，签名为fetch_call(engine, fund_code, endpoint)
+        engine (FetchEngine): 抓取引擎
+        max_wait (float): 最多等待秒数，默认为RETRY_MAX_WAIT
+    """
+    max_wait = RETRY_MAX_WAIT if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+    
+    while len(retry_queue):
+        due_in = retry_queue.next_due_in()
+        if due_in is None or time.monotonic() + due_in > deadline:
+            break
+        if due_in > 0:
+            time.sleep(due_in)
+        
+        due = retry_queue.pop_due()
+        for (fund_code, endpoint), _, error in engine.map(lambda item: fetch_call(engine, *item), due):
+            if error is None:
+                retry_queue.resolve(fund_code, endpoint)
+            else:
+                retry_after = engine.get_breaker(endpoint).retry_after()
+                retry_queue.push(fund_code, endpoint, error, retry_after=retry_after)
+    
+    if len(retry_queue):
+        print(f"还有 {len(retry_queue)} 条失败记录将在下次运行时重试: {retry_queue.queue_file}")
+
+class ContentHashStore:
+    """
+    任务临时数据的内容哈希记录，保存在progress/{任务}_hashes.json中；
+    使用任务队列时保存在队列的共享状态中，各进程只写入自己更新过的基金，不会覆盖其他进程的记录
+    
+    记录每只基金最近一次写入临时文件的数据哈希，内容不变时跳过写入；
+    同时记录每个输出目标最近一次合并的时间和记录数，合并时只处理此后有变化的临时文件
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position_stock'等
+    """
+    
+    def __init__(self, task_name):
+        self.task_name = task_name
+        self.hash_file = os.path.join(PROGRESS_DIR, f"{task_name}_hashes.json")
+        self.hashes = {}
+        self.merges = {}
+        self.changed_hashes = set()
+        self.changed_merges = set()
+        self.lock = threading.Lock()
+        self.queue = _work_queue
+        
+        if self.queue is not None:
+            self.hashes = self.queue.get_state(f"{task_name}_hashes")
+            self.merges = self.queue.get_state(f"{task_name}_merges")
+        elif os.path.exists(self.hash_file):
+            try:
+                with open(self.hash_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.hashes = data.get('hashes', {})
+                self.merges = data.get('merges', {})
+            except Exception as e:
+                print(f"加载内容哈希文件失败: {e}")
+    
+    def get(self, fund_code):
+        # 使用任务队列时基金可能由其他进程更新过，读取队列中的最新记录
+        if self.queue is not None:
+            content_hash = self.queue.get_state(f"{self.task_name}_hashes", keys=[fund_code]).get(fund_code)
+            with self.lock:
+                if fund_code not in self.changed_hashes:
+                    self.hashes[fund_code] = content_hash
+        with self.lock:
+            return self.hashes.get(fund_code)
+    
+    def set(self, fund_code, content_hash):
+        """
+        记录基金临时数据的哈希值
+        
+        参数:
+            fund_code (str): 基金代码
+            content_hash (str): 哈希值，为None时删除记录
+        """
+        with self.lock:
+            if content_hash is None:
+                if self.hashes.pop(fund_code, None) is not None:
+                    self.changed_hashes.add(fund_code)
+            elif self.hashes.get(fund_code) != content_hash:
+                self.hashes[fund_code] = content_hash
+                self.changed_hashes.add(fund_code)
+    
+    def get_merge_state(self, target):
+        """
+        获取输出目标最近一次合并的状态
+        
+        参数:
+            target (str): 输出目标，如输出文件路径或'数据库文件名:表名'
+            
+        返回:
+            dict: 包含合并开始时间merged_at和记录数rows，没有记录时返回None
+        """
+        with self.lock:
+            return self.merges.get(target)
+    
+    def set_merge_state(self, target, merged_at, rows):
+        with self.lock:
+            self.merges[target] = {'merged_at': merged_at, 'rows': int(rows)}
+            self.changed_merges.add(target)
+    
+    def save(self):
+        """有变化时将哈希记录保存到磁盘，使用任务队列时只将有变化的记录写入队列"""
+        with self.lock:
+            if not self.changed_hashes and not self.changed_merges:
+                return
+            if self.queue is not None:
+                self.queue.update_state(f"{self.task_name}_hashes",
+                                        {code: self.hashes.get(code) for code in self.changed_hashes})
+                self.queue.update_state(f"{self.task_name}_merges",
+                                        {target: self.merges.get(target) for target in self.changed_merges})
+                self.changed_hashes.clear()
+                self.changed_merges.clear()
+                return
+            data = {
+                'hashes': self.hashes,
+                'merges': self.merges,
+                'last_update': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            tmp_file = f"{self.hash_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.hash_file)
+            self.changed_hashes.clear()
+            self.changed_merges.clear()
+
+def get_hash_store(task_name):
+    """
+    获取任务的内容哈希记录，同一任务在本次运行中共用一个实例
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position_stock'等
+        
+    返回:
+        ContentHashStore: 内容哈希记录
+    """
+    with _hash_stores_lock:
+        store = _hash_stores.get(task_name)
+        if store is None:
+            store = ContentHashStore(task_name)
+            _hash_stores[task_name] = store
+        return store
+
+def save_hash_stores():
+    """保存本次运行中所有有变化的内容哈希记录"""
+    with _hash_stores_lock:
+        stores = list(_hash_stores.values())
+    for store in stores:
+        store.save()
+
+def get_remaining_codes(task_name, all_codes):
+    """
+    获取剩余未处理的基金代码
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        all_codes (list): 所有基金代码列表
+        
+    返回:
+        list: 剩余未处理的基金代码列表
+    """
+    progress_data = load_progress(task_name)
+    
+    if progress_data and 'processed_codes' in progress_data:
+        processed_codes = set(progress_data['processed_codes'])
+        remaining_codes = [code for code in all_codes if code not in processed_codes]
+        print(f"任务 {task_name} 已处理 {len(processed_codes)} 只基金，剩余 {len(remaining_codes)} 只基金")
+        return remaining_codes
+    else:
+        print(f"任务 {task_name} 没有进度记录，将处理所有 {len(all_codes)} 只基金")
+        return all_codes
+
+def get_temp_file(task_name, fund_code, temp_format=None):
+    """
+    获取单个基金的临时数据文件路径
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        fund_code (str): 基金代码
+        temp_format (str): 临时数据格式，'parquet'或'csv'，默认为None表示使用TEMP_FORMAT
+        
+    返回:
+        str: 临时数据文件路径；Parquet按任务和基金代码前缀分区存放
+    """
+    if (temp_format or TEMP_FORMAT) == 'parquet':
+        return os.path.join(TEMP_DATA_DIR, task_name, f"code_prefix={fund_code[:CODE_PREFIX_LENGTH]}",
+                            f"{fund_code}.parquet")
+    return os.path.join(TEMP_DATA_DIR, f"{task_name}_{fund_code}.csv")
+
+def get_temp_part_dir(task_name, fund_code, temp_format=None):
+    """
+    获取单个基金追加写入的分片文件目录，即临时数据文件路径去掉扩展名
+    
+    参数:
+        task_name (str): 任务名称，如'nav'
+        fund_code (str): 基金代码
+        temp_format (str): 临时数据格式，默认为None表示使用TEMP_FORMAT
+        
+    返回:
+        str: 分片文件目录路径
+    """
+    return os.path.splitext(get_temp_file(task_name, fund_code, temp_format))[0]
+
+def get_temp_part_file(task_name, fund_code, part_id=None, temp_format=None):
+    """
+    获取单个基金一次追加写入的分片文件路径
+    
+    参数:
+        task_name (str): 任务名称，如'nav'
+        fund_code (str): 基金代码
+        part_id (str): 分片编号，默认为None表示按当前时间生成，编号按写入顺序递增
+        temp_format (str): 临时数据格式，默认为None表示使用TEMP_FORMAT
+        
+    返回:
+        str: 分片文件路径
+    """
+    part_id = part_id or f"{time.time_ns():020d}"
+    extension = '.parquet' if (temp_format or TEMP_FORMAT) == 'parquet' else '.csv'
+    return os.path.join(get_temp_part_dir(task_name, fund_code, temp_format), f"part-{part_id}{extension}")
+
+def is_temp_part_file(file_path):
+    """判断临时数据文件是否为追加写入的分片文件"""
+    return os.path.basename(file_path).startswith('part-')
+
+def find_temp_files(task_name, fund_code):
+    """
+    查找单个基金已有的临时数据文件，包括完整文件和追加写入的分片文件
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        fund_code (str): 基金代码
+        
+    返回:
+        list: 临时数据文件路径列表，Parquet文件在前，同一格式的完整文件在前、分片文件按写入顺序在后
+    """
+    temp_files = []
+    for temp_format in ('parquet', 'csv'):
+        temp_file = get_temp_file(task_name, fund_code, temp_format)
+        if os.path.exists(temp_file):
+            temp_files.append(temp_file)
+        part_dir = get_temp_part_dir(task_name, fund_code, temp_format)
+        if os.path.isdir(part_dir):
+            extension = os.path.splitext(temp_file)[1]
+            temp_files.extend(os.path.join(part_dir, f) for f in sorted(os.listdir(part_dir))
+                              if f.startswith('part-') and f.endswith(extension))
+    return temp_files
+
+def list_fund_temp_files(directory, prefix, extension):
+    """
+    列出目录中各基金的临时数据文件：名为'前缀+基金代码+扩展名'的完整文件，
+    以及名为'前缀+基金代码'的分片目录中的分片文件
+    
+    参数:
+        directory (str): 目录
+        prefix (str): 文件名前缀
+        extension (str): 扩展名，'.parquet'或'.csv'
+        
+    返回:
+        list: 临时数据文件路径列表，按基金代码排序，同一基金的完整文件在前、分片文件按写入顺序在后
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if not name.startswith(prefix):
+            continue
+        path = os.path.join(directory, name)
+        if name.endswith(extension):
+            fund_code, is_part = name[len(prefix):-len(extension)], False
+            files = [path]
+        elif os.path.isdir(path):
+            fund_code, is_part = name[len(prefix):], True
+            files = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                     if f.startswith('part-') and f.endswith(extension)]
+        else:
+            continue
+        # 基金代码中不含下划线，避免'position'匹配到'position_stock'的文件
+        if '_' not in fund_code:
+            entries.extend(((fund_code, is_part, f), f) for f in files)
+    return [f for _, f in sorted(entries)]
+
+def list_temp_files(task_name):
+    """
+    列出任务的所有临时数据文件，包括Parquet数据集中的文件、CSV文件和各基金追加写入的分片文件
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position_stock'等
+        
+    返回:
+        list: 临时数据文件路径列表
+    """
+    temp_files = []
+    
+    task_dir = os.path.join(TEMP_DATA_DIR, task_name)
+    if os.path.isdir(task_dir):
+        for partition in sorted(os.listdir(task_dir)):
+            partition_dir = os.path.join(task_dir, partition)
+            if os.path.isdir(partition_dir):
+                temp_files.extend(list_fund_temp_files(partition_dir, '', '.parquet'))
+    
+    temp_files.extend(list_fund_temp_files(TEMP_DATA_DIR, f"{task_name}_", '.csv'))
+    return temp_files
+
+def remove_temp_files(temp_files):
+    """
+    删除临时数据文件，删除分片文件后移除已经为空的分片目录
+    
+    参数:
+        temp_files (list): 临时数据文件路径列表
+    """
+    part_dirs = set()
+    for temp_file in temp_files:
+        os.remove(temp_file)
+        if is_temp_part_file(temp_file):
+            part_dirs.add(os.path.dirname(temp_file))
+    for part_dir in part_dirs:
+        if not os.listdir(part_dir):
+            os.rmdir(part_dir)
+
+def get_temp_file_columns(file_path):
+    """
+    读取临时数据文件的列名
+    
+    参数:
+        file_path (str): 临时数据文件路径
+        
+    返回:
+        list: 列名列表
+    """
+    if file_path.endswith('.parquet'):
+        return pq.read_schema(file_path).names
+    return list(pd.read_csv(file_path, encoding='utf-8-sig', nrows=0).columns)
+
+def read_temp_file(file_path, columns=None):
+    """
+    读取临时数据文件
+    
+    参数:
+        file_path (str): 临时数据文件路径
+        columns (list): 要读取的列，默认为None表示读取全部列
+        
+    返回:
+        pandas.DataFrame: 读取的数据
+    """
+    with metrics.track('storage_operation', 'storage_operations_total', operation='read_temp_file') as op:
+        if file_path.endswith('.parquet'):
+            df = pq.read_table(file_path, columns=columns).to_pandas()
+        else:
+            df = pd.read_csv(file_path, encoding='utf-8-sig', dtype=CODE_COLUMN_DTYPES, usecols=columns)
+        op['rows'] = len(df)
+        op['bytes'] = os.path.getsize(file_path)
+    return df
+
+def iter_temp_file_chunks(file_path, chunk_rows=None):
+    """
+    分块读取临时数据文件
+    
+    参数:
+        file_path (str): 临时数据文件路径
+        chunk_rows (int): 每块的行数，默认为None表示使用MERGE_CHUNK_ROWS
+        
+    返回:
+        generator: 依次产出每块数据
+    """
+    chunk_rows = chunk_rows or MERGE_CHUNK_ROWS
+    if file_path.endswith('.parquet'):
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_path, encoding='utf-8-sig', dtype=CODE_COLUMN_DTYPES, chunksize=chunk_rows)
+
+def write_temp_file(data_df, temp_file):
+    """
+    将数据写入临时数据文件，按扩展名保存为Parquet或CSV
+    
+    参数:
+        data_df (pandas.DataFrame): 要写入的数据
+        temp_file (str): 临时数据文件路径
+    """
+    if temp_file.endswith('.parquet'):
+        save_to_parquet(data_df, temp_file)
+        return
+    os.makedirs(os.path.dirname(temp_file) or '.', exist_ok=True)
+    # 先写临时文件再替换，同时进行的阶段性合并不会读到写了一半的文件
+    tmp_file = f"{temp_file}.tmp"
+    with metrics.track('storage_operation', 'storage_operations_total', operation='save_temp_csv') as op:
+        data_df.to_csv(tmp_file, index=False, encoding='utf-8-sig')
+        op['rows'] = len(data_df)
+        op['bytes'] = os.path.getsize(tmp_file)
+    os.replace(tmp_file, temp_file)
+
+def save_temp_data(task_name, fund_code, data_df, append=False):
+    """
+    保存单个基金的临时数据
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        fund_code (str): 基金代码
+        data_df (pandas.DataFrame): 基金数据
+        append (bool): 是否追加到已有的临时数据，默认为False表示覆盖；
+                       追加时写入该基金分片目录中的新文件，不读取和重写已有数据
+    
+    返回:
+        bool: 是否写入了临时文件，数据与已有临时文件内容相同时不写入，返回False
+    """
+    if data_df.empty:
+        return False
+    
+    existing_files = find_temp_files(task_name, fund_code)
+    temp_file = get_temp_file(task_name, fund_code)
+    hash_store = get_hash_store(task_name)
+    
+    # 覆盖写入时比较内容哈希，数据没有变化则保留原文件，合并时也不会被视为有变化
+    content_hash = None
+    if not append:
+        content_hash = hash_dataframe(data_df)
+        if existing_files == [temp_file] and hash_store.get(fund_code) == content_hash:
+            metrics.inc('storage_unchanged_skips_total', task=task_name)
+            return False
+    
+    if append and existing_files:
+        # 追加的数据写成新的分片文件，写入量只与新增记录数有关，分片在合并时压缩
+        write_temp_file(data_df, get_temp_part_file(task_name, fund_code))
+    else:
+        write_temp_file(data_df, temp_file)
+        # 覆盖写入后旧CSV临时文件和分片文件不再保留，避免合并时重复
+        remove_temp_files([f for f in existing_files if f != temp_file])
+    
+    # 追加写入后文件内容不再对应单次获取的数据，删除哈希记录
+    hash_store.set(fund_code, content_hash)
+    return True
+
+def migrate_temp_data(task_name):
+    """
+    将任务的旧CSV临时文件转换为Parquet数据集中的文件
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position_stock'等
+    """
+    if TEMP_FORMAT != 'parquet':
+        return
+    
+    csv_files = [f for f in list_temp_files(task_name) if f.endswith('.csv')]
+    for csv_file in csv_files:
+        fund_code = get_temp_file_code(task_name, csv_file)
+        if is_temp_part_file(csv_file):
+            part_id = os.path.basename(csv_file)[len('part-'):-len('.csv')]
+            parquet_file = get_temp_part_file(task_name, fund_code, part_id, 'parquet')
+        else:
+            parquet_file = get_temp_file(task_name, fund_code, 'parquet')
+        try:
+            save_to_parquet(read_temp_file(csv_file), parquet_file)
+            remove_temp_files([csv_file])
+        except Exception as e:
+            print(f"转换临时文件 {csv_file} 失败: {e}")
+    
+    if csv_files:
+        print(f"已将任务 {task_name} 的 {len(csv_files)} 个CSV临时文件转换为Parquet")
+
+def compact_temp_parts(task_name, min_parts=None):
+    """
+    将分片文件较多的基金的临时数据压缩为一个完整文件
+    
+    压缩后的文件保留各文件中最晚的修改时间，已经合并过的数据不会因压缩被视为有变化
+    
+    参数:
+        task_name (str): 任务名称，如'nav'
+        min_parts (int): 分片数达到此值的基金才压缩，默认为None表示使用TEMP_COMPACT_PARTS
+    """
+    min_parts = min_parts or TEMP_COMPACT_PARTS
+    files_by_code = {}
+    for temp_file in list_temp_files(task_name):
+        files_by_code.setdefault(get_temp_file_code(task_name, temp_file), []).append(temp_file)
+    
+    compacted = 0
+    for fund_code, temp_files in files_by_code.items():
+        if sum(is_temp_part_file(f) for f in temp_files) < min_parts:
+            continue
+        try:
+            data_df = pd.concat([read_temp_file(f) for f in temp_files], ignore_index=True)
+            mtime = max(os.path.getmtime(f) for f in temp_files)
+            temp_file = get_temp_file(task_name, fund_code)
+            write_temp_file(data_df, temp_file)
+            os.utime(temp_file, (mtime, mtime))
+            remove_temp_files([f for f in temp_files if f != temp_file])
+            compacted += 1
+        except Exception as e:
+            print(f"压缩基金 {fund_code} 的临时分片文件失败: {e}")
+    
+    if compacted:
+        print(f"已将任务 {task_name} 中 {compacted} 只基金的临时分片文件压缩为完整文件")
+
+def get_nav_date_column(nav_df):
+    """
+    获取净值数据中的日期列名，开放式基金为'净值日期'，ETF行情为'日期'
+    
+    参数:
+        nav_df (pandas.DataFrame): 净值数据
+        
+    返回:
+        str: 日期列名，不存在时返回None
+    """
+    for column in ('净值日期', '日期'):
+        if column in nav_df.columns:
+            return column
+    return None
+
+def filter_nav_rows(nav_df, start_date=None, end_date=None, watermark=None):
+    """
+    筛选指定日期范围内且晚于高水位的净值数据
+    
+    参数:
+        nav_df (pandas.DataFrame): 净值数据
+        start_date (str): 开始日期，格式为YYYYMMDD，默认为None表示不限制
+        end_date (str): 结束日期，格式为YYYYMMDD，默认为None表示不限制
+        watermark (str): 高水位日期，格式为YYYY-MM-DD，只保留晚于该日期的数据，默认为None
+        
+    返回:
+        pandas.DataFrame: 筛选后的净值数据
+    """
+    date_column = get_nav_date_column(nav_df)
+    if date_column is None or nav_df.empty:
+        return nav_df
+    
+    dates = pd.to_datetime(nav_df[date_column])
+    mask = pd.Series(True, index=nav_df.index)
+    if start_date:
+        mask &= dates >= pd.to_datetime(start_date)
+    if end_date:
+        mask &= dates <= pd.to_datetime(end_date)
+    if watermark:
+        mask &= dates > pd.to_datetime(watermark)
+    return nav_df[mask]
+
+def get_max_nav_date(nav_df):
+    """
+    获取净值数据中的最新日期
+    
+    参数:
+        nav_df (pandas.DataFrame): 净值数据
+        
+    返回:
+        str: 最新日期，格式为YYYY-MM-DD，没有数据时返回None
+    """
+    date_column = get_nav_date_column(nav_df)
+    if date_column is None or nav_df.empty:
+        return None
+    return pd.to_datetime(nav_df[date_column]).max().strftime('%Y-%m-%d')
+
+def get_latest_trading_day(date=None):
+    """
+    获取不晚于指定日期的最近一个交易日，与常驻服务的is_trading_day相同，只排除周末
+    
+    参数:
+        date (str): 日期，默认为None表示当前日期
+        
+    返回:
+        str: 最近一个交易日，格式为YYYY-MM-DD
+    """
+    date = pd.Timestamp(date).normalize() if date else pd.Timestamp.now().normalize()
+    # 周六退回1天，周日退回2天
+    return (date - pd.Timedelta(days=max(date.weekday() - 4, 0))).strftime('%Y-%m-%d')
+
+def load_nav_watermark_state():
+    """
+    读取已保存的基金净值高水位，使用任务队列时从队列的共享状态中读取
+    
+    返回:
+        tuple: (基金代码到最新净值日期的映射, 基金代码到高水位保存时间戳的映射)
+    """
+    if _work_queue is not None:
+        state = _work_queue.get_state('nav_watermarks', include_updated=True)
+        return ({code: value for code, (value, _) in state.items()},
+                {code: updated_at for code, (_, updated_at) in state.items()})
+    watermarks = load_watermarks(NAV_WATERMARK_FILE)
+    watermark_mtime = os.path.getmtime(NAV_WATERMARK_FILE) if os.path.exists(NAV_WATERMARK_FILE) else 0
+    return watermarks, dict.fromkeys(watermarks, watermark_mtime)
+
+def save_nav_watermark_state(watermarks, fund_codes=None):
+    """
+    保存基金净值高水位；使用任务队列时只写入给出的基金，多台机器各自更新不同的基金时互不覆盖
+    
+    参数:
+        watermarks (dict): 基金代码到最新净值日期的映射
+        fund_codes (iterable): 本进程更新过高水位的基金代码，默认为None表示全部
+    """
+    if _work_queue is not None:
+        fund_codes = watermarks.keys() if fund_codes is None else fund_codes
+        _work_queue.update_state('nav_watermarks', {code: watermarks[code] for code in fund_codes if code in watermarks})
+    else:
+        save_watermarks(watermarks, NAV_WATERMARK_FILE)
+
+def load_nav_watermarks(fund_codes):
+    """
+    加载基金净值高水位，对没有记录或临时文件比记录更新的基金，从临时文件中重建高水位
+    
+    参数:
+        fund_codes (list): 基金代码列表
+        
+    返回:
+        dict: 基金代码到最新净值日期(YYYY-MM-DD)的映射
+    """
+    watermarks, saved_times = load_nav_watermark_state()
+    
+    rebuilt_codes = []
+    for fund_code in fund_codes:
+        temp_files = find_temp_files("nav", fund_code)
+        if not temp_files:
+            continue
+        # 上次运行在保存高水位之前中断时，临时文件可能包含比记录更新的数据
+        if fund_code in watermarks and max(os.path.getmtime(f) for f in temp_files) <= saved_times[fund_code]:
+            continue
+        try:
+            max_dates = []
+            for temp_file in temp_files:
+                date_column = get_nav_date_column(pd.DataFrame(columns=get_temp_file_columns(temp_file)))
+                if date_column is not None:
+                    max_dates.append(get_max_nav_date(read_temp_file(temp_file, columns=[date_column])))
+            max_date = max(filter(None, max_dates), default=None)
+            if max_date:
+                watermarks[fund_code] = max_date
+                rebuilt_codes.append(fund_code)
+        except Exception as e:
+            print(f"读取基金 {fund_code} 的临时净值数据失败: {e}")
+    
+    if rebuilt_codes:
+        print(f"从临时文件重建了 {len(rebuilt_codes)} 只基金的净值高水位")
+        save_nav_watermark_state(watermarks, rebuilt_codes)
+    
+    return watermarks
+
+def merge_temp_data(task_name, output_file=None, db_name=None, table_name=None, max_memory_mb=None, return_df=True,
+                    compact=True):
+    """
+    合并临时数据文件，逐块读取临时文件并直接追加到输出文件或数据库
+    
+    参数:
+        task_name (str or list): 任务名称，如'nav', 'position'等，传入列表时将多个任务的数据合并到一起
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
+        db_name (str): 数据库文件名，默认为None
+        table_name (str): 表名，默认为None
+        max_memory_mb (float): 写入缓冲区的内存上限(MB)，默认为None表示使用MERGE_MEMORY_LIMIT_MB
+        return_df (bool): 是否返回合并后的完整数据，默认为True；为False时不在内存中保留全部数据
+        compact (bool): 是否先压缩分片文件较多的基金，默认为True；与抓取同时进行的阶段性合并应为False
+    
+    返回:
+        pandas.DataFrame: 合并后的数据，return_df为False时返回合并的记录数
+    """
+    task_names = [task_name] if isinstance(task_name, str) else list(task_name)
+    for name in task_names:
+        migrate_temp_data(name)
+        if compact:
+            compact_temp_parts(name)
+    task_files = [(name, f) for name in task_names for f in list_temp_files(name)]
+    temp_files = [f for _, f in task_files]
+    
+    if not temp_files:
+        print(f"没有找到任务 {', '.join(task_names)} 的临时数据文件")
+        return pd.DataFrame() if return_df else 0
+    
+    # 找出上次合并到同一输出目标之后有变化的临时文件，输出目标不存在或没有合并记录时为None
+    hash_stores = [get_hash_store(name) for name in task_names]
+    merge_target = output_file or f"{db_name}:{table_name}"
+    merge_started_at = time.time()
+    merge_timer_start = time.perf_counter()
+    merge_states = [store.get_merge_state(merge_target) for store in hash_stores]
+    target_exists = (os.path.exists(output_file) if output_file else
+                     db_name and table_name and get_sqlite_columns(db_name, table_name) is not None)
+    changed_files = None
+    if all(merge_states) and target_exists and not (output_file and db_name and table_name):
+        merged_at = {name: state['merged_at'] for name, state in zip(task_names, merge_states)}
+        changed_files = [(name, f) for name, f in task_files if os.path.getmtime(f) > merged_at[name]]
+    
+    def finish(rows):
+        metrics.observe('storage_operation_duration_seconds', time.perf_counter() - merge_timer_start,
+                        operation='merge_temp_data')
+        metrics.inc('storage_operations_total', status='success', operation='merge_temp_data')
+        metrics.inc('storage_operation_rows_total', rows, operation='merge_temp_data')
+        for store in hash_stores:
+            store.set_merge_state(merge_target, merge_started_at, rows)
+            store.save()
+    
+    if changed_files == [] and not return_df:
+        total_rows = merge_states[0]['rows']
+        print(f"任务 {', '.join(task_names)} 的临时数据自上次合并后没有变化，跳过写入，共 {total_rows} 条记录")
+        finish(total_rows)
+        return total_rows
+    
+    if output_file and output_file.endswith('.parquet') and all(f.endswith('.parquet') for f in temp_files):
+        # 临时数据已是Parquet数据集，合并只需建立硬链接并写入表结构元数据
+        dataset_rows = link_parquet_dataset([(f, os.path.relpath(f, TEMP_DATA_DIR)) for f in temp_files], output_file)
+        print(f"数据已保存到: {output_file}")
+        output_file = None
+        if not return_df and not (db_name and table_name):
+            print(f"已合并 {len(temp_files)} 个临时文件，共 {dataset_rows} 条记录")
+            finish(dataset_rows)
+            return dataset_rows
+    
+    if changed_files and not output_file and not return_df:
+        # 只写入SQLite时，只重新写入有变化的基金的数据
+        total_rows = update_sqlite_partitions(task_files, changed_files, db_name, table_name)
+        if total_rows is not None:
+            finish(total_rows)
+            return total_rows
+    
+    # 先读取各文件的表头，得到与逐个拼接时一致的列顺序
+    columns = []
+    for temp_file in temp_files:
+        try:
+            header = get_temp_file_columns(temp_file)
+            columns.extend(column for column in header if column not in columns)
+        except Exception as e:
+            print(f"读取临时文件 {temp_file} 表头失败: {e}")
+    
+    memory_limit = (max_memory_mb or MERGE_MEMORY_LIMIT_MB) * 1024 * 1024
+    writer = ChunkedWriter(output_file, db_name, table_name, columns)
+    frames = []
+    buffer = []
+    buffer_bytes = 0
+    total_rows = 0
+    
+    def flush():
+        nonlocal buffer, buffer_bytes
+        if buffer:
+            chunk_df = pd.concat(buffer, ignore_index=True)
+            writer.write(chunk_df)
+            if return_df:
+                frames.append(chunk_df)
+        buffer = []
+        buffer_bytes = 0
+    
+    for temp_file in temp_files:
+        try:
+            for chunk_df in iter_temp_file_chunks(temp_file):
+                buffer.append(chunk_df)
+                buffer_bytes += chunk_df.memory_usage(deep=True).sum()
+                total_rows += len(chunk_df)
+                # 缓冲区超过内存上限时写出
+                if buffer_bytes >= memory_limit:
+                    flush()
+        except Exception as e:
+            print(f"读取临时文件 {temp_file} 失败: {e}")
+    
+    flush()
+    writer.close()
+    print(f"已合并 {len(temp_files)} 个临时文件，共 {total_rows} 条记录")
+    finish(total_rows)
+    
+    if not return_df:
+        return total_rows
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def get_temp_file_code(task_name, file_path):
+    """
+    从临时数据文件路径中解析基金代码
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position_stock'等
+        file_path (str): 临时数据文件路径
+        
+    返回:
+        str: 基金代码
+    """
+    file_name = os.path.basename(file_path)
+    if is_temp_part_file(file_path):
+        # 分片文件位于去掉扩展名的临时数据文件路径命名的目录中
+        part_dir = os.path.basename(os.path.dirname(file_path))
+        return part_dir if file_name.endswith('.parquet') else part_dir[len(f"{task_name}_"):]
+    if file_name.endswith('.parquet'):
+        return file_name[:-len('.parquet')]
+    return file_name[len(f"{task_name}_"):-len('.csv')]
+
+def update_sqlite_partitions(task_files, changed_files, db_name, table_name):
+    """
+    只更新SQLite表中数据有变化的基金：删除这些基金的旧记录，再追加这些基金所有临时文件中的数据；
+    只追加的任务不删除旧记录，只按主键写入上次合并后新增或变化的临时文件
+    
+    参数:
+        task_files (list): 合并的全部 (任务名称, 临时文件路径) 列表
+        changed_files (list): 有变化的 (任务名称, 临时文件路径) 列表
+        db_name (str): 数据库文件名
+        table_name (str): 表名
+        
+    返回:
+        int: 更新后表中的记录数，表结构与临时数据不一致需要重写整张表时返回None
+    """
+    table_columns = get_sqlite_columns(db_name, table_name)
+    if not table_columns or '基金代码' not in table_columns:
+        return None
+    
+    changed_codes = {get_temp_file_code(name, f) for name, f in changed_files}
+    append_only = (all(name in APPEND_ONLY_TASKS for name, _ in changed_files)
+                   and get_primary_key(table_name, table_columns) is not None)
+    if not append_only:
+        # 同一只基金可能有多个任务的临时文件（如股票持仓和债券持仓），需要一起重新写入
+        changed_files = [(name, f) for name, f in task_files if get_temp_file_code(name, f) in changed_codes]
+    for _, temp_file in changed_files:
+        if any(column not in table_columns for column in get_temp_file_columns(temp_file)):
+            return None
+    
+    fund_codes = sorted(changed_codes)
+    if append_only:
+        # 每日更新追加的数据在单独的分片文件中，只按主键写入这些文件，写入量只与新增记录数有关
+        deleted_rows = 0
+    else:
+        deleted_rows = delete_from_sqlite(db_name, table_name, '基金代码', fund_codes)
+    
+    writer = ChunkedWriter(db_name=db_name, table_name=table_name, columns=table_columns, if_exists='append')
+    for _, temp_file in changed_files:
+        try:
+            for chunk_df in iter_temp_file_chunks(temp_file):
+                writer.write(chunk_df)
+        except Exception as e:
+            print(f"读取临时文件 {temp_file} 失败: {e}")
+    writer.close()
+    
+    total_rows = count_sqlite_rows(db_name, table_name)
+    print(f"已更新 {len(fund_codes)} 只基金的数据（删除 {deleted_rows} 条，写入 {writer.rows_written} 条），共 {total_rows} 条记录")
+    return total_rows
+
+def clean_temp_data(task_name=None):
+    """
+    清理临时数据文件
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等，默认为None表示清理所有临时文件
+    """
+    if task_name:
+        temp_files = [f for f in os.listdir(TEMP_DATA_DIR) if f.startswith(f"{task_name}_") and f.endswith(".csv")]
+        temp_dirs = [f for f in os.listdir(TEMP_DATA_DIR) if f == task_name or f.startswith(f"{task_name}_")]
+    else:
+        temp_files = [f for f in os.listdir(TEMP_DATA_DIR) if f.endswith(".csv")]
+        temp_dirs = os.listdir(TEMP_DATA_DIR)
+    temp_dirs = [f for f in temp_dirs if os.path.isdir(os.path.join(TEMP_DATA_DIR, f))]
+    
+    for temp_file in temp_files + temp_dirs:
+        file_path = os.path.join(TEMP_DATA_DIR, temp_file)
+        try:
+            remove_path(file_path)
+        except Exception as e:
+            print(f"删除临时文件 {temp_file} 失败: {e}")
+    
+    print(f"已清理 {len(temp_files)} 个临时文件和 {len(temp_dirs)} 个临时数据集目录")
 
-def save_progress(task_name, processed_codes, total_codes=None):
+def configure_akshare_cache(cache_dir=None, offline=False, enabled=True, ttls=None):
     """
-    保存处理进度
+    配置AKShare接口缓存
     
     参数:
-        task_name (str): 任务名称，如'nav', 'position'等
-        processed_codes (list): 已处理的基金代码列表
-        total_codes (list): 总的基金代码列表，默认为None
+        cache_dir (str): 缓存目录，默认为None表示使用默认目录
+        offline (bool): 是否为离线回放模式，只使用缓存数据，默认为False
+        enabled (bool): 是否启用缓存，默认为True
+        ttls (dict): 要修改的接口缓存有效期（秒），默认为None表示使用默认有效期
     """
-    progress_file = os.path.join(PROGRESS_DIR, f"{task_name}_progress.json")
+    ak.configure(cache_dir=cache_dir, offline=offline, enabled=enabled, ttls=ttls)
+    if offline:
+        print(f"离线回放模式，只使用缓存目录 {ak.cache_dir} 中的数据")
+
+def create_fetch_engine(max_workers=None, rate_limit=None, global_rate_limit=None):
+    """
+    创建抓取引擎，多个模块共用同一个引擎时共享并发和请求速率预算
     
-    progress_data = {
-        'processed_codes': processed_codes,
-        'last_update': time.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    参数:
+        max_workers (int): 并发线程数，默认为None表示使用MAX_WORKERS
+        rate_limit (float): 每个接口每秒请求数，默认为None表示使用ENDPOINT_RATE_LIMITS中的配置
+        global_rate_limit (float): 所有接口合计每秒请求数，默认为None表示使用GLOBAL_RATE_LIMIT
     
-    if total_codes:
-        progress_data['total_codes'] = total_codes
-        progress_data['remaining_codes'] = [code for code in total_codes if code not in processed_codes]
-        progress_data['completion_percentage'] = len(processed_codes) / len(total_codes) * 100 if total_codes else 0
+    返回:
+        FetchEngine: 抓取引擎
+    """
+    if rate_limit:
+        rate_limits = {endpoint: rate_limit for endpoint in ENDPOINT_RATE_LIMITS}
+        default_rate = rate_limit
+    else:
+        rate_limits = ENDPOINT_RATE_LIMITS
+        default_rate = DEFAULT_RATE_LIMIT
+    return FetchEngine(max_workers or MAX_WORKERS, rate_limits, default_rate,
+                       global_rate=global_rate_limit or GLOBAL_RATE_LIMIT)
+
+def configure_work_queue(queue=None, batch_size=None):
+    """
+    设置分布式抓取使用的任务队列
     
-    with open(progress_file, 'w', encoding='utf-8') as f:
-        json.dump(progress_data, f, ensure_ascii=False, indent=2)
+    参数:
+        queue (WorkQueue): 任务队列，默认为None表示关闭分布式抓取
+        batch_size (int): 每批领取的基金数，默认为None表示使用队列的默认值
+    """
+    global _work_queue, _work_queue_batch_size
+    # 内容哈希记录的保存位置随是否使用任务队列而不同，切换前保存并丢弃已加载的记录
+    save_hash_stores()
+    with _hash_stores_lock:
+        _hash_stores.clear()
+    _work_queue = queue
+    _work_queue_batch_size = batch_size
+
+def configure_priority(enabled=False, weights=None, watchlist_file=None, checkpoints=None):
+    """
+    配置抓取优先级和阶段性结果的检查点
     
-    print(f"进度已保存到: {progress_file}")
+    参数:
+        enabled (bool): 是否按优先级排序待处理的基金，默认为False
+        weights (dict): 各项得分的权重，默认为None表示使用DEFAULT_PRIORITY_WEIGHTS
+        watchlist_file (str): 关注列表文件路径，默认为None
+        checkpoints (tuple): 发布阶段性结果的检查点比例，默认为None表示按优先级抓取时使用PRIORITY_CHECKPOINTS、
+                             否则不发布；空元组表示不发布
+    """
+    _priority_config['enabled'] = enabled
+    _priority_config['weights'] = dict(weights or DEFAULT_PRIORITY_WEIGHTS)
+    _priority_config['watchlist'] = load_watchlist(watchlist_file)
+    # 不按优先级抓取时排在前面的只是代码靠前的基金，默认不发布阶段性结果，避免抓取过程中多次合并输出
+    if checkpoints is None:
+        checkpoints = PRIORITY_CHECKPOINTS if enabled else ()
+    _priority_config['checkpoints'] = tuple(checkpoints)
+    if watchlist_file:
+        print(f"关注列表 {watchlist_file} 中有 {len(_priority_config['watchlist'])} 只基金，将优先抓取")
 
-def load_progress(task_name):
+def get_fund_performance_scores():
     """
-    加载处理进度
+    获取基金业绩排名的百分位得分，在基金列表有效期内只获取一次；
+    业绩模块已获取排名数据时直接使用其临时文件，不再请求接口
+    
+    返回:
+        dict: 基金代码到得分的映射，获取失败时返回空字典
+    """
+    global _performance_scores, _performance_scores_timestamp
+    with _performance_scores_lock:
+        if _performance_scores is None or time.time() - _performance_scores_timestamp >= UNIVERSE_MAX_AGE_HOURS * 3600:
+            # 与get_fund_performance_info保存的临时文件相同
+            performance_file = os.path.join(TEMP_DATA_DIR, "performance_data.csv")
+            try:
+                if os.path.exists(performance_file):
+                    performance_df = pd.read_csv(performance_file, encoding='utf-8-sig', dtype=CODE_COLUMN_DTYPES)
+                else:
+                    performance_df = ak.fund_open_fund_rank_em(symbol="全部")
+                _performance_scores = get_performance_scores(performance_df)
+            except Exception as e:
+                print(f"获取基金业绩排名失败，优先级不考虑业绩: {e}")
+                _performance_scores = {}
+            _performance_scores_timestamp = time.time()
+        return _performance_scores
+
+def get_last_updated_times(task_name, fund_codes):
+    """
+    获取各基金数据的最后更新时间：净值按高水位日期，其他任务按临时文件的修改时间
     
     参数:
         task_name (str): 任务名称，如'nav', 'position'等
+        fund_codes (list): 基金代码列表
         
     返回:
-        dict: 进度数据，如果文件不存在则返回空字典
+        dict: 基金代码到最后更新时间戳（秒）的映射，没有数据的基金不在其中
     """
-    progress_file = os.path.join(PROGRESS_DIR, f"{task_name}_progress.json")
-    
-    if os.path.exists(progress_file):
-        try:
-            with open(progress_file, 'r', encoding='utf-8') as f:
-                progress_data = json.load(f)
-            print(f"已加载进度文件: {progress_file}")
-            return progress_data
-        except Exception as e:
-            print(f"加载进度文件失败: {e}")
-            return {}
-    else:
-        print(f"进度文件不存在: {progress_file}")
-        return {}
+    last_updated = {}
+    if task_name == 'nav':
+        watermarks = load_nav_watermark_state()[0]
+        for fund_code in fund_codes:
+            if fund_code in watermarks:
+                last_updated[fund_code] = pd.Timestamp(watermarks[fund_code]).timestamp()
+        return last_updated
+    
+    for fund_code in fund_codes:
+        mtimes = []
+        for temp_name in TASK_TEMP_NAMES.get(task_name, [task_name]):
+            mtimes.extend(os.path.getmtime(f) for f in find_temp_files(temp_name, fund_code))
+        if mtimes:
+            last_updated[fund_code] = max(mtimes)
+    return last_updated
 
-def get_remaining_codes(task_name, all_codes):
+def prioritize_codes(task_name, fund_codes):
     """
-    获取剩余未处理的基金代码
+    按关注列表、业绩排名和数据陈旧程度计算优先级，并将基金代码从高到低排序
     
     参数:
         task_name (str): 任务名称，如'nav', 'position'等
-        all_codes (list): 所有基金代码列表
+        fund_codes (list): 基金代码列表
         
     返回:
-        list: 剩余未处理的基金代码列表
+        tuple: (排序后的基金代码列表, 基金代码到优先级得分的映射)
     """
-    progress_data = load_progress(task_name)
+    weights = _priority_config['weights']
+    watchlist = _priority_config['watchlist']
+    performance_scores = get_fund_performance_scores() if weights.get('performance') else {}
+    staleness_scores = {}
+    if weights.get('staleness'):
+        staleness_scores = get_staleness_scores(get_last_updated_times(task_name, fund_codes), fund_codes, time.time())
+    
+    scores = compute_priority_scores(fund_codes, weights, watchlist, performance_scores, staleness_scores)
+    ordered_codes = order_by_priority(fund_codes, scores)
+    watched = sum(1 for code in fund_codes if code in watchlist)
+    print(f"已按优先级排序 {len(fund_codes)} 只基金，其中关注列表 {watched} 只，"
+          f"优先抓取: {', '.join(ordered_codes[:5])}{' ...' if len(ordered_codes) > 5 else ''}")
+    return ordered_codes, scores
+
+def get_checkpoints(total):
+    """
+    计算发布阶段性结果时的已处理基金数
     
-    if progress_data and 'processed_codes' in progress_data:
-        processed_codes = set(progress_data['processed_codes'])
-        remaining_codes = [code for code in all_codes if code not in processed_codes]
-        print(f"任务 {task_name} 已处理 {len(processed_codes)} 只基金，剩余 {len(remaining_codes)} 只基金")
-        return remaining_codes
-    else:
-        print(f"任务 {task_name} 没有进度记录，将处理所有 {len(all_codes)} 只基金")
-        return all_codes
+    参数:
+        total (int): 待处理的基金数
+        
+    返回:
+        list: 升序排列的已处理基金数，不含全部处理完的情况
+    """
+    return sorted({int(total * ratio) for ratio in _priority_config['checkpoints'] if 0 < ratio < 1} - {0, total})
 
-def save_temp_data(task_name, fund_code, data_df):
+def publish_partial_results(task_name, merge_names, output_file=None, db_name=None, table_name=None):
     """
-    保存单个基金的临时数据
+    将已获取的临时数据合并到输出文件或数据库，使下游分析可以先使用优先级高的基金的数据
     
     参数:
         task_name (str): 任务名称，如'nav', 'position'等
-        fund_code (str): 基金代码
-        data_df (pandas.DataFrame): 基金数据
+        merge_names (str or list): 传给merge_temp_data的临时数据任务名称
+        output_file (str): 输出文件路径，默认为None
+        db_name (str): 数据库文件名，默认为None
+        table_name (str): 表名，默认为None
     """
-    if data_df.empty:
+    if not output_file and not db_name:
         return
-        
-    temp_file = os.path.join(TEMP_DATA_DIR, f"{task_name}_{fund_code}.csv")
-    data_df.to_csv(temp_file, index=False, encoding='utf-8-sig')
+    # 抓取仍在写入分片文件，阶段性合并不压缩分片
+    rows = merge_temp_data(merge_names, output_file, db_name, table_name, return_df=False, compact=False)
+    print(f"任务 {task_name} 已发布阶段性结果，共 {rows} 条记录")
 
-def merge_temp_data(task_name, output_file=None, db_name=None, table_name=None):
+def merge_task_data(task_name, merge_names, output_file=None, db_name=None, table_name=None, return_df=True):
     """
-    合并临时数据文件
+    合并任务的临时数据；使用任务队列时只有所有基金处理完后获得合并租约的进程合并
     
     参数:
         task_name (str): 任务名称，如'nav', 'position'等
-        output_file (str): 输出CSV文件路径，默认为None
+        merge_names (str or list): 传给merge_temp_data的临时数据任务名称
+        output_file (str): 输出文件路径，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
+        return_df (bool): 是否返回合并后的完整数据，默认为True
+        
+    返回:
+        pandas.DataFrame: 合并后的数据，return_df为False时返回记录数；由其他进程合并时返回空数据或0
+    """
+    if _work_queue is None:
+        return merge_temp_data(merge_names, output_file, db_name, table_name, return_df=return_df)
+    
+    with _work_queue.merge_lease(task_name) as acquired:
+        if acquired:
+            print(f"任务 {task_name} 的所有基金已处理完成，由本进程合并数据")
+            return merge_temp_data(merge_names, output_file, db_name, table_name, return_df=return_df)
+    
+    counts = _work_queue.get_counts(task_name)
+    print(f"任务 {task_name} 由其他进程合并数据（待处理 {counts['pending']}，处理中 {counts['leased']}，"
+          f"已完成 {counts['done']}，失败 {counts['failed']}）")
+    return pd.DataFrame() if return_df else 0
+
+def update_crawl_status(task_name, **fields):
+    """
+    更新任务的抓取进度
+    
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        **fields: 要更新的字段，如total、done、failed、state
+    """
+    with _crawl_status_lock:
+        _crawl_status.setdefault(task_name, {}).update(fields)
+
+def get_crawl_status():
+    """
+    获取各任务最近一次抓取的进度
     
     返回:
-        pandas.DataFrame: 合并后的数据
+        dict: 任务名称到 {'label', 'state', 'total', 'done', 'failed', 'started_at'} 的映射，
+              state为'running'或'finished'，从任务队列领取时total为None
     """
-    temp_files = [f for f in os.listdir(TEMP_DATA_DIR) if f.startswith(f"{task_name}_") and f.endswith(".csv")]
+    with _crawl_status_lock:
+        return {task_name: dict(status) for task_name, status in _crawl_status.items()}
+
+def crawl_funds_from_queue(task_name, fund_codes, fetch_fund, label, engine, priorities=None):
+    """
+    从任务队列中按批领取基金并获取数据，直到队列中没有待处理的基金
     
-    if not temp_files:
-        print(f"没有找到任务 {task_name} 的临时数据文件")
-        return pd.DataFrame()
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        fund_codes (list): 本进程计算出的待处理基金代码列表，会加入队列中（已存在的保持原状态）
+        fetch_fund (callable): 处理单只基金的函数，签名为fetch_fund(engine, fund_code)
+        label (str): 数据名称，用于进度条和日志，如'净值信息'
+        engine (FetchEngine): 抓取引擎
+        priorities (dict): 基金代码到优先级得分的映射，各进程按优先级从高到低领取，默认为None
+    
+    返回:
+        list: 本进程处理成功的基金代码列表
+    """
+    queue = _work_queue
+    batch_size = _work_queue_batch_size or DEFAULT_QUEUE_BATCH_SIZE
+    added = queue.enqueue(task_name, fund_codes, priorities)
+    counts = queue.get_counts(task_name)
+    print(f"任务队列 {queue.db_path} 中新加入 {added} 只基金，待处理 {counts['pending']}，处理中 {counts['leased']}，"
+          f"已完成 {counts['done']}，工作进程: {queue.worker_id}")
     
-    all_data = pd.DataFrame()
+    processed_codes = []
+    stats_snapshot = engine.snapshot()
+    update_crawl_status(task_name, label=label, state='running', total=None, done=0, failed=0,
+                        started_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    with tqdm(desc=f"获取基金{label}") as pbar:
+        while True:
+            batch = queue.claim(task_name, batch_size)
+            if not batch:
+                # 其他进程持有的租约到期后可以重新领取，等待最早到期的租约
+                next_expiry = queue.next_lease_expiry(task_name)
+                if next_expiry is None:
+                    break
+                time.sleep(min(max(next_expiry - time.time(), 0) + 1, queue.lease_seconds))
+                continue
+            
+            # 处理成功的基金在complete提交前一直续租，避免批次较慢时租约到期被其他进程重复领取
+            with queue.keep_alive(task_name, batch) as active:
+                succeeded = []
+                for fund_code, _, error in engine.map(lambda code: fetch_fund(engine, code), batch):
+                    pbar.update(1)
+                    if error is None:
+                        succeeded.append(fund_code)
+                    else:
+                        print(f"获取基金 {fund_code} {label}失败: {error}")
+                        queue.release(task_name, fund_code, error)
+                        active.discard(fund_code)
+                    update_crawl_status(task_name, done=pbar.n, failed=pbar.n - len(processed_codes) - len(succeeded))
+                queue.complete(task_name, succeeded)
+            processed_codes.extend(succeeded)
+    
+    update_crawl_status(task_name, state='finished')
+    save_hash_stores()
+    engine.report(stats_snapshot)
+    return processed_codes
+
+def crawl_funds(task_name, fund_codes, fetch_fund, label, engine=None, track_progress=True, checkpoint=None):
+    """
+    并发获取一组基金的数据，保存进度和临时数据的方式与逐个获取时一致
+    启用优先级时按优先级从高到低处理，并在检查点调用checkpoint发布阶段性结果
+    设置了任务队列时改为从队列中领取基金，处理进度记录在队列中
     
-    for temp_file in temp_files:
-        file_path = os.path.join(TEMP_DATA_DIR, temp_file)
-        try:
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
-            all_data = pd.concat([all_data, df], ignore_index=True)
-        except Exception as e:
-            print(f"读取临时文件 {temp_file} 失败: {e}")
+    参数:
+        task_name (str): 任务名称，如'nav', 'position'等
+        fund_codes (list): 待处理的基金代码列表
+        fetch_fund (callable): 处理单只基金的函数，签名为fetch_fund(engine, fund_code)
+        label (str): 数据名称，用于进度条和日志，如'净值信息'
+        engine (FetchEngine): 抓取引擎，默认为None表示使用默认配置创建
+        track_progress (bool): 是否记录处理进度，默认为True
+        checkpoint (callable): 已处理基金数到达检查点时调用，无参数，默认为None
+    
+    返回:
+        list: 本次处理成功的基金代码列表
+    """
+    if engine is None:
+        engine = create_fetch_engine()
+    
+    priorities = None
+    if _priority_config['enabled'] and fund_codes:
+        fund_codes, priorities = prioritize_codes(task_name, fund_codes)
     
-    # 保存合并后的数据
-    if output_file:
-        save_to_csv(all_data, output_file)
+    if _work_queue is not None:
+        # 使用任务队列时由获得合并租约的进程在全部完成后合并，不发布阶段性结果
+        return crawl_funds_from_queue(task_name, fund_codes, fetch_fund, label, engine, priorities)
     
-    if db_name and table_name:
-        save_to_sqlite(all_data, db_name, table_name)
+    # 记录本次处理的基金代码，进度逐条追加到进度日志
+    processed_codes = []
+    journal = ProgressJournal(task_name) if track_progress else None
+    checkpoints = get_checkpoints(len(fund_codes)) if checkpoint is not None else []
+    update_crawl_status(task_name, label=label, state='running', total=len(fund_codes), done=0, failed=0,
+                        started_at=time.strftime('%Y-%m-%d %H:%M:%S'))
     
-    return all_data
+    # 使用tqdm显示进度条
+    stats_snapshot = engine.snapshot()
+    try:
+        with tqdm(total=len(fund_codes), desc=f"获取基金{label}") as pbar:
+            for fund_code, _, error in engine.map(lambda code: fetch_fund(engine, code), fund_codes):
+                pbar.update(1)
+                if error is None:
+                    # 记录已处理的基金代码
+                    processed_codes.append(fund_code)
+                    if journal is not None:
+                        journal.append(fund_code)
+                else:
+                    print(f"获取基金 {fund_code} {label}失败: {error}")
+                update_crawl_status(task_name, done=pbar.n, failed=pbar.n - len(processed_codes))
+                
+                # 到达检查点时发布阶段性结果，其余基金在后台线程中继续获取
+                if checkpoints and pbar.n >= checkpoints[0]:
+                    while checkpoints and pbar.n >= checkpoints[0]:
+                        checkpoints.pop(0)
+                    try:
+                        checkpoint()
+                    except Exception as e:
+                        print(f"发布任务 {task_name} 的阶段性结果失败: {e}")
+    finally:
+        update_crawl_status(task_name, state='finished')
+        # 保存最终进度和临时数据的内容哈希
+        if journal is not None:
+            journal.close(fund_codes)
+        save_hash_stores()
+    engine.report(stats_snapshot)
+    
+    return processed_codes
 
-def clean_temp_data(task_name=None):
+def classify_fund(fund_name, fund_type):
     """
-    清理临时数据文件
+    根据基金简称和基金类型判断基金类别
     
     参数:
-        task_name (str): 任务名称，如'nav', 'position'等，默认为None表示清理所有临时文件
+        fund_name (str): 基金简称
+        fund_type (str): 基金类型，如'混合型-灵活'、'货币型-普通货币'
+        
+    返回:
+        str: 基金类别，'etf'表示场内ETF，'money'表示货币市场基金，'open'表示其他开放式基金
     """
-    if task_name:
-        temp_files = [f for f in os.listdir(TEMP_DATA_DIR) if f.startswith(f"{task_name}_") and f.endswith(".csv")]
-    else:
-        temp_files = [f for f in os.listdir(TEMP_DATA_DIR) if f.endswith(".csv")]
+    fund_name = fund_name if isinstance(fund_name, str) else ''
+    fund_type = fund_type if isinstance(fund_type, str) else ''
+    if 'ETF' in fund_name.upper() and '联接' not in fund_name:
+        return 'etf'
+    if fund_type.startswith('货币'):
+        return 'money'
+    return 'open'
+
+def load_universe_snapshot():
+    """
+    读取本地保存的基金列表快照
     
-    for temp_file in temp_files:
-        file_path = os.path.join(TEMP_DATA_DIR, temp_file)
+    返回:
+        tuple: (基金列表数据, 快照时间戳)，快照不存在时返回(None, None)
+    """
+    if not os.path.exists(UNIVERSE_META_FILE):
+        return None, None
+    
+    try:
+        with open(UNIVERSE_META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        data_file = meta['data_file']
+        if data_file.endswith('.parquet'):
+            universe_df = pd.read_parquet(data_file)
+            universe_df['基金代码'] = universe_df['基金代码'].astype(str)
+        else:
+            universe_df = pd.read_csv(data_file, encoding='utf-8-sig', dtype=CODE_COLUMN_DTYPES)
+        return universe_df, meta['timestamp']
+    except Exception as e:
+        print(f"读取基金列表快照失败: {e}")
+        return None, None
+
+def save_universe_snapshot(universe_df):
+    """
+    保存基金列表快照及其时间戳
+    
+    参数:
+        universe_df (pandas.DataFrame): 基金列表数据
+    """
+    data_file = f"{UNIVERSE_FILE}.{'parquet' if parquet_available() else 'csv'}"
+    save_to_file(universe_df, data_file)
+    
+    meta = {
+        'data_file': data_file,
+        'timestamp': time.time(),
+        'last_update': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'fund_count': len(universe_df)
+    }
+    tmp_file = f"{UNIVERSE_META_FILE}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_file, UNIVERSE_META_FILE)
+
+def get_fund_universe(refresh=False, max_age_hours=None):
+    """
+    获取基金列表快照，在有效期内只加载一次，供各模块共用
+    快照超过有效期或指定刷新时重新调用ak.fund_name_em()，获取失败时使用已有快照
+    
+    参数:
+        refresh (bool): 是否强制重新获取基金列表，默认为False
+        max_age_hours (float): 快照有效期（小时），默认为None表示使用UNIVERSE_MAX_AGE_HOURS
+        
+    返回:
+        pandas.DataFrame: 基金列表数据，包含'基金类别'列（'etf'、'money'或'open'），获取失败时返回空DataFrame
+    """
+    global _universe_df, _universe_timestamp
+    
+    max_age = (max_age_hours if max_age_hours is not None else UNIVERSE_MAX_AGE_HOURS) * 3600
+    with _universe_lock:
+        if _universe_df is not None and not refresh and time.time() - _universe_timestamp < max_age:
+            return _universe_df
+        
+        snapshot_df, timestamp = load_universe_snapshot()
+        if snapshot_df is not None and not refresh and time.time() - timestamp < max_age:
+            print(f"使用本地基金列表快照，共 {len(snapshot_df)} 只基金，"
+                  f"更新时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}")
+            _universe_df = snapshot_df
+            _universe_timestamp = timestamp
+            return _universe_df
+        
         try:
-            os.remove(file_path)
+            universe_df = ak.fund_name_em()
+            universe_df['基金类别'] = [classify_fund(name, fund_type) for name, fund_type
+                                   in zip(universe_df['基金简称'], universe_df['基金类型'])]
+            save_universe_snapshot(universe_df)
+            print(f"已更新基金列表快照，共 {len(universe_df)} 只基金")
+            _universe_df = universe_df
+            _universe_timestamp = time.time()
         except Exception as e:
-            print(f"删除临时文件 {temp_file} 失败: {e}")
+            print(f"获取基金列表失败: {e}")
+            if snapshot_df is None:
+                return pd.DataFrame()
+            print("使用已过期的本地基金列表快照")
+            _universe_df = snapshot_df
+            # 等待UNIVERSE_RETRY_SECONDS秒后再尝试重新获取
+            _universe_timestamp = time.time() - max_age + min(max_age, UNIVERSE_RETRY_SECONDS)
+        
+        return _universe_df
+
+def get_universe_codes(categories=None):
+    """
+    从基金列表快照中获取基金代码
+    
+    参数:
+        categories (tuple): 需要的基金类别，如('open', 'etf')，默认为None表示全部类别
+        
+    返回:
+        list: 基金代码列表，获取基金列表失败时返回None
+    """
+    universe_df = get_fund_universe()
+    if universe_df.empty:
+        return None
+    if categories:
+        universe_df = universe_df[universe_df['基金类别'].isin(categories)]
+    return universe_df['基金代码'].tolist()
+
+def get_fund_category_map():
+    """
+    获取基金代码到基金类别的映射
     
-    print(f"已清理 {len(temp_files)} 个临时文件")
+    返回:
+        dict: 基金代码到基金类别的映射
+    """
+    universe_df = get_fund_universe()
+    if universe_df.empty:
+        return {}
+    return dict(zip(universe_df['基金代码'], universe_df['基金类别']))
 
 def get_fund_basic_info():
     """
@@ -176,16 +1888,15 @@ def get_fund_basic_info():
         pandas.DataFrame: 基金基本信息数据
     """
     print("正在获取基金基本信息...")
-    try:
-        # 使用AKShare获取基金基本信息
-        fund_info_df = ak.fund_name_em()
+    # 使用共享的基金列表快照
+    fund_info_df = get_fund_universe()
+    if fund_info_df.empty:
+        print("获取基金基本信息失败")
+    else:
         print(f"成功获取 {len(fund_info_df)} 只基金的基本信息")
-        return fund_info_df
-    except Exception as e:
-        print(f"获取基金基本信息失败: {e}")
-        return pd.DataFrame()
+    return fund_info_df
 
-def get_fund_nav_info(fund_codes=None, start_date="20250101", end_date=None, output_file=None, db_name=None, table_name=None, incremental=True):
+def get_fund_nav_info(fund_codes=None, start_date="20250101", end_date=None, output_file=None, db_name=None, table_name=None, incremental=True, engine=None, daily_update=False, return_df=True):
     """
     获取基金净值信息，支持增量更新和断点续传
     
@@ -193,202 +1904,203 @@ def get_fund_nav_info(fund_codes=None, start_date="20250101", end_date=None, out
         fund_codes (list): 基金代码列表，默认为None表示获取所有基金
         start_date (str): 开始日期，格式为YYYYMMDD
         end_date (str): 结束日期，格式为YYYYMMDD，默认为None表示当前日期
-        output_file (str): 输出CSV文件路径，默认为None
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
         incremental (bool): 是否增量更新，默认为True
+        engine (FetchEngine): 抓取引擎，控制并发度和限速，默认为None表示使用默认配置
+        daily_update (bool): 是否为每日更新模式，只追加晚于各基金高水位的净值数据，默认为False
+        return_df (bool): 是否返回合并后的完整数据，默认为True
     
     返回:
-        pandas.DataFrame: 基金净值信息数据
+        pandas.DataFrame: 基金净值信息数据，return_df为False时返回记录数
     """
     task_name = "nav"
     
     if fund_codes is None:
-        # 如果未指定基金代码，则获取所有基金代码
-        try:
-            fund_info_df = ak.fund_name_em()
-            fund_codes = fund_info_df['基金代码'].tolist()
-            print(f"将获取 {len(fund_codes)} 只基金的净值信息")
-        except Exception as e:
-            print(f"获取基金代码列表失败: {e}")
+        # 如果未指定基金代码，则从基金列表快照中获取该模块适用的基金代码
+        fund_codes = get_universe_codes(TASK_FUND_CATEGORIES.get(task_name))
+        if fund_codes is None:
+            print("获取基金代码列表失败")
             return pd.DataFrame()
+        print(f"将获取 {len(fund_codes)} 只基金的净值信息")
+    
+    if daily_update:
+        # 每日更新模式按高水位判断是否需要更新，不使用基于基金代码的进度记录
+        watermarks = load_nav_watermarks(fund_codes)
+        # 周末没有新净值，以最近一个交易日为目标，已有该日净值的基金不再请求
+        target_date = get_latest_trading_day(end_date)
+        fund_codes = [code for code in fund_codes if watermarks.get(code, '') < target_date]
+        print(f"每日更新模式，{len(fund_codes)} 只基金的净值数据早于 {target_date}，需要更新")
+    else:
+        watermarks = load_nav_watermark_state()[0]
+        # 如果是增量更新，获取剩余未处理的基金代码
+        if incremental:
+            fund_codes = get_remaining_codes(task_name, fund_codes)
     
-    # 如果是增量更新，获取剩余未处理的基金代码
-    if incremental:
-        fund_codes = get_remaining_codes(task_name, fund_codes)
-    
-    # 如果没有需要处理的基金代码，直接返回已有数据
-    if not fund_codes:
+    # 如果没有需要处理的基金代码，直接返回已有数据；使用任务队列时仍需处理其他进程未完成的基金
+    if not fund_codes and _work_queue is None:
         print("没有需要处理的基金代码，将合并已有数据")
-        return merge_temp_data(task_name, output_file, db_name, table_name)
-    
-    # 记录已处理的基金代码
-    processed_codes = []
-    
-    # 加载已有的进度
-    progress_data = load_progress(task_name)
-    if progress_data and 'processed_codes' in progress_data:
-        processed_codes = progress_data['processed_codes']
+        return merge_temp_data(task_name, output_file, db_name, table_name, return_df=return_df)
+    
+    watermark_lock = threading.Lock()
+    updated_codes = set()
+    
+    def update_watermark(fund_code, fund_nav_df):
+        max_date = get_max_nav_date(fund_nav_df)
+        if not max_date:
+            return
+        with watermark_lock:
+            watermarks[fund_code] = max_date
+            updated_codes.add(fund_code)
+            # 每更新50只基金保存一次高水位
+            if len(updated_codes) >= 50:
+                save_nav_watermark_state(dict(watermarks), updated_codes)
+                updated_codes.clear()
+    
+    def fetch_nav(engine, fund_code):
+        # 每只基金的实际开始日期取开始日期和高水位次日中较晚者
+        fund_start_date = start_date
+        watermark = watermarks.get(fund_code) if daily_update else None
+        if watermark:
+            next_date = (pd.to_datetime(watermark) + pd.Timedelta(days=1)).strftime('%Y%m%d')
+            fund_start_date = max(start_date, next_date) if start_date else next_date
+        
+        # 场外基金净值信息
+        if len(fund_code) == 6:
+            # 开放式基金历史净值，接口只能返回全部历史，获取后按日期筛选
+            fund_nav_df = engine.call('fund_open_fund_info_em', ak.fund_open_fund_info_em,
+                                      symbol=fund_code, indicator="单位净值走势")
+        
+        # 场内基金净值信息
+        elif len(fund_code) == 6 and fund_code.startswith(('5', '1')):
+            # ETF基金历史净值
+            fund_nav_df = engine.call('fund_etf_hist_em', ak.fund_etf_hist_em, symbol=fund_code, period="daily",
+                                      start_date=fund_start_date, end_date=end_date)
+        else:
+            return
+        
+        fund_nav_df['基金代码'] = fund_code
+        fund_nav_df = filter_nav_rows(fund_nav_df, fund_start_date, end_date)
+        
+        # 保存单个基金的数据，每日更新模式下追加到已有的临时文件
+        save_temp_data(task_name, fund_code, fund_nav_df, append=daily_update)
+        update_watermark(fund_code, fund_nav_df)
     
-    # 使用tqdm显示进度条
-    for fund_code in tqdm(fund_codes, desc="获取基金净值信息"):
-        try:
-            # 场外基金净值信息
-            if len(fund_code) == 6:
-                # 开放式基金历史净值
-                fund_nav_df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
-                fund_nav_df['基金代码'] = fund_code
-                
-                # 保存单个基金的数据
-                save_temp_data(task_name, fund_code, fund_nav_df)
-            
-            # 场内基金净值信息
-            elif len(fund_code) == 6 and fund_code.startswith(('5', '1')):
-                # ETF基金历史净值
-                fund_nav_df = ak.fund_etf_hist_em(symbol=fund_code, period="daily", 
-                                                 start_date=start_date, end_date=end_date)
-                fund_nav_df['基金代码'] = fund_code
-                
-                # 保存单个基金的数据
-                save_temp_data(task_name, fund_code, fund_nav_df)
-            
-            # 记录已处理的基金代码
-            processed_codes.append(fund_code)
-            
-            # 每处理10个基金保存一次进度
-            if len(processed_codes) % 10 == 0:
-                save_progress(task_name, processed_codes, fund_codes)
-            
-            # 随机暂停一下，避免请求过于频繁
-            time.sleep(random.uniform(0.5, 1.5))
-            
-        except Exception as e:
-            print(f"获取基金 {fund_code} 净值信息失败: {e}")
-            continue
+    crawl_funds(task_name, fund_codes, fetch_nav, "净值信息", engine, track_progress=not daily_update,
+                checkpoint=lambda: publish_partial_results(task_name, task_name, output_file, db_name, table_name))
     
-    # 保存最终进度
-    save_progress(task_name, processed_codes, fund_codes)
+    # 保存最终的高水位
+    save_nav_watermark_state(watermarks, updated_codes)
     
     # 合并所有临时数据
-    all_nav_df = merge_temp_data(task_name, output_file, db_name, table_name)
+    all_nav_df = merge_task_data(task_name, task_name, output_file, db_name, table_name, return_df=return_df)
     
     return all_nav_df
 
-def get_fund_position_info(fund_codes=None, year="2024", output_file=None, db_name=None, table_name=None, incremental=True):
+def get_fund_position_info(fund_codes=None, year="2024", output_file=None, db_name=None, table_name=None, incremental=True, engine=None, return_df=True):
     """
     获取基金持仓信息，支持增量更新和断点续传
     
     参数:
         fund_codes (list): 基金代码列表，默认为None表示获取所有基金
         year (str): 年份，默认为"2023"
-        output_file (str): 输出CSV文件路径，默认为None
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
         incremental (bool): 是否增量更新，默认为True
+        engine (FetchEngine): 抓取引擎，控制并发度和限速，默认为None表示使用默认配置
+        return_df (bool): 是否返回合并后的完整数据，默认为True
     
     返回:
-        pandas.DataFrame: 基金持仓信息数据
+        pandas.DataFrame: 基金持仓信息数据，return_df为False时返回记录数
     """
     task_name = "position"
     
     if fund_codes is None:
-        # 如果未指定基金代码，则获取所有基金代码
-        try:
-            fund_info_df = ak.fund_name_em()
-            fund_codes = fund_info_df['基金代码'].tolist()
-            print(f"将获取 {len(fund_codes)} 只基金的持仓信息")
-        except Exception as e:
-            print(f"获取基金代码列表失败: {e}")
+        # 如果未指定基金代码，则从基金列表快照中获取该模块适用的基金代码
+        fund_codes = get_universe_codes(TASK_FUND_CATEGORIES.get(task_name))
+        if fund_codes is None:
+            print("获取基金代码列表失败")
             return pd.DataFrame()
+        print(f"将获取 {len(fund_codes)} 只基金的持仓信息")
     
     # 如果是增量更新，获取剩余未处理的基金代码
     if incremental:
         fund_codes = get_remaining_codes(task_name, fund_codes)
     
-    # 如果没有需要处理的基金代码，直接返回已有数据
+    # 如果没有需要处理的基金代码，只重试失败记录后合并已有数据
     if not fund_codes:
         print("没有需要处理的基金代码，将合并已有数据")
-        return merge_temp_data(task_name, output_file, db_name, table_name)
-    
-    # 记录已处理的基金代码
-    processed_codes = []
-    
-    # 加载已有的进度
-    progress_data = load_progress(task_name)
-    if progress_data and 'processed_codes' in progress_data:
-        processed_codes = progress_data['processed_codes']
-    
-    # 使用tqdm显示进度条
-    for fund_code in tqdm(fund_codes, desc="获取基金持仓信息"):
-        try:
-            # 获取股票持仓
-            try:
-                stock_df = ak.fund_portfolio_hold_em(symbol=fund_code, date=year)
-                if not stock_df.empty:
-                    stock_df['基金代码'] = fund_code
-                    stock_df['持仓类型'] = '股票'
-                    # 保存单个基金的股票持仓数据
-                    save_temp_data(f"{task_name}_stock", fund_code, stock_df)
-            except Exception as e:
-                print(f"获取基金 {fund_code} 股票持仓失败: {e}")
-            
-            # 获取债券持仓
-            try:
-                bond_df = ak.fund_portfolio_bond_hold_em(symbol=fund_code, date=year)
-                if not bond_df.empty:
-                    bond_df['基金代码'] = fund_code
-                    bond_df['持仓类型'] = '债券'
-                    # 保存单个基金的债券持仓数据
-                    save_temp_data(f"{task_name}_bond", fund_code, bond_df)
-            except Exception as e:
-                print(f"获取基金 {fund_code} 债券持仓失败: {e}")
-            
-            # 记录已处理的基金代码
-            processed_codes.append(fund_code)
-            
-            # 每处理10个基金保存一次进度
-            if len(processed_codes) % 10 == 0:
-                save_progress(task_name, processed_codes, fund_codes)
-            
-            # 随机暂停一下，避免请求过于频繁
-            time.sleep(random.uniform(0.5, 1.5))
-            
-        except Exception as e:
-            print(f"获取基金 {fund_code} 持仓信息失败: {e}")
-            continue
-    
-    # 保存最终进度
-    save_progress(task_name, processed_codes, fund_codes)
-    
-    # 合并所有临时数据
-    stock_position_df = merge_temp_data(f"{task_name}_stock")
-    bond_position_df = merge_temp_data(f"{task_name}_bond")
     
-    # 合并股票持仓和债券持仓
-    position_df = pd.DataFrame()
-    if not stock_position_df.empty:
-        position_df = pd.concat([position_df, stock_position_df], ignore_index=True)
-    
-    if not bond_position_df.empty:
-        position_df = pd.concat([position_df, bond_position_df], ignore_index=True)
-    
-    # 保存合并后的数据
-    if output_file and not position_df.empty:
-        save_to_csv(position_df, output_file)
-    
-    if db_name and table_name and not position_df.empty:
-        save_to_sqlite(position_df, db_name, table_name)
+    # 各接口获取的持仓类型：临时数据任务名称后缀和持仓类型名称
+    holding_endpoints = {
+        'fund_portfolio_hold_em': ('stock', '股票'),
+        'fund_portfolio_bond_hold_em': ('bond', '债券'),
+    }
+    # 使用任务队列时由队列负责重试，不读写各进程共用目录中的重试队列文件
+    retry_queue = RetryQueue(task_name) if _work_queue is None else None
+    
+    def save_holding(fund_code, endpoint, holding_df):
+        suffix, holding_type = holding_endpoints[endpoint]
+        if not holding_df.empty:
+            holding_df['基金代码'] = fund_code
+            holding_df['持仓类型'] = holding_type
+            # 保存单个基金的该类持仓数据
+            save_temp_data(f"{task_name}_{suffix}", fund_code, holding_df)
+    
+    def fetch_holding(engine, fund_code, endpoint):
+        holding_df = engine.call(endpoint, getattr(ak, endpoint), symbol=fund_code, date=year)
+        save_holding(fund_code, endpoint, holding_df)
+    
+    def fetch_position(engine, fund_code):
+        # 同时获取股票持仓和债券持仓，失败的接口调用加入重试队列
+        calls = [(endpoint, getattr(ak, endpoint), (), {'symbol': fund_code, 'date': year})
+                 for endpoint in holding_endpoints]
+        errors = []
+        for (endpoint, *_), (holding_df, error) in zip(calls, engine.call_all(calls)):
+            if error is not None:
+                print(f"获取基金 {fund_code} {holding_endpoints[endpoint][1]}持仓失败: {error}")
+                errors.append(error)
+                if retry_queue is not None:
+                    retry_queue.push(fund_code, endpoint, error, retry_after=engine.get_breaker(endpoint).retry_after())
+                continue
+            if retry_queue is not None:
+                retry_queue.resolve(fund_code, endpoint)
+            save_holding(fund_code, endpoint, holding_df)
+        # 使用任务队列时由队列负责重试：释放该基金的租约，稍后由任意进程重新获取
+        if errors and _work_queue is not None:
+            raise errors[0]
+    
+    if engine is None:
+        engine = create_fetch_engine()
+    if fund_codes or _work_queue is not None:
+        crawl_funds(task_name, fund_codes, fetch_position, "持仓信息", engine,
+                    checkpoint=lambda: publish_partial_results(task_name, TASK_TEMP_NAMES[task_name], output_file,
+                                                               db_name, table_name))
+    
+    # 重试本次和之前运行中失败的接口调用
+    if retry_queue is not None:
+        if len(retry_queue):
+            print(f"重试 {len(retry_queue)} 条失败的持仓接口调用...")
+            drain_retry_queue(retry_queue, fetch_holding, engine)
+        retry_queue.close()
+    
+    # 合并股票持仓和债券持仓的临时数据
+    position_df = merge_task_data(task_name, TASK_TEMP_NAMES[task_name], output_file, db_name, table_name,
+                                  return_df=return_df)
     
     return position_df
 
-def get_fund_manager_info(output_file=None, db_name=None, table_name=None):
+def get_fund_manager_info(output_file=None, db_name=None, table_name=None, engine=None):
     """
     获取基金经理信息，支持保存到文件或数据库
     
     参数:
-        output_file (str): 输出CSV文件路径，默认为None
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
+        engine (FetchEngine): 抓取引擎，与其他模块共用限速，默认为None表示直接调用接口
     
     返回:
         pandas.DataFrame: 基金经理信息数据
@@ -405,7 +2117,7 @@ def get_fund_manager_info(output_file=None, db_name=None, table_name=None):
             
             # 保存到指定位置
             if output_file:
-                save_to_csv(manager_df, output_file)
+                save_to_file(manager_df, output_file)
             
             if db_name and table_name:
                 save_to_sqlite(manager_df, db_name, table_name)
@@ -416,7 +2128,10 @@ def get_fund_manager_info(output_file=None, db_name=None, table_name=None):
     
     try:
         # 使用AKShare获取基金经理信息
-        manager_df = ak.fund_manager_em()
+        if engine is not None:
+            manager_df = engine.call('fund_manager_em', ak.fund_manager_em)
+        else:
+            manager_df = ak.fund_manager_em()
         print(f"成功获取 {len(manager_df)} 条基金经理信息")
         
         # 保存临时文件
@@ -426,7 +2141,7 @@ def get_fund_manager_info(output_file=None, db_name=None, table_name=None):
         
         # 保存到指定位置
         if output_file:
-            save_to_csv(manager_df, output_file)
+            save_to_file(manager_df, output_file)
         
         if db_name and table_name:
             save_to_sqlite(manager_df, db_name, table_name)
@@ -436,14 +2151,15 @@ def get_fund_manager_info(output_file=None, db_name=None, table_name=None):
         print(f"获取基金经理信息失败: {e}")
         return pd.DataFrame()
 
-def get_fund_performance_info(output_file=None, db_name=None, table_name=None):
+def get_fund_performance_info(output_file=None, db_name=None, table_name=None, engine=None):
     """
     获取基金业绩信息，支持保存到文件或数据库
     
     参数:
-        output_file (str): 输出CSV文件路径，默认为None
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
+        engine (FetchEngine): 抓取引擎，与其他模块共用限速，默认为None表示直接调用接口
     
     返回:
         pandas.DataFrame: 基金业绩信息数据
@@ -460,7 +2176,7 @@ def get_fund_performance_info(output_file=None, db_name=None, table_name=None):
             
             # 保存到指定位置
             if output_file:
-                save_to_csv(performance_df, output_file)
+                save_to_file(performance_df, output_file)
             
             if db_name and table_name:
                 save_to_sqlite(performance_df, db_name, table_name)
@@ -471,7 +2187,10 @@ def get_fund_performance_info(output_file=None, db_name=None, table_name=None):
     
     try:
         # 使用AKShare获取开放式基金排行
-        performance_df = ak.fund_open_fund_rank_em(symbol="全部")
+        if engine is not None:
+            performance_df = engine.call('fund_open_fund_rank_em', ak.fund_open_fund_rank_em, symbol="全部")
+        else:
+            performance_df = ak.fund_open_fund_rank_em(symbol="全部")
         print(f"成功获取 {len(performance_df)} 只基金的业绩信息")
         
         # 保存临时文件
@@ -481,7 +2200,7 @@ def get_fund_performance_info(output_file=None, db_name=None, table_name=None):
         
         # 保存到指定位置
         if output_file:
-            save_to_csv(performance_df, output_file)
+            save_to_file(performance_df, output_file)
         
         if db_name and table_name:
             save_to_sqlite(performance_df, db_name, table_name)
@@ -491,78 +2210,55 @@ def get_fund_performance_info(output_file=None, db_name=None, table_name=None):
         print(f"获取基金业绩信息失败: {e}")
         return pd.DataFrame()
 
-def get_fund_industry_allocation(fund_codes=None, year="2024", output_file=None, db_name=None, table_name=None, incremental=True):
+def get_fund_industry_allocation(fund_codes=None, year="2024", output_file=None, db_name=None, table_name=None, incremental=True, engine=None, return_df=True):
     """
     获取基金行业配置信息，支持增量更新和断点续传
     
     参数:
         fund_codes (list): 基金代码列表，默认为None表示获取所有基金
         year (str): 年份，默认为"2023"
-        output_file (str): 输出CSV文件路径，默认为None
+        output_file (str): 输出文件路径，以.parquet结尾时保存为Parquet，否则保存为CSV，默认为None
         db_name (str): 数据库文件名，默认为None
         table_name (str): 表名，默认为None
         incremental (bool): 是否增量更新，默认为True
+        engine (FetchEngine): 抓取引擎，控制并发度和限速，默认为None表示使用默认配置
+        return_df (bool): 是否返回合并后的完整数据，默认为True
     
     返回:
-        pandas.DataFrame: 基金行业配置信息数据
+        pandas.DataFrame: 基金行业配置信息数据，return_df为False时返回记录数
     """
     task_name = "industry"
     
     if fund_codes is None:
-        # 如果未指定基金代码，则获取所有基金代码
-        try:
-            fund_info_df = ak.fund_name_em()
-            fund_codes = fund_info_df['基金代码'].tolist()
-            print(f"将获取 {len(fund_codes)} 只基金的行业配置信息")
-        except Exception as e:
-            print(f"获取基金代码列表失败: {e}")
+        # 如果未指定基金代码，则从基金列表快照中获取该模块适用的基金代码
+        fund_codes = get_universe_codes(TASK_FUND_CATEGORIES.get(task_name))
+        if fund_codes is None:
+            print("获取基金代码列表失败")
             return pd.DataFrame()
+        print(f"将获取 {len(fund_codes)} 只基金的行业配置信息")
     
     # 如果是增量更新，获取剩余未处理的基金代码
     if incremental:
         fund_codes = get_remaining_codes(task_name, fund_codes)
     
-    # 如果没有需要处理的基金代码，直接返回已有数据
-    if not fund_codes:
+    # 如果没有需要处理的基金代码，直接返回已有数据；使用任务队列时仍需处理其他进程未完成的基金
+    if not fund_codes and _work_queue is None:
         print("没有需要处理的基金代码，将合并已有数据")
-        return merge_temp_data(task_name, output_file, db_name, table_name)
-    
-    # 记录已处理的基金代码
-    processed_codes = []
-    
-    # 加载已有的进度
-    progress_data = load_progress(task_name)
-    if progress_data and 'processed_codes' in progress_data:
-        processed_codes = progress_data['processed_codes']
+        return merge_temp_data(task_name, output_file, db_name, table_name, return_df=return_df)
     
-    # 使用tqdm显示进度条
-    for fund_code in tqdm(fund_codes, desc="获取基金行业配置信息"):
-        try:
-            # 获取行业配置
-            industry_df = ak.fund_portfolio_industry_allocation_em(symbol=fund_code, date=year)
-            if not industry_df.empty:
-                industry_df['基金代码'] = fund_code
-                # 保存单个基金的行业配置数据
-                save_temp_data(task_name, fund_code, industry_df)
-            
-            # 记录已处理的基金代码
-            processed_codes.append(fund_code)
-            
-            # 每处理10个基金保存一次进度
-            if len(processed_codes) % 10 == 0:
-                save_progress(task_name, processed_codes, fund_codes)
-            
-            # 随机暂停一下，避免请求过于频繁
-            time.sleep(random.uniform(0.5, 1.5))
-            
-        except Exception as e:
-            print(f"获取基金 {fund_code} 行业配置信息失败: {e}")
-            continue
+    def fetch_industry(engine, fund_code):
+        # 获取行业配置
+        industry_df = engine.call('fund_portfolio_industry_allocation_em', ak.fund_portfolio_industry_allocation_em,
+                                  symbol=fund_code, date=year)
+        if not industry_df.empty:
+            industry_df['基金代码'] = fund_code
+            # 保存单个基金的行业配置数据
+            save_temp_data(task_name, fund_code, industry_df)
     
-    # 保存最终进度
-    save_progress(task_name, processed_codes, fund_codes)
+    crawl_funds(task_name, fund_codes, fetch_industry, "行业配置信息", engine,
+                checkpoint=lambda: publish_partial_results(task_name, task_name, output_file, db_name, table_name))
     
     # 合并所有临时数据
-    industry_allocation_df = merge_temp_data(task_name, output_file, db_name, table_name)
+    industry_allocation_df = merge_task_data(task_name, task_name, output_file, db_name, table_name, return_df=return_df)
     
     return industry_allocation_df
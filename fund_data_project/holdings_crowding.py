@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基金持仓拥挤度模块，按证券代码和季度对所有基金的持仓做一次分组汇总：持有基金数、
+持仓市值合计、持股数合计、平均占净值比例、持有基金之间的赫芬达尔集中度，以及与
+上一季度相比持有基金数和持仓市值的变化
+
+上一季度有基金持有、本季度没有基金持有的证券记为持有基金数为0的退出记录，持有基金数和持仓市值的减少计入变化
+
+结果保存为按(持仓类型, 证券代码, 季度)索引的表，查询某一季度最拥挤的证券时只读取该表，
+能用SQL查询的存储后端只读取所选季度和持仓类型中排在前面的记录
+"""
+import numpy as np
+import pandas as pd
+from data_storage import read_data, get_storage_backend, quote_columns
+from holdings_similarity import get_quarter_keys, get_security_codes
+
+# 持仓表中计算拥挤度需要的列
+CROWDING_SOURCE_COLUMNS = ['基金代码', '持仓类型', '季度', '股票代码', '股票名称', '债券代码', '债券名称',
+                           '占净值比例', '持股数', '持仓市值']
+
+# 拥挤度表的列：持仓市值与持仓表相同，平均占净值比例为百分比，赫芬达尔指数为0到1之间的小数
+CROWDING_COLUMNS = ['持仓类型', '证券代码', '证券名称', '季度', '持有基金数', '持仓市值合计', '持股数合计',
+                    '平均占净值比例', '赫芬达尔指数', '持有基金数变化', '持仓市值变化', '持仓市值变化率']
+
+# 查询拥挤证券时默认返回的证券数
+CROWDING_TOP_N = 20
+
+
+def get_next_quarter_keys(keys):
+    """
+    获取下一个季度的季度数字，如20234的下一个季度为20241
+    
+    参数:
+        keys (numpy.ndarray): get_quarter_keys返回的季度数字
+    
+    返回:
+        numpy.ndarray: 下一个季度的季度数字
+    """
+    return np.where(keys % 10 >= 4, (keys // 10 + 1) * 10 + 1, keys + 1)
+
+
+def compute_holdings_crowding(position_df):
+    """
+    按证券和季度汇总所有基金的持仓
+    
+    同一证券同一季度的所有记录在一次分组聚合中得到持有基金数、持仓市值合计、持股数合计、
+    平均占净值比例和持仓市值的平方和，赫芬达尔指数为各基金持仓市值占比的平方和。
+    上一季度在数据中存在时，上一季度没有基金持有的证券按0计算变化，否则变化为空；
+    下一季度在数据中存在时，下一季度没有基金持有的证券在下一季度增加一条持有基金数和持仓市值合计为0的退出记录
+    
+    参数:
+        position_df (pandas.DataFrame): 持仓数据，需包含基金代码、持仓类型、季度和证券代码或名称
+    
+    返回:
+        pandas.DataFrame: 拥挤度数据，按季度从新到旧、持仓类型和持仓市值合计从高到低排序
+    """
+    if position_df is None or position_df.empty or '季度' not in position_df.columns:
+        return pd.DataFrame(columns=CROWDING_COLUMNS)
+    
+    def get_column(column):
+        if column not in position_df.columns:
+            return pd.Series(np.nan, index=position_df.index)
+        return position_df[column]
+    
+    is_bond, codes = get_security_codes(position_df)
+    market_values = pd.to_numeric(get_column('持仓市值'), errors='coerce')
+    df = pd.DataFrame({
+        '持仓类型': np.where(is_bond, '债券', '股票'),
+        '证券代码': codes,
+        '季度键': get_quarter_keys(position_df['季度']),
+        '证券名称': get_column('股票名称').where(~is_bond, get_column('债券名称')),
+        '基金代码': position_df['基金代码'].astype(str),
+        '持仓市值': market_values,
+        '持仓市值平方': market_values ** 2,
+        '持股数': pd.to_numeric(get_column('持股数'), errors='coerce'),
+        '占净值比例': pd.to_numeric(get_column('占净值比例'), errors='coerce'),
+    })
+    df = df[(df['证券代码'] != '') & (df['季度键'] > 0)]
+    
+    result = df.groupby(['持仓类型', '证券代码', '季度键'], sort=False).agg(
+        证券名称=('证券名称', 'last'),
+        持有基金数=('基金代码', 'nunique'),
+        持仓市值合计=('持仓市值', 'sum'),
+        持仓市值平方和=('持仓市值平方', 'sum'),
+        持股数合计=('持股数', 'sum'),
+        持股数记录数=('持股数', 'count'),
+        平均占净值比例=('占净值比例', 'mean'),
+    ).reset_index()
+    
+    # 没有持股数的证券（如债券）持股数合计为空而不是0
+    result['持股数合计'] = result['持股数合计'].where(result['持股数记录数'] > 0)
+    totals = result['持仓市值合计'].to_numpy(dtype=np.float64)
+    result['赫芬达尔指数'] = np.divide(result['持仓市值平方和'].to_numpy(dtype=np.float64), totals ** 2,
+                                  out=np.full(len(result), np.nan), where=totals > 0)
+    
+    # 上一季度的汇总结果按下一个季度对齐后与本季度合并
+    quarters = result[['持仓类型', '季度键']].drop_duplicates()
+    previous = result[['持仓类型', '证券代码', '季度键', '证券名称', '持股数合计', '持有基金数', '持仓市值合计']].rename(
+        columns={'持股数合计': '上季度持股数合计', '持有基金数': '上季度持有基金数', '持仓市值合计': '上季度持仓市值合计'})
+    previous['季度键'] = get_next_quarter_keys(previous['季度键'].to_numpy())
+    
+    # 下一季度在数据中存在、但没有基金再持有的证券作为退出记录加入下一季度
+    keys = ['持仓类型', '证券代码', '季度键']
+    exited = ~pd.MultiIndex.from_frame(previous[keys]).isin(pd.MultiIndex.from_frame(result[keys])) & \
+        pd.MultiIndex.from_frame(previous[['持仓类型', '季度键']]).isin(pd.MultiIndex.from_frame(quarters))
+    exits = previous[exited].assign(
+        持有基金数=0,
+        持仓市值合计=0.0,
+        持股数合计=lambda df: df['上季度持股数合计'].where(df['上季度持股数合计'].isna(), 0.0),
+        平均占净值比例=np.nan,
+        赫芬达尔指数=np.nan,
+    )
+    result = result.merge(previous.drop(columns=['证券名称', '上季度持股数合计']), on=keys, how='left')
+    result = pd.concat([result, exits.drop(columns=['上季度持股数合计'])], ignore_index=True)
+    
+    next_quarters = quarters.assign(季度键=get_next_quarter_keys(quarters['季度键'].to_numpy()))
+    has_previous = pd.MultiIndex.from_frame(result[['持仓类型', '季度键']]).isin(pd.MultiIndex.from_frame(next_quarters))
+    previous_holders = result['上季度持有基金数'].where(~has_previous, result['上季度持有基金数'].fillna(0))
+    previous_values = result['上季度持仓市值合计'].where(~has_previous, result['上季度持仓市值合计'].fillna(0))
+    result['持有基金数变化'] = result['持有基金数'] - previous_holders
+    result['持仓市值变化'] = result['持仓市值合计'] - previous_values
+    result['持仓市值变化率'] = result['持仓市值变化'] / previous_values.where(previous_values > 0)
+    
+    result = result.sort_values(['季度键', '持仓类型', '持仓市值合计'], ascending=[False, True, False], ignore_index=True)
+    result['季度'] = (result['季度键'] // 10).astype(str) + '年' + (result['季度键'] % 10).astype(str) + '季度'
+    return result[CROWDING_COLUMNS]
+
+
+def load_holdings_crowding(data_source):
+    """
+    从保存的持仓数据计算拥挤度
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径或SQLite数据库名称
+    
+    返回:
+        pandas.DataFrame: 拥挤度数据
+    """
+    return compute_holdings_crowding(read_data(data_source, 'fund_position_info', columns=CROWDING_SOURCE_COLUMNS))
+
+
+def select_crowded_securities(crowding_df, quarter=None, holding_type='股票', sort_by='持仓市值合计', limit=CROWDING_TOP_N):
+    """
+    从已读取的拥挤度数据中选出某一季度最拥挤的证券，参数与get_crowded_securities相同
+    
+    参数:
+        crowding_df (pandas.DataFrame): 拥挤度数据
+    
+    返回:
+        pandas.DataFrame: 按排序列从高到低排列的拥挤度数据
+    """
+    if holding_type is not None:
+        crowding_df = crowding_df[crowding_df['持仓类型'] == holding_type]
+    if crowding_df.empty:
+        return crowding_df
+    # Parquet中的季度列读出为Categorical，转为字符串后比较
+    quarters = crowding_df['季度'].astype(str)
+    crowding_df = crowding_df[quarters == (quarter or quarters.max())]
+    crowding_df = crowding_df.sort_values(sort_by, ascending=False, na_position='last', ignore_index=True)
+    return crowding_df.head(limit) if limit else crowding_df
+
+
+def get_crowded_securities(data_source, quarter=None, holding_type='股票', sort_by='持仓市值合计', limit=CROWDING_TOP_N):
+    """
+    从拥挤度表中查询某一季度最拥挤的证券
+    
+    存储后端支持SQL时季度、持仓类型、排序和数量限制都在后端中执行，只返回所需的记录，
+    否则读取整张表后用pandas筛选
+    
+    参数:
+        data_source (str): 保存拥挤度表的数据源
+        quarter (str): 季度，如"2024年1季度"，默认为None表示表中最新的季度
+        holding_type (str): 持仓类型，'股票'或'债券'，None表示不限
+        sort_by (str): 排序的列，如'持仓市值合计'、'持有基金数'或'持仓市值变化'
+        limit (int): 返回的证券数，None表示全部返回
+    
+    返回:
+        pandas.DataFrame: 按排序列从高到低排列的拥挤度数据
+    """
+    if sort_by not in CROWDING_COLUMNS:
+        raise ValueError(f"不支持的排序列: {sort_by}，可选: {', '.join(CROWDING_COLUMNS)}")
+    backend = get_storage_backend(data_source)
+    relation = backend.get_relation('fund_holdings_crowding')
+    if relation is None:
+        crowding_df = read_data(data_source, 'fund_holdings_crowding', columns=CROWDING_COLUMNS)
+        return select_crowded_securities(crowding_df, quarter, holding_type, sort_by, limit)
+    
+    conditions, params = [], []
+    if holding_type is not None:
+        conditions.append('"持仓类型" = ?')
+        params.append(holding_type)
+    if quarter is None:
+        # 季度格式为"YYYY年N季度"，字符串最大即最新的季度
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        quarter = backend.query(f'SELECT MAX("季度") AS "季度" FROM {relation}{where}', params)['季度'].iloc[0]
+        if quarter is None or pd.isna(quarter):
+            return pd.DataFrame(columns=CROWDING_COLUMNS)
+    conditions.append('"季度" = ?')
+    params.append(str(quarter))
+    
+    sql = (f'SELECT {quote_columns(CROWDING_COLUMNS)} FROM {relation} WHERE {" AND ".join(conditions)} '
+           f'ORDER BY "{sort_by}" DESC NULLS LAST')
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return backend.query(sql, params)
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基金持仓相似度模块，将持仓表转换为基金×证券的稀疏权重矩阵（scipy.sparse CSR），
+用归一化后的稀疏矩阵乘积查找与某只基金最相似的前k只基金和持仓重合度达到阈值的基金
+
+相似度为持仓权重向量的余弦相似度；持仓重合度为两只基金按披露持仓归一化后的权重
+逐个证券取较小值之和，即两只基金共同持有的部分占披露持仓的比例。全市场计算时
+每次只计算一批基金与所有基金的乘积，内存占用由批大小决定
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from data_storage import read_data
+
+# 每只基金保留的最相似基金数
+SIMILARITY_TOP_K = 10
+
+# 全市场计算时每批的基金数，每批与所有基金的相似度矩阵占用 批大小×基金数×8 字节
+SIMILARITY_BATCH_FUNDS = 500
+
+# 计算持仓重合度时每次处理的基金对数
+OVERLAP_PAIR_CHUNK = 200000
+
+# 持仓表中计算权重需要的列
+HOLDINGS_COLUMNS = ['基金代码', '持仓类型', '季度', '股票代码', '股票名称', '债券代码', '债券名称', '占净值比例']
+
+# 相似基金结果的列
+SIMILARITY_COLUMNS = ['基金代码', '相似基金代码', '排名', '相似度', '持仓重合度', '共同持仓数']
+
+# 季度名称中的年份和季度，如"2024年1季度股票投资明细"
+QUARTER_PATTERN = r'(\d{4})年(\d)季度'
+
+
+def get_quarter_keys(quarters):
+    """
+    将季度名称转换为可比较的数字，如"2024年1季度股票投资明细"转换为20241
+    
+    参数:
+        quarters (pandas.Series): 季度名称
+    
+    返回:
+        numpy.ndarray: 季度数字，无法解析的为-1
+    """
+    # 季度名称的取值很少，只解析不重复的名称
+    codes, uniques = pd.factorize(quarters)
+    parts = pd.Series(uniques).astype(str).str.extract(QUARTER_PATTERN)
+    keys = (pd.to_numeric(parts[0], errors='coerce') * 10 + pd.to_numeric(parts[1], errors='coerce')).fillna(-1)
+    return np.append(keys.astype(np.int64).to_numpy(), -1)[codes]
+
+
+def get_security_codes(position_df):
+    """
+    获取每条持仓的证券代码，股票和债券分别取对应的代码列，没有代码时使用名称
+    
+    参数:
+        position_df (pandas.DataFrame): 持仓数据
+    
+    返回:
+        tuple: (是否为债券, 证券代码)，均为与持仓数据同索引的pandas.Series，无法识别的证券代码为空字符串
+    """
+    def get_column(column):
+        if column not in position_df.columns:
+            return pd.Series('', index=position_df.index)
+        # Parquet中的代码类列读出为Categorical，先转为object再填充
+        return position_df[column].astype(object).fillna('').astype(str).str.strip()
+    
+    is_bond = get_column('持仓类型') == '债券'
+    stock_codes = get_column('股票代码').where(lambda s: s != '', get_column('股票名称'))
+    bond_codes = get_column('债券代码').where(lambda s: s != '', get_column('债券名称'))
+    return is_bond, stock_codes.where(~is_bond, bond_codes)
+
+
+def get_security_ids(position_df):
+    """
+    生成证券标识，股票和债券分开编号以免代码冲突，没有代码时使用名称
+    
+    参数:
+        position_df (pandas.DataFrame): 持仓数据
+    
+    返回:
+        pandas.Series: 证券标识，如"股票:600519"、"债券:019547"
+    """
+    is_bond, codes = get_security_codes(position_df)
+    prefixes = pd.Series(np.where(is_bond, '债券:', '股票:'), index=position_df.index)
+    return (prefixes + codes).where(codes != '', '')
+
+
+def normalize_rows(matrix, norms):
+    """
+    将稀疏矩阵的每一行除以对应的范数，范数为0的行保持为0
+    
+    参数:
+        matrix (scipy.sparse.csr_matrix): 稀疏矩阵
+        norms (numpy.ndarray): 每一行的范数
+    
+    返回:
+        scipy.sparse.csr_matrix: 归一化后的矩阵
+    """
+    scale = np.divide(1.0, norms, out=np.zeros(len(norms)), where=norms > 0)
+    return sparse.diags(scale).dot(matrix).tocsr()
+
+
+class HoldingsMatrix:
+    """
+    基金×证券的稀疏持仓权重矩阵
+    
+    每只基金每种持仓类型使用最新一个季度的持仓，权重为占净值比例（小数）
+    """
+    
+    def __init__(self, fund_codes, securities, weights, quarters=None):
+        """
+        参数:
+            fund_codes (list): 基金代码，与矩阵的行对应
+            securities (list): 证券标识，与矩阵的列对应
+            weights (scipy.sparse.spmatrix): 持仓权重矩阵
+            quarters (dict): 每只基金使用的季度数字，默认为None
+        """
+        self.codes = np.asarray(fund_codes, dtype=object)
+        self.securities = np.asarray(securities, dtype=object)
+        self.weights = sparse.csr_matrix(weights, dtype=np.float64)
+        self.weights.eliminate_zeros()
+        self.quarters = quarters or {}
+        self.positions = {code: i for i, code in enumerate(self.codes.tolist())}
+        
+        # L2归一化后的乘积为余弦相似度，L1归一化后逐个证券取较小值之和为持仓重合度
+        self.unit = normalize_rows(self.weights, np.sqrt(np.asarray(self.weights.multiply(self.weights).sum(axis=1)).ravel()))
+        self.shares = normalize_rows(self.weights, np.asarray(self.weights.sum(axis=1)).ravel())
+        self.held = self.weights.copy()
+        self.held.data[:] = 1.0
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    @classmethod
+    def from_frame(cls, position_df):
+        """
+        从持仓数据建立持仓矩阵
+        
+        参数:
+            position_df (pandas.DataFrame): 持仓数据，需包含基金代码、持仓类型、季度和占净值比例
+        
+        返回:
+            HoldingsMatrix: 持仓矩阵
+        """
+        if position_df is None or position_df.empty or '占净值比例' not in position_df.columns:
+            return cls([], [], sparse.csr_matrix((0, 0)))
+        
+        df = pd.DataFrame({
+            '基金代码': position_df['基金代码'].astype(str),
+            '持仓类型': position_df['持仓类型'].astype(str) if '持仓类型' in position_df.columns else '股票',
+            '季度': get_quarter_keys(position_df['季度']) if '季度' in position_df.columns else 0,
+            '证券': get_security_ids(position_df),
+            '权重': pd.to_numeric(position_df['占净值比例'], errors='coerce') / 100,
+        })
+        df = df[(df['证券'] != '') & (df['权重'] > 0)]
+        
+        # 每只基金每种持仓类型只使用最新一个季度，避免把不同季度的持仓叠加
+        latest = df.groupby(['基金代码', '持仓类型'], sort=False)['季度'].transform('max')
+        df = df[df['季度'] == latest]
+        
+        funds = pd.Categorical(df['基金代码'])
+        securities = pd.Categorical(df['证券'])
+        # 同一基金同一证券的多条记录在建立CSR矩阵时相加
+        weights = sparse.csr_matrix(
+            (df['权重'].to_numpy(dtype=np.float64), (funds.codes, securities.codes)),
+            shape=(len(funds.categories), len(securities.categories))
+        )
+        quarters = df.groupby('基金代码', sort=False)['季度'].max().to_dict()
+        return cls(funds.categories.tolist(), securities.categories.tolist(), weights, quarters)
+    
+    def get_overlap(self, rows, cols):
+        """
+        计算基金对的持仓重合度和共同持仓数
+        
+        参数:
+            rows (numpy.ndarray): 第一只基金的行号
+            cols (numpy.ndarray): 第二只基金的行号
+        
+        返回:
+            tuple: (持仓重合度, 共同持仓数)
+        """
+        overlap = np.zeros(len(rows))
+        common = np.zeros(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), OVERLAP_PAIR_CHUNK):
+            end = start + OVERLAP_PAIR_CHUNK
+            left, right = self.shares[rows[start:end]], self.shares[cols[start:end]]
+            # 权重非负，稀疏矩阵逐元素取较小值时只在两只基金都持有的证券上非零
+            overlap[start:end] = np.asarray(left.minimum(right).sum(axis=1)).ravel()
+            common[start:end] = np.asarray(
+                self.held[rows[start:end]].multiply(self.held[cols[start:end]]).sum(axis=1)).ravel()
+        return overlap, common
+    
+    def get_top_k(self, rows, top_k):
+        """
+        按余弦相似度选出一批基金各自最相似的基金
+        
+        参数:
+            rows (numpy.ndarray): 基金的行号
+            top_k (int): 每只基金保留的基金数，None表示保留所有有共同持仓的基金
+        
+        返回:
+            tuple: (行号, 相似基金行号, 相似度, 排名)
+        """
+        # 一批基金与所有基金的乘积转为稠密矩阵，内存为 批大小×基金数
+        scores = self.unit[rows].dot(self.unit.T).toarray()
+        scores[np.arange(len(rows)), rows] = 0
+        count = scores.shape[1] if top_k is None else min(top_k, scores.shape[1])
+        if count < scores.shape[1]:
+            cols = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        else:
+            cols = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        values = np.take_along_axis(scores, cols, axis=1)
+        order = np.argsort(-values, axis=1, kind='stable')
+        cols = np.take_along_axis(cols, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        ranks = np.broadcast_to(np.arange(1, count + 1), values.shape)
+        
+        # 没有共同持仓的基金相似度为0，不作为相似基金
+        keep = values > 0
+        return (np.repeat(rows, count)[keep.ravel()], cols[keep], np.minimum(values[keep], 1.0), ranks[keep])
+    
+    def get_overlap_candidates(self, rows, min_overlap, top_k):
+        """
+        找出一批基金中持仓重合度达到阈值的基金对，按相似度排名
+        
+        参数:
+            rows (numpy.ndarray): 基金的行号
+            min_overlap (float): 最低持仓重合度（小数）
+            top_k (int): 每只基金保留的基金数，None表示不限制
+        
+        返回:
+            tuple: (行号, 相似基金行号, 相似度, 排名, 持仓重合度, 共同持仓数)
+        """
+        # 重合度不超过任一基金在共同持仓上的权重之和，先用这个上界排除大部分基金对
+        bound = self.shares[rows].dot(self.held.T).minimum(self.held[rows].dot(self.shares.T)).tocoo()
+        pair_rows = rows[bound.row]
+        keep = (bound.data >= min_overlap) & (pair_rows != bound.col)
+        pair_rows, cols = pair_rows[keep], bound.col[keep].astype(np.int64)
+        
+        overlap, common = self.get_overlap(pair_rows, cols)
+        keep = overlap >= min_overlap
+        pair_rows, cols, overlap, common = pair_rows[keep], cols[keep], overlap[keep], common[keep]
+        scores = np.zeros(len(pair_rows))
+        for start in range(0, len(pair_rows), OVERLAP_PAIR_CHUNK):
+            end = start + OVERLAP_PAIR_CHUNK
+            scores[start:end] = np.asarray(
+                self.unit[pair_rows[start:end]].multiply(self.unit[cols[start:end]]).sum(axis=1)).ravel()
+        scores = np.minimum(scores, 1.0)
+        
+        # 按基金和相似度从高到低排序，同一基金内的序号即为排名
+        order = np.lexsort((cols, -scores, pair_rows))
+        pair_rows, cols, scores, overlap, common = (
+            pair_rows[order], cols[order], scores[order], overlap[order], common[order])
+        ranks = np.arange(len(pair_rows)) - np.searchsorted(pair_rows, pair_rows, side='left') + 1
+        if top_k is not None:
+            keep = ranks <= top_k
+            pair_rows, cols, scores, ranks, overlap, common = (
+                pair_rows[keep], cols[keep], scores[keep], ranks[keep], overlap[keep], common[keep])
+        return pair_rows, cols, scores, ranks, overlap, common
+    
+    def iter_similar(self, top_k=SIMILARITY_TOP_K, min_overlap=None, batch_funds=SIMILARITY_BATCH_FUNDS, fund_codes=None):
+        """
+        分批计算每只基金的相似基金
+        
+        参数:
+            top_k (int): 每只基金保留的最相似基金数，None表示不限制
+            min_overlap (float): 最低持仓重合度（小数），None表示不限制
+            batch_funds (int): 每批的基金数
+            fund_codes (list): 只计算这些基金的相似基金，默认为None表示所有基金
+        
+        返回:
+            generator: 每批的相似基金DataFrame
+        """
+        if fund_codes is None:
+            targets = np.arange(len(self))
+        else:
+            targets = np.array(sorted(self.positions[code] for code in fund_codes if code in self.positions), dtype=np.int64)
+        
+        for start in range(0, len(targets), batch_funds):
+            rows = targets[start:start + batch_funds]
+            if min_overlap is None:
+                rows, cols, scores, ranks = self.get_top_k(rows, top_k)
+                overlap, common = self.get_overlap(rows, cols)
+            else:
+                rows, cols, scores, ranks, overlap, common = self.get_overlap_candidates(rows, min_overlap, top_k)
+            
+            yield pd.DataFrame({
+                '基金代码': self.codes[rows],
+                '相似基金代码': self.codes[cols],
+                '排名': ranks,
+                '相似度': scores,
+                '持仓重合度': overlap,
+                '共同持仓数': common,
+            }, columns=SIMILARITY_COLUMNS)
+    
+    def get_similar_funds(self, fund_code, top_k=SIMILARITY_TOP_K, min_overlap=None):
+        """
+        查找与某只基金持仓最相似的基金
+        
+        参数:
+            fund_code (str): 基金代码
+            top_k (int): 返回的基金数，None表示不限制
+            min_overlap (float): 最低持仓重合度（小数），如0.3表示至少30%的持仓重合
+        
+        返回:
+            pandas.DataFrame: 相似基金，按相似度从高到低排序；没有该基金的持仓时为空
+        """
+        return pd.concat(
+            [pd.DataFrame(columns=SIMILARITY_COLUMNS)] +
+            list(self.iter_similar(top_k, min_overlap, fund_codes=[str(fund_code)])),
+            ignore_index=True
+        )
+    
+    def get_overlapping_funds(self, fund_code, min_overlap):
+        """
+        查找与某只基金持仓重合度达到阈值的所有基金
+        
+        参数:
+            fund_code (str): 基金代码
+            min_overlap (float): 最低持仓重合度（小数）
+        
+        返回:
+            pandas.DataFrame: 重合度达到阈值的基金，按相似度从高到低排序
+        """
+        return self.get_similar_funds(fund_code, top_k=None, min_overlap=min_overlap)
+
+
+def load_holdings_matrix(data_source):
+    """
+    从保存的持仓数据建立持仓矩阵
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径或SQLite数据库名称
+    
+    返回:
+        HoldingsMatrix: 持仓矩阵
+    """
+    position_df = read_data(data_source, 'fund_position_info', columns=HOLDINGS_COLUMNS)
+    return HoldingsMatrix.from_frame(position_df)
+
+
+def compute_similar_funds(holdings, top_k=SIMILARITY_TOP_K, min_overlap=None, batch_funds=SIMILARITY_BATCH_FUNDS):
+    """
+    计算全市场每只基金的相似基金
+    
+    参数:
+        holdings (HoldingsMatrix): 持仓矩阵
+        top_k (int): 每只基金保留的最相似基金数
+        min_overlap (float): 最低持仓重合度（小数），None表示不限制
+        batch_funds (int): 每批的基金数
+    
+    返回:
+        pandas.DataFrame: 相似基金，包含基金代码、相似基金代码、排名、相似度、持仓重合度和共同持仓数
+    """
+    batches = list(holdings.iter_similar(top_k, min_overlap, batch_funds))
+    if not batches:
+        return pd.DataFrame(columns=SIMILARITY_COLUMNS)
+    return pd.concat(batches, ignore_index=True)
+
+
+def save_similar_funds_json(similar_df, file_path, holdings=None, top_k=SIMILARITY_TOP_K):
+    """
+    将相似基金保存为供智能体读取的JSON文件，先写临时文件再替换
+    
+    参数:
+        similar_df (pandas.DataFrame): compute_similar_funds返回的相似基金
+        file_path (str): JSON文件路径
+        holdings (HoldingsMatrix): 持仓矩阵，用于记录每只基金使用的持仓季度，默认为None
+        top_k (int): 计算时每只基金保留的相似基金数，记录在文件中供查询时限制返回的数量
+    """
+    quarters = holdings.quarters if holdings is not None else {}
+    funds = {}
+    for values in similar_df.to_dict('records'):
+        funds.setdefault(str(values['基金代码']), []).append({
+            'fund_id': str(values['相似基金代码']),
+            'rank': int(values['排名']),
+            'similarity': round(float(values['相似度']), 6),
+            'overlap': round(float(values['持仓重合度']), 6),
+            'common_holdings': int(values['共同持仓数']),
+        })
+    
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_file = f"{file_path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'last_update': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'top_k': top_k,
+            'quarters': {code: int(quarter) for code, quarter in quarters.items()},
+            'funds': funds,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_file, file_path)
+    print(f"相似基金已保存到: {file_path}")
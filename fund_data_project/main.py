@@ -5,8 +5,10 @@
 支持增量更新和断点续传功能
 """
 import os
+import time
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
 from fund_crawler import (
     get_fund_basic_info,
@@ -15,21 +17,47 @@ from fund_crawler import (
     get_fund_manager_info,
     get_fund_performance_info,
     get_fund_industry_allocation,
-    clean_temp_data
+    clean_temp_data,
+    create_fetch_engine,
+    configure_akshare_cache,
+    configure_work_queue,
+    configure_priority,
+    get_fund_universe,
+    get_crawl_status,
+    get_retry_counts,
+    PRIORITY_CHECKPOINTS,
+    TASK_FUND_CATEGORIES
+)
+from data_storage import save_to_sqlite, save_to_file, DuckDBBackend
+from metrics import metrics
+from work_queue import WorkQueue, DEFAULT_LEASE_SECONDS, DEFAULT_BATCH_SIZE
+from priority import parse_priority_weights
+from nav_store import NavStore, nav_store_exists, update_nav_store
+from risk_metrics import refresh_risk_state, get_risk_metrics, get_risk_state_file, save_risk_metrics_json
+from holdings_similarity import load_holdings_matrix, compute_similar_funds, save_similar_funds_json
+from holdings_crowding import load_holdings_crowding
+from daemon import (
+    CrawlerDaemon,
+    create_default_jobs,
+    DEFAULT_STATUS_PORT,
+    DEFAULT_NAV_TIME,
+    DEFAULT_HOLDINGS_TIME,
+    HOLDINGS_REFRESH_TTLS
 )
-from data_storage import save_to_csv, save_to_sqlite
 
 def parse_args():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='公募基金数据获取与存储工具')
-    parser.add_argument('--output', type=str, default='csv', choices=['csv', 'sqlite'],
-                        help='数据存储格式: csv或sqlite (默认: csv)')
+    parser.add_argument('--output', type=str, default='csv', choices=['csv', 'sqlite', 'parquet', 'duckdb'],
+                        help='数据存储格式: csv、sqlite、parquet或duckdb，duckdb将数据保存为Parquet并在DuckDB数据库中建立视图 (默认: csv)')
     parser.add_argument('--data-dir', type=str, default='./data',
                         help='数据存储目录 (默认: ./data)')
     parser.add_argument('--db-name', type=str, default='fund_data.db',
                         help='SQLite数据库名称 (默认: fund_data.db)')
+    parser.add_argument('--duckdb-name', type=str, default='fund_data.duckdb',
+                        help='DuckDB数据库名称 (默认: fund_data.duckdb)')
     parser.add_argument('--modules', type=str, nargs='+',
-                        default=['basic', 'nav', 'position', 'manager', 'performance', 'industry'],
+                        default=['basic', 'nav', 'position', 'manager', 'performance', 'industry', 'risk', 'similarity', 'crowding'],
                         help='要获取的数据模块 (默认: 全部)')
     parser.add_argument('--incremental', action='store_true',
                         help='启用增量更新模式，只获取未处理的基金数据')
@@ -43,9 +71,467 @@ def parse_args():
                         help='净值数据开始日期，格式为YYYYMMDD (默认: 20000101)')
     parser.add_argument('--end-date', type=str, default=None,
                         help='净值数据结束日期，格式为YYYYMMDD (默认: 当前日期)')
+    parser.add_argument('--daily-update', action='store_true',
+                        help='每日更新模式，只获取并追加晚于各基金已保存最新日期的净值数据')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='AKShare接口缓存目录 (默认: ./cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用AKShare接口缓存')
+    parser.add_argument('--offline', action='store_true',
+                        help='离线回放模式，只使用缓存中的数据，不访问网络')
+    parser.add_argument('--refresh-universe', action='store_true',
+                        help='重新获取基金列表，不使用本地基金列表快照')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并发请求线程数 (默认: 4)')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='每个接口每秒最大请求数 (默认: 按接口配置)')
+    parser.add_argument('--global-rate-limit', type=float, default=None,
+                        help='所有接口合计每秒最大请求数 (默认: 6)')
+    parser.add_argument('--queue', type=str, default=None,
+                        help='分布式抓取使用的任务队列SQLite文件，多台机器共用时应位于共享存储上 (默认: 不使用)')
+    parser.add_argument('--worker-id', type=str, default=None,
+                        help='分布式抓取时本进程的标识 (默认: 主机名-进程号)')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f'分布式抓取时每批基金的租约时长，单位秒 (默认: {DEFAULT_LEASE_SECONDS})')
+    parser.add_argument('--queue-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'分布式抓取时每批领取的基金数 (默认: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--queue-reset', action='store_true',
+                        help='将任务队列中所选模块的基金全部重新标记为待处理，用于开始新一轮分布式抓取')
+    parser.add_argument('--watchlist', type=str, default=None,
+                        help='关注列表文件，每行一个基金代码，其中的基金最先抓取 (默认: 不使用)')
+    parser.add_argument('--priority-weights', type=parse_priority_weights, default=None,
+                        help='抓取优先级各项得分的权重，如watchlist=100,performance=1,staleness=1 (默认: 即此值)')
+    parser.add_argument('--priority', action='store_true',
+                        help='按关注列表、业绩排名和数据陈旧程度的优先级抓取，指定--watchlist或--priority-weights时自动启用 '
+                             '(默认: 按基金代码顺序抓取)')
+    parser.add_argument('--no-priority', action='store_true',
+                        help='不按优先级排序，即使指定了--priority或--watchlist也按基金代码顺序抓取')
+    parser.add_argument('--checkpoints', type=float, nargs='*', default=None,
+                        help=f'处理到这些比例的基金时将已获取的数据合并到输出，供下游提前使用，不带参数表示不发布 '
+                             f'(默认: 按优先级抓取时为{" ".join(str(r) for r in PRIORITY_CHECKPOINTS)}，否则不发布)')
+    parser.add_argument('--nav-store', type=str, default=None,
+                        help='净值模块完成后将净值数据写入此目录的内存映射净值存储，如./data/fund_nav_info.navstore (默认: 不写入)')
+    parser.add_argument('--metrics-dir', type=str, default='./metrics',
+                        help='运行指标保存目录，保存Prometheus文本文件crawler.prom和JSON摘要summary.json (默认: ./metrics)')
+    parser.add_argument('--parallel-modules', type=int, default=None,
+                        help='最多同时运行的数据模块数 (默认: 不限制)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='常驻运行，按计划在交易日收盘后更新净值、在定期报告披露窗口内更新持仓和行业配置')
+    parser.add_argument('--nav-time', type=str, default=DEFAULT_NAV_TIME,
+                        help=f'常驻运行时每个交易日更新净值的时间，HH:MM格式 (默认: {DEFAULT_NAV_TIME})')
+    parser.add_argument('--holdings-time', type=str, default=DEFAULT_HOLDINGS_TIME,
+                        help=f'常驻运行时披露窗口内每天更新持仓的时间，HH:MM格式 (默认: {DEFAULT_HOLDINGS_TIME})')
+    parser.add_argument('--status-port', type=int, default=DEFAULT_STATUS_PORT,
+                        help=f'常驻运行时本机状态接口的端口 (默认: {DEFAULT_STATUS_PORT})')
     parser.set_defaults(incremental=True)
     return parser.parse_args()
 
+def get_output_file(args, name):
+    """
+    获取输出文件路径
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+        name (str): 数据名称，如'fund_nav_info'
+        
+    返回:
+        str: csv或parquet格式下的输出文件路径，duckdb格式下为Parquet文件路径，sqlite格式下返回None
+    """
+    if args.output == 'sqlite':
+        return None
+    extension = 'parquet' if args.output == 'duckdb' else args.output
+    return os.path.join(args.data_dir, f'{name}.{extension}')
+
+def register_output(args, name):
+    """
+    duckdb格式下在DuckDB数据库中建立读取输出Parquet文件的视图
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+        name (str): 数据名称，如'fund_nav_info'
+    """
+    if args.output != 'duckdb':
+        return
+    try:
+        DuckDBBackend(args.duckdb_name, args.data_dir).register(name, get_output_file(args, name))
+    except Exception as e:
+        # 数据已保存为Parquet，视图可在下次运行时再建立
+        print(f"在DuckDB数据库中建立视图 {name} 失败: {e}")
+
+def count_records(result):
+    """
+    统计记录数
+    
+    参数:
+        result (pandas.DataFrame or int): 数据获取函数的返回值，可以是数据本身或记录数
+        
+    返回:
+        int: 记录数
+    """
+    return len(result) if isinstance(result, pd.DataFrame) else result
+
+def run_basic_module(args, engine):
+    """获取并存储基金基本信息"""
+    print("\n获取基金基本信息...")
+    basic_info_df = get_fund_basic_info()
+    if not basic_info_df.empty:
+        output_file = get_output_file(args, 'fund_basic_info')
+        if output_file:
+            save_to_file(basic_info_df, output_file)
+        else:
+            save_to_sqlite(basic_info_df, args.db_name, 'fund_basic_info')
+        print(f"基金基本信息获取完成，共 {len(basic_info_df)} 条记录")
+        register_output(args, 'fund_basic_info')
+    else:
+        print("未获取到基金基本信息数据")
+
+def run_nav_module(args, engine):
+    """获取并存储基金净值信息"""
+    print("\n获取基金净值信息...")
+    output_file = get_output_file(args, 'fund_nav_info')
+    nav_info_df = get_fund_nav_info(
+        start_date=args.start_date,
+        end_date=args.end_date,
+        output_file=output_file,
+        db_name=args.db_name if args.output == 'sqlite' else None,
+        table_name='fund_nav_info' if args.output == 'sqlite' else None,
+        incremental=args.incremental,
+        engine=engine,
+        daily_update=args.daily_update,
+        return_df=False
+    )
+    print(f"基金净值信息获取完成，共 {count_records(nav_info_df)} 条记录")
+    register_output(args, 'fund_nav_info')
+    if args.nav_store:
+        update_nav_store(get_output_file(args, 'fund_nav_info') or args.db_name, args.nav_store)
+
+def run_position_module(args, engine):
+    """获取并存储基金持仓信息"""
+    print("\n获取基金持仓信息...")
+    output_file = get_output_file(args, 'fund_position_info')
+    position_info_df = get_fund_position_info(
+        year=args.year,
+        output_file=output_file,
+        db_name=args.db_name if args.output == 'sqlite' else None,
+        table_name='fund_position_info' if args.output == 'sqlite' else None,
+        incremental=args.incremental,
+        engine=engine,
+        return_df=False
+    )
+    print(f"基金持仓信息获取完成，共 {count_records(position_info_df)} 条记录")
+    register_output(args, 'fund_position_info')
+
+def run_industry_module(args, engine):
+    """获取并存储基金行业配置信息"""
+    print("\n获取基金行业配置信息...")
+    output_file = get_output_file(args, 'fund_industry_allocation')
+    industry_info_df = get_fund_industry_allocation(
+        year=args.year,
+        output_file=output_file,
+        db_name=args.db_name if args.output == 'sqlite' else None,
+        table_name='fund_industry_allocation' if args.output == 'sqlite' else None,
+        incremental=args.incremental,
+        engine=engine,
+        return_df=False
+    )
+    print(f"基金行业配置信息获取完成，共 {count_records(industry_info_df)} 条记录")
+    register_output(args, 'fund_industry_allocation')
+
+def run_manager_module(args, engine):
+    """获取并存储基金经理信息"""
+    print("\n获取基金经理信息...")
+    output_file = get_output_file(args, 'fund_manager_info')
+    manager_info_df = get_fund_manager_info(
+        output_file=output_file,
+        db_name=args.db_name if args.output == 'sqlite' else None,
+        table_name='fund_manager_info' if args.output == 'sqlite' else None,
+        engine=engine
+    )
+    print(f"基金经理信息获取完成，共 {len(manager_info_df)} 条记录")
+    register_output(args, 'fund_manager_info')
+
+def run_performance_module(args, engine):
+    """获取并存储基金业绩信息"""
+    print("\n获取基金业绩信息...")
+    output_file = get_output_file(args, 'fund_performance_info')
+    performance_info_df = get_fund_performance_info(
+        output_file=output_file,
+        db_name=args.db_name if args.output == 'sqlite' else None,
+        table_name='fund_performance_info' if args.output == 'sqlite' else None,
+        engine=engine
+    )
+    print(f"基金业绩信息获取完成，共 {len(performance_info_df)} 条记录")
+    register_output(args, 'fund_performance_info')
+
+def run_risk_module(args, engine):
+    """根据净值计算并存储基金风险指标"""
+    print("\n计算基金风险指标...")
+    store_dir = args.nav_store or os.path.join(args.data_dir, 'fund_nav_info.navstore')
+    if not args.nav_store or not nav_store_exists(store_dir):
+        # 将已保存的净值数据中新增的记录追加到净值存储，存储不存在时整体建立
+        update_nav_store(get_output_file(args, 'fund_nav_info') or args.db_name, store_dir)
+    # 用新增的净值增量更新保存在净值存储旁边的指标状态，没有状态时全部计算
+    risk_state = refresh_risk_state(NavStore(store_dir), get_risk_state_file(store_dir))
+    risk_metrics_df = get_risk_metrics(risk_state)
+    
+    # 结果包含所有基金，整体替换旧的结果
+    output_file = get_output_file(args, 'fund_risk_metrics')
+    if output_file:
+        save_to_file(risk_metrics_df, output_file)
+    else:
+        save_to_sqlite(risk_metrics_df, args.db_name, 'fund_risk_metrics', if_exists='replace')
+    register_output(args, 'fund_risk_metrics')
+    save_risk_metrics_json(risk_metrics_df, os.path.join(args.data_dir, 'fund_risk_metrics.json'))
+    print(f"基金风险指标计算完成，共 {len(risk_metrics_df)} 条记录")
+
+def run_similarity_module(args, engine):
+    """根据持仓计算并存储每只基金的相似基金"""
+    print("\n计算基金持仓相似度...")
+    holdings = load_holdings_matrix(get_output_file(args, 'fund_position_info') or args.db_name)
+    similar_df = compute_similar_funds(holdings)
+    
+    # 结果包含所有基金，整体替换旧的结果
+    output_file = get_output_file(args, 'fund_similarity')
+    if output_file:
+        save_to_file(similar_df, output_file)
+    else:
+        save_to_sqlite(similar_df, args.db_name, 'fund_similarity', if_exists='replace')
+    register_output(args, 'fund_similarity')
+    save_similar_funds_json(similar_df, os.path.join(args.data_dir, 'fund_similarity.json'), holdings)
+    print(f"基金持仓相似度计算完成，{len(holdings)} 只基金共 {len(similar_df)} 条记录")
+
+def run_crowding_module(args, engine):
+    """根据持仓按证券和季度计算并存储持仓拥挤度"""
+    print("\n计算持仓拥挤度...")
+    crowding_df = load_holdings_crowding(get_output_file(args, 'fund_position_info') or args.db_name)
+    
+    # 结果包含所有季度，整体替换旧的结果
+    output_file = get_output_file(args, 'fund_holdings_crowding')
+    if output_file:
+        save_to_file(crowding_df, output_file)
+    else:
+        save_to_sqlite(crowding_df, args.db_name, 'fund_holdings_crowding', if_exists='replace')
+    register_output(args, 'fund_holdings_crowding')
+    print(f"持仓拥挤度计算完成，共 {len(crowding_df)} 条记录")
+
+# 各数据模块的执行函数和依赖：逐只基金获取的模块依赖基金列表，基金经理和业绩信息相互独立，风险指标在净值之后计算，持仓相似度和拥挤度在持仓之后计算
+MODULE_TASKS = {
+    'basic': (run_basic_module, ['universe']),
+    'nav': (run_nav_module, ['universe']),
+    'position': (run_position_module, ['universe']),
+    'industry': (run_industry_module, ['universe']),
+    'manager': (run_manager_module, []),
+    'performance': (run_performance_module, []),
+    'risk': (run_risk_module, ['nav']),
+    'similarity': (run_similarity_module, ['position']),
+    'crowding': (run_crowding_module, ['position']),
+}
+
+def run_task_graph(tasks, max_parallel=None):
+    """
+    按依赖关系并发执行任务，一个任务的所有依赖完成后立即开始
+    
+    参数:
+        tasks (dict): 任务名称到 (执行函数, 依赖的任务名称列表) 的映射，执行函数不接受参数
+        max_parallel (int): 最多同时执行的任务数，默认为None表示不限制
+        
+    返回:
+        dict: 任务名称到 {'start', 'end', 'status'} 的映射，时间为相对于开始执行的秒数，
+              status为'success'、'failed'或'skipped'（依赖的任务失败）
+    """
+    timings = {}
+    pending = {name: set(deps) & set(tasks) for name, (_, deps) in tasks.items()}
+    running = {}
+    graph_start = time.monotonic()
+    
+    def run(name):
+        timings[name] = {'start': time.monotonic() - graph_start}
+        try:
+            tasks[name][0]()
+            timings[name]['status'] = 'success'
+        except Exception as e:
+            print(f"任务 {name} 执行失败: {e}")
+            timings[name]['status'] = 'failed'
+        timings[name]['end'] = time.monotonic() - graph_start
+        return name
+    
+    with ThreadPoolExecutor(max_workers=max_parallel or max(1, len(tasks))) as executor:
+        while pending or running:
+            # 提交依赖已全部完成的任务，依赖失败的任务直接跳过
+            for name in list(pending):
+                deps = pending[name]
+                if any(timings.get(dep, {}).get('status') in ('failed', 'skipped') for dep in deps):
+                    now = time.monotonic() - graph_start
+                    timings[name] = {'start': now, 'end': now, 'status': 'skipped'}
+                    print(f"任务 {name} 的依赖任务失败，已跳过")
+                    del pending[name]
+                elif all(timings.get(dep, {}).get('status') == 'success' for dep in deps):
+                    running[executor.submit(run, name)] = name
+                    del pending[name]
+            
+            if not running:
+                if pending:
+                    raise ValueError(f"任务之间存在循环依赖: {', '.join(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+    
+    return timings
+
+def get_critical_path(tasks, timings):
+    """
+    计算关键路径：从最后完成的任务开始，沿最晚完成的依赖向前回溯
+    
+    参数:
+        tasks (dict): 任务名称到 (执行函数, 依赖的任务名称列表) 的映射
+        timings (dict): run_task_graph返回的任务耗时
+        
+    返回:
+        list: 关键路径上的任务名称，按执行顺序排列
+    """
+    if not timings:
+        return []
+    
+    path = [max(timings, key=lambda name: timings[name]['end'])]
+    while True:
+        deps = [dep for dep in tasks[path[-1]][1] if dep in timings]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda dep: timings[dep]['end']))
+    return path[::-1]
+
+def print_timing_summary(tasks, timings):
+    """
+    打印各任务耗时和关键路径
+    
+    参数:
+        tasks (dict): 任务名称到 (执行函数, 依赖的任务名称列表) 的映射
+        timings (dict): run_task_graph返回的任务耗时
+    """
+    print("\n各模块耗时:")
+    for name, timing in sorted(timings.items(), key=lambda item: item[1]['start']):
+        print(f"  {name:<12} 开始 +{timing['start']:.1f}s  结束 +{timing['end']:.1f}s  "
+              f"耗时 {timing['end'] - timing['start']:.1f}s  {timing['status']}")
+    
+    critical_path = get_critical_path(tasks, timings)
+    if critical_path:
+        path_time = sum(timings[name]['end'] - timings[name]['start'] for name in critical_path)
+        total_time = max(timing['end'] for timing in timings.values())
+        print(f"关键路径: {' -> '.join(critical_path)}，耗时 {path_time:.1f}s，总耗时 {total_time:.1f}s")
+
+def configure_crawler(args, cache_ttls=None):
+    """
+    按命令行参数配置接口缓存、分布式抓取的任务队列和抓取优先级
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+        cache_ttls (dict): 要修改的接口缓存有效期（秒），默认为None
+        
+    返回:
+        WorkQueue: 任务队列，未使用任务队列时返回None
+    """
+    # 配置AKShare接口缓存
+    configure_akshare_cache(cache_dir=args.cache_dir, offline=args.offline, enabled=not args.no_cache, ttls=cache_ttls)
+    
+    # 配置分布式抓取的任务队列
+    queue = None
+    if args.queue:
+        queue = WorkQueue(args.queue, worker_id=args.worker_id, lease_seconds=args.lease_seconds)
+        if args.queue_reset:
+            for module in args.modules:
+                queue.reset(module)
+            print(f"已将任务队列中 {', '.join(args.modules)} 模块的基金重新标记为待处理")
+        configure_work_queue(queue, batch_size=args.queue_batch_size)
+        print(f"使用任务队列 {args.queue} 分布式抓取，工作进程: {queue.worker_id}")
+    
+    # 配置抓取优先级和阶段性结果的检查点
+    use_priority = args.priority or args.watchlist is not None or args.priority_weights is not None
+    configure_priority(enabled=use_priority and not args.no_priority, weights=args.priority_weights,
+                       watchlist_file=args.watchlist, checkpoints=args.checkpoints)
+    return queue
+
+def build_tasks(args, engine, modules):
+    """
+    构建数据模块的任务图，基金列表只加载一次，供依赖它的模块共用
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+        engine (FetchEngine): 共享的抓取引擎
+        modules (list): 要运行的数据模块
+        
+    返回:
+        dict: 任务名称到 (执行函数, 依赖的任务名称列表) 的映射
+    """
+    tasks = {}
+    for module in modules:
+        if module not in MODULE_TASKS:
+            print(f"未知的数据模块: {module}")
+            continue
+        run_module, deps = MODULE_TASKS[module]
+        tasks[module] = (lambda run_module=run_module: run_module(args, engine), deps)
+    if any('universe' in deps for _, deps in tasks.values()):
+        tasks['universe'] = (lambda: get_fund_universe(refresh=args.refresh_universe), [])
+    return tasks
+
+def get_daemon_status(engine, queue, modules):
+    """
+    获取常驻服务状态接口中的抓取进度和队列深度
+    
+    参数:
+        engine (FetchEngine): 共享的抓取引擎
+        queue (WorkQueue): 任务队列，未使用时为None
+        modules (list): 数据模块
+        
+    返回:
+        dict: 包含各任务的抓取进度、任务队列中各状态的基金数、持仓重试队列长度和接口请求统计
+    """
+    return {
+        'crawl': get_crawl_status(),
+        'work_queue': {module: queue.get_counts(module) for module in modules
+                       if module in TASK_FUND_CATEGORIES} if queue else None,
+        'retry_queue': {'position': get_retry_counts('position')},
+        'fetch': engine.get_stats(),
+    }
+
+def run_daemon(args, engine, queue):
+    """
+    常驻运行，按计划运行净值和持仓更新任务，直到通过状态接口停止或收到Ctrl+C
+    
+    参数:
+        args (argparse.Namespace): 命令行参数
+        engine (FetchEngine): 共享的抓取引擎
+        queue (WorkQueue): 任务队列，未使用时为None
+    """
+    jobs = [job for job in create_default_jobs(args.nav_time, args.holdings_time)
+            if set(job.modules) & set(args.modules)]
+    
+    def run_job(job, date, wrap_task):
+        modules = [module for module in job.modules if module in args.modules]
+        # 基金列表在有效期内复用常驻进程中已加载的快照
+        job_args = argparse.Namespace(**{**vars(args), 'refresh_universe': False, **job.get_overrides(date)})
+        if queue is not None:
+            # 多个常驻进程按同一计划运行时，由第一个进程开始新一轮抓取
+            started_before = job.get_run_time(date).timestamp()
+            for module in modules:
+                if queue.reset_round(module, started_before):
+                    print(f"已将任务队列中 {module} 模块的基金重新标记为待处理")
+        
+        tasks = build_tasks(job_args, engine, modules)
+        tasks = {name: (wrap_task(name, func), deps) for name, (func, deps) in tasks.items()}
+        timings = run_task_graph(tasks, max_parallel=args.parallel_modules)
+        print_timing_summary(tasks, timings)
+        metrics.export(args.metrics_dir)
+        return timings
+    
+    daemon = CrawlerDaemon(jobs, run_job,
+                           get_extra_status=lambda: get_daemon_status(engine, queue, args.modules))
+    
+    # 启动时加载基金列表，之后各次任务共用
+    get_fund_universe(refresh=args.refresh_universe)
+    daemon.start_status_server(port=args.status_port)
+    daemon.serve_forever()
+
 def main():
     """主函数"""
     args = parse_args()
@@ -53,89 +539,34 @@ def main():
     # 确保数据目录存在
     os.makedirs(args.data_dir, exist_ok=True)
     
+    # 配置接口缓存、任务队列和抓取优先级；常驻运行时缩短持仓类接口的缓存有效期
+    queue = configure_crawler(args, cache_ttls=HOLDINGS_REFRESH_TTLS if args.daemon else None)
+    
     # 如果需要清理临时数据
     if args.clean_temp:
         print("清理临时数据文件...")
         clean_temp_data()
     
+    # 创建共享的抓取引擎，所有模块共用同一个并发和请求速率预算
+    engine = create_fetch_engine(max_workers=args.workers, rate_limit=args.rate_limit,
+                                 global_rate_limit=args.global_rate_limit)
+    
+    if args.daemon:
+        print(f"以常驻模式运行，存储格式: {args.output}")
+        run_daemon(args, engine, queue)
+        return
+    
     print(f"开始获取公募基金数据，存储格式: {args.output}, 增量更新模式: {args.incremental}")
     start_time = datetime.now()
     
-    # 获取并存储基金基本信息
-    if 'basic' in args.modules:
-        print("\n获取基金基本信息...")
-        basic_info_df = get_fund_basic_info()
-        if not basic_info_df.empty:
-            output_file = os.path.join(args.data_dir, 'fund_basic_info.csv') if args.output == 'csv' else None
-            if args.output == 'csv':
-                save_to_csv(basic_info_df, output_file)
-            else:
-                save_to_sqlite(basic_info_df, args.db_name, 'fund_basic_info')
-            print(f"基金基本信息获取完成，共 {len(basic_info_df)} 条记录")
-        else:
-            print("未获取到基金基本信息数据")
-    
-    # 获取并存储基金净值信息
-    if 'nav' in args.modules:
-        print("\n获取基金净值信息...")
-        output_file = os.path.join(args.data_dir, 'fund_nav_info.csv') if args.output == 'csv' else None
-        nav_info_df = get_fund_nav_info(
-            start_date=args.start_date,
-            end_date=args.end_date,
-            output_file=output_file,
-            db_name=args.db_name if args.output == 'sqlite' else None,
-            table_name='fund_nav_info' if args.output == 'sqlite' else None,
-            incremental=args.incremental
-        )
-        print(f"基金净值信息获取完成，共 {len(nav_info_df)} 条记录")
-    
-    # 获取并存储基金持仓信息
-    if 'position' in args.modules:
-        print("\n获取基金持仓信息...")
-        output_file = os.path.join(args.data_dir, 'fund_position_info.csv') if args.output == 'csv' else None
-        position_info_df = get_fund_position_info(
-            year=args.year,
-            output_file=output_file,
-            db_name=args.db_name if args.output == 'sqlite' else None,
-            table_name='fund_position_info' if args.output == 'sqlite' else None,
-            incremental=args.incremental
-        )
-        print(f"基金持仓信息获取完成，共 {len(position_info_df)} 条记录")
-    
-    # 获取并存储基金行业配置信息
-    if 'industry' in args.modules:
-        print("\n获取基金行业配置信息...")
-        output_file = os.path.join(args.data_dir, 'fund_industry_allocation.csv') if args.output == 'csv' else None
-        industry_info_df = get_fund_industry_allocation(
-            year=args.year,
-            output_file=output_file,
-            db_name=args.db_name if args.output == 'sqlite' else None,
-            table_name='fund_industry_allocation' if args.output == 'sqlite' else None,
-            incremental=args.incremental
-        )
-        print(f"基金行业配置信息获取完成，共 {len(industry_info_df)} 条记录")
-    
-    # 获取并存储基金经理信息
-    if 'manager' in args.modules:
-        print("\n获取基金经理信息...")
-        output_file = os.path.join(args.data_dir, 'fund_manager_info.csv') if args.output == 'csv' else None
-        manager_info_df = get_fund_manager_info(
-            output_file=output_file,
-            db_name=args.db_name if args.output == 'sqlite' else None,
-            table_name='fund_manager_info' if args.output == 'sqlite' else None
-        )
-        print(f"基金经理信息获取完成，共 {len(manager_info_df)} 条记录")
-    
-    # 获取并存储基金业绩信息
-    if 'performance' in args.modules:
-        print("\n获取基金业绩信息...")
-        output_file = os.path.join(args.data_dir, 'fund_performance_info.csv') if args.output == 'csv' else None
-        performance_info_df = get_fund_performance_info(
-            output_file=output_file,
-            db_name=args.db_name if args.output == 'sqlite' else None,
-            table_name='fund_performance_info' if args.output == 'sqlite' else None
-        )
-        print(f"基金业绩信息获取完成，共 {len(performance_info_df)} 条记录")
+    tasks = build_tasks(args, engine, args.modules)
+    timings = run_task_graph(tasks, max_parallel=args.parallel_modules)
+    print_timing_summary(tasks, timings)
+    
+    # 导出接口调用和存储操作的运行指标
+    metrics.report()
+    prometheus_file, summary_file = metrics.export(args.metrics_dir)
+    print(f"运行指标已保存到: {prometheus_file}, {summary_file}")
     
     end_time = datetime.now()
     print(f"\n数据获取完成，总耗时: {end_time - start_time}")
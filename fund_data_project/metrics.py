@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标模块，记录接口调用和存储操作的耗时分布、成功失败次数、记录数和字节数
+运行结束时可导出为Prometheus文本格式和JSON摘要
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# 耗时直方图的默认分桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 各指标的说明
+METRIC_HELP = {
+    'akshare_request_duration_seconds': 'AKShare接口调用耗时',
+    'akshare_requests_total': 'AKShare接口调用次数',
+    'akshare_request_rows_total': 'AKShare接口返回的记录数',
+    'akshare_request_bytes_total': 'AKShare接口返回数据的内存字节数',
+    'fetch_rate_limit_wait_seconds_total': '等待限速令牌的累计时间',
+    'fetch_circuit_open_total': '接口熔断期间被拒绝的请求数',
+    'crawler_retries_total': '加入重试队列的失败调用次数',
+    'storage_operation_duration_seconds': '存储操作耗时',
+    'storage_operations_total': '存储操作次数',
+    'storage_operation_rows_total': '存储操作读写的记录数',
+    'storage_operation_bytes_total': '存储操作读写的字节数，文件为磁盘字节数，数据库为数据的内存字节数',
+    'storage_unchanged_skips_total': '内容没有变化而跳过的临时文件写入次数',
+}
+
+
+class Histogram:
+    """
+    固定分桶的直方图
+    
+    参数:
+        buckets (tuple): 分桶上界，按升序排列
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        """记录一个观测值"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q):
+        """
+        按分桶估计分位数，取分位数所在分桶的上界
+        
+        参数:
+            q (float): 分位数，0到1之间
+        
+        返回:
+            float: 估计值，没有观测值时返回0
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    指标注册表，线程安全
+    
+    指标按名称和标签区分，计数器用inc()累加，直方图用observe()记录
+    """
+    
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def get_key(name, labels):
+        return name, tuple(sorted(labels.items()))
+    
+    def inc(self, name, amount=1, **labels):
+        """
+        累加计数器
+        
+        参数:
+            name (str): 指标名称
+            amount (float): 增加量，默认为1
+            **labels: 标签
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        """
+        记录直方图观测值
+        
+        参数:
+            name (str): 指标名称
+            value (float): 观测值
+            **labels: 标签
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[key] = histogram
+            histogram.observe(value)
+    
+    @contextmanager
+    def track(self, prefix, total_name, **labels):
+        """
+        记录一次操作的耗时、成功或失败、记录数和字节数
+        
+        用法:
+            with metrics.track('storage_operation', 'storage_operations_total', operation='save_to_csv') as op:
+                ...
+                op['rows'] = len(df)
+                op['bytes'] = os.path.getsize(file_path)
+        
+        参数:
+            prefix (str): 指标名称前缀，耗时、记录数和字节数分别记录为{prefix}_duration_seconds、
+                          {prefix}_rows_total和{prefix}_bytes_total
+            total_name (str): 操作次数计数器的名称，按status标签区分成功和失败
+            **labels: 标签
+        """
+        op = {'rows': None, 'bytes': None}
+        start = time.perf_counter()
+        try:
+            yield op
+        except Exception:
+            self.inc(total_name, status='error', **labels)
+            raise
+        finally:
+            self.observe(f"{prefix}_duration_seconds", time.perf_counter() - start, **labels)
+        self.inc(total_name, status='success', **labels)
+        if op['rows'] is not None:
+            self.inc(f"{prefix}_rows_total", op['rows'], **labels)
+        if op['bytes'] is not None:
+            self.inc(f"{prefix}_bytes_total", op['bytes'], **labels)
+    
+    def reset(self):
+        """清空所有指标"""
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+    
+    def to_prometheus(self):
+        """
+        导出为Prometheus文本格式
+        
+        返回:
+            str: Prometheus文本格式的指标
+        """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        
+        lines = []
+        described = set()
+        
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {metric_type}")
+        
+        for (name, labels), histogram in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        
+        return '\n'.join(lines) + '\n'
+    
+    def summary(self):
+        """
+        生成JSON摘要
+        
+        返回:
+            dict: 包含counters和histograms两部分，直方图给出次数、总耗时、平均值、分位数和最大值
+        """
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = [(key, histogram.count, histogram.sum, histogram.max,
+                           histogram.quantile(0.5), histogram.quantile(0.95), histogram.quantile(0.99))
+                          for key, histogram in self.histograms.items()]
+        
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters)
+            ],
+            'histograms': [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': count,
+                    'sum': total,
+                    'mean': total / count if count else 0.0,
+                    'p50': p50,
+                    'p95': p95,
+                    'p99': p99,
+                    'max': maximum,
+                }
+                for (name, labels), count, total, maximum, p50, p95, p99 in sorted(histograms, key=lambda item: item[0])
+            ],
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    
+    def export(self, metrics_dir):
+        """
+        将指标保存为Prometheus文本文件和JSON摘要
+        
+        参数:
+            metrics_dir (str): 保存目录
+        
+        返回:
+            tuple: (Prometheus文本文件路径, JSON摘要文件路径)
+        """
+        os.makedirs(metrics_dir, exist_ok=True)
+        prometheus_file = os.path.join(metrics_dir, 'crawler.prom')
+        summary_file = os.path.join(metrics_dir, 'summary.json')
+        
+        # 先写临时文件再替换，避免采集程序读到不完整的文件
+        for file_path, content in ((prometheus_file, self.to_prometheus()),
+                                   (summary_file, json.dumps(self.summary(), ensure_ascii=False, indent=2))):
+            tmp_file = f"{file_path}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_file, file_path)
+        return prometheus_file, summary_file
+    
+    def report(self):
+        """按总耗时从高到低打印各接口和存储操作的耗时摘要"""
+        summary = self.summary()
+        rows = [h for h in summary['histograms'] if h['count']]
+        if not rows:
+            return
+        print("\n接口调用和存储操作耗时（按总耗时排序）:")
+        for h in sorted(rows, key=lambda h: -h['sum']):
+            labels = ','.join(f"{key}={value}" for key, value in h['labels'].items())
+            print(f"  {h['name'].replace('_duration_seconds', '')}[{labels}]: {h['count']} 次，总耗时 {h['sum']:.1f}s，"
+                  f"平均 {h['mean'] * 1000:.0f}ms，p95 {h['p95'] * 1000:.0f}ms，最大 {h['max'] * 1000:.0f}ms")
+
+
+def format_labels(labels):
+    """
+    将标签格式化为Prometheus文本格式
+    
+    参数:
+        labels (tuple): (标签名, 标签值) 元组
+    
+    返回:
+        str: 如 {endpoint="fund_name_em"}，没有标签时返回空字符串
+    """
+    if not labels:
+        return ''
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def get_data_bytes(data):
+    """
+    估计接口返回数据的内存字节数
+    
+    参数:
+        data: 接口返回值，通常为pandas.DataFrame
+    
+    返回:
+        int: 字节数，无法估计时返回None
+    """
+    memory_usage = getattr(data, 'memory_usage', None)
+    if memory_usage is None:
+        return None
+    try:
+        return int(memory_usage(deep=True).sum())
+    except Exception:
+        return None
+
+
+# 全局指标注册表，各模块共用
+metrics = MetricsRegistry()
@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+净值时间序列存储模块，将净值数据按基金连续存放在内存映射的float64数组中，
+任意进程打开后无需解析即可零拷贝地取出单只基金的净值序列，或取出多只基金的净值面板
+
+存储目录中的CURRENT文件记录当前版本目录的名称（如v000003），每次写入新建一个版本目录，
+写完后替换CURRENT切换版本，读取方在任何时刻都能打开一个完整的版本；没有CURRENT文件的旧存储直接读取存储目录
+
+版本目录中的文件:
+    meta.json       记录数、基金数、交易日数和各数组的类型
+    dates.bin       所有基金共用的交易日索引，datetime64[D]，升序
+    codes.bin       基金代码，升序
+    offsets.bin     每只基金的记录在数值数组中的起止位置，int64，长度为基金数+1
+    date_index.bin  每条记录的日期在交易日索引中的位置，int32
+    unit_nav.bin    单位净值，float64，同一基金的记录按日期升序连续存放
+    acc_nav.bin     累计净值，float64
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from data_storage import (
+    StorageBackend,
+    STORAGE_BACKENDS,
+    get_storage_backend,
+    get_date_range,
+    read_data,
+    remove_path
+)
+
+# 存储格式版本，格式不兼容时递增
+NAV_STORE_VERSION = 1
+
+# 存储的净值列及对应的数组文件
+NAV_STORE_COLUMNS = {
+    '单位净值': 'unit_nav.bin',
+    '累计净值': 'acc_nav.bin',
+}
+
+# 从数据源建立存储时每批读取的基金数，只在内存中保留一批基金的净值
+NAV_STORE_BATCH_FUNDS = 500
+
+# 净值存储目录的扩展名，read_data等按此扩展名选择NavStoreBackend
+NAV_STORE_EXTENSION = '.navstore'
+
+# 存储目录中指向当前版本目录的文件
+NAV_STORE_POINTER = 'CURRENT'
+
+# 增量追加时从存储最新日期前多少天开始重新读取，晚到的净值在此范围内也会追加到存储中；
+# 此范围之前的记录数与存储不一致的基金（新基金、补抓了历史净值的基金）重新读取全部净值
+NAV_STORE_APPEND_LOOKBACK_DAYS = 7
+
+
+def get_nav_store_data_dir(store_dir):
+    """
+    获取存储当前版本的数据目录
+    
+    参数:
+        store_dir (str): 存储目录
+    
+    返回:
+        str: CURRENT文件指向的版本目录，没有CURRENT文件时为存储目录本身
+    """
+    pointer_file = os.path.join(store_dir, NAV_STORE_POINTER)
+    if os.path.exists(pointer_file):
+        with open(pointer_file, 'r', encoding='utf-8') as f:
+            return os.path.join(store_dir, f.read().strip())
+    return store_dir
+
+
+def nav_store_exists(store_dir):
+    """判断存储目录中是否有可以打开的净值存储"""
+    return os.path.exists(os.path.join(get_nav_store_data_dir(store_dir), 'meta.json'))
+
+
+def remove_old_versions(store_dir, keep):
+    """
+    删除存储目录中不再使用的版本目录、未写完的临时目录和旧格式的数组文件
+    
+    参数:
+        store_dir (str): 存储目录
+        keep (set): 保留的版本目录名称，包括当前版本和上一个版本，上一个版本可能仍有进程正在打开
+    """
+    for name in os.listdir(store_dir):
+        if name in keep or name == NAV_STORE_POINTER:
+            continue
+        path = os.path.join(store_dir, name)
+        legacy_file = name == 'meta.json' or name.endswith('.bin')
+        if legacy_file and '' in keep:
+            continue
+        if legacy_file or (os.path.isdir(path) and name.startswith('v')):
+            try:
+                remove_path(path)
+            except OSError as e:
+                # 其他进程仍以内存映射打开旧版本时（如Windows上）无法删除，留到下次写入时再删除
+                print(f"删除净值存储旧版本 {path} 失败: {e}")
+
+
+def write_nav_store(frames, store_dir):
+    """
+    将净值数据写入存储目录的新版本目录，写完后替换CURRENT文件切换版本，
+    切换是原子的，正在读取旧版本的进程不受影响
+    
+    参数:
+        frames (iterable): 依次产生净值数据的DataFrame，需包含'基金代码'和'净值日期'列；
+                           同一基金的记录应全部位于同一个DataFrame中
+        store_dir (str): 存储目录
+    
+    返回:
+        dict: 存储的元数据
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    previous_dir = get_nav_store_data_dir(store_dir)
+    versions = [int(name[1:]) for name in os.listdir(store_dir)
+                if name.startswith('v') and name[1:].isdigit() and os.path.isdir(os.path.join(store_dir, name))]
+    version_name = f"v{max(versions, default=0) + 1:06d}"
+    tmp_dir = os.path.join(store_dir, f"{version_name}.tmp")
+    remove_path(tmp_dir)
+    os.makedirs(tmp_dir)
+    
+    codes = []
+    counts = []
+    day_file = os.path.join(tmp_dir, 'days.tmp')
+    value_files = {column: open(os.path.join(tmp_dir, file_name), 'wb') for column, file_name in NAV_STORE_COLUMNS.items()}
+    try:
+        with open(day_file, 'wb') as days_out:
+            for df in frames:
+                if df is None or df.empty:
+                    continue
+                df = df.assign(基金代码=df['基金代码'].astype(str),
+                               净值日期=pd.to_datetime(df['净值日期'], errors='coerce'))
+                df = df.dropna(subset=['净值日期'])
+                df = df.drop_duplicates(subset=['基金代码', '净值日期'], keep='last')
+                df = df.sort_values(['基金代码', '净值日期'])
+                
+                fund_counts = df.groupby('基金代码', sort=True).size()
+                codes.extend(fund_counts.index)
+                counts.extend(fund_counts.values)
+                days_out.write(df['净值日期'].values.astype('datetime64[D]').astype(np.int64).tobytes())
+                for column, f in value_files.items():
+                    if column in df.columns:
+                        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                    else:
+                        values = np.full(len(df), np.nan)
+                    f.write(values.tobytes())
+    finally:
+        for f in value_files.values():
+            f.close()
+    
+    if len(set(codes)) != len(codes):
+        remove_path(tmp_dir)
+        raise ValueError("同一基金的净值数据出现在多批数据中")
+    
+    # 按基金代码排序，各批数据的基金不重叠，整批重排即可
+    order = np.asarray(sorted(range(len(codes)), key=codes.__getitem__), dtype=np.int64)
+    
+    counts = np.asarray(counts, dtype=np.int64)
+    batch_offsets = np.concatenate([[0], np.cumsum(counts)])
+    total_rows = int(batch_offsets[-1])
+    row_days = np.fromfile(day_file, dtype=np.int64) if total_rows else np.empty(0, dtype=np.int64)
+    os.remove(day_file)
+    
+    # 数据源已按基金代码排序时直接使用，否则按排序后的顺序重排各数组
+    if not np.array_equal(order, np.arange(len(codes))):
+        row_order = np.concatenate([np.arange(batch_offsets[i], batch_offsets[i + 1]) for i in order]) \
+            if len(order) else np.empty(0, dtype=np.int64)
+        row_days = row_days[row_order]
+        for file_name in NAV_STORE_COLUMNS.values():
+            file_path = os.path.join(tmp_dir, file_name)
+            np.fromfile(file_path, dtype=np.float64)[row_order].tofile(file_path)
+        counts = counts[order]
+        codes = [codes[i] for i in order]
+    
+    dates = np.unique(row_days).astype('datetime64[D]')
+    date_index = np.searchsorted(dates.astype(np.int64), row_days).astype(np.int32)
+    codes_array = np.asarray(codes, dtype=f"<U{max((len(code) for code in codes), default=1)}")
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    
+    dates.tofile(os.path.join(tmp_dir, 'dates.bin'))
+    codes_array.tofile(os.path.join(tmp_dir, 'codes.bin'))
+    offsets.tofile(os.path.join(tmp_dir, 'offsets.bin'))
+    date_index.tofile(os.path.join(tmp_dir, 'date_index.bin'))
+    
+    meta = {
+        'version': NAV_STORE_VERSION,
+        'rows': total_rows,
+        'funds': len(codes_array),
+        'dates': len(dates),
+        'code_dtype': codes_array.dtype.str,
+        'columns': NAV_STORE_COLUMNS,
+        'start_date': str(dates[0]) if len(dates) else None,
+        'end_date': str(dates[-1]) if len(dates) else None,
+        'build_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    
+    os.replace(tmp_dir, os.path.join(store_dir, version_name))
+    pointer_file = os.path.join(store_dir, NAV_STORE_POINTER)
+    with open(f"{pointer_file}.tmp", 'w', encoding='utf-8') as f:
+        f.write(version_name)
+    os.replace(f"{pointer_file}.tmp", pointer_file)
+    
+    # 上一个版本可能刚被其他进程打开，保留到下次写入
+    previous_name = os.path.relpath(previous_dir, store_dir)
+    remove_old_versions(store_dir, {version_name, '' if previous_name == '.' else previous_name})
+    return meta
+
+
+def build_nav_store(data_source, store_dir, table_name='fund_nav_info', batch_funds=None):
+    """
+    从已保存的净值数据建立净值存储，按基金分批读取
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、DuckDB数据库文件或SQLite数据库名称
+        store_dir (str): 存储目录
+        table_name (str): 净值数据表名，默认为'fund_nav_info'
+        batch_funds (int): 每批读取的基金数，默认为None表示使用NAV_STORE_BATCH_FUNDS
+    
+    返回:
+        dict: 存储的元数据
+    """
+    backend = get_storage_backend(data_source)
+    columns = ['基金代码', '净值日期'] + list(NAV_STORE_COLUMNS)
+    
+    def read_batches():
+        # CSV每次筛选都要扫描整个文件，一次读取
+        if data_source.endswith('.csv'):
+            yield backend.read(table_name, columns=columns)
+            return
+        codes = sorted(backend.read_fund_codes(table_name))
+        batch_size = batch_funds or NAV_STORE_BATCH_FUNDS
+        for i in range(0, len(codes), batch_size):
+            yield backend.read(table_name, columns=columns, fund_codes=codes[i:i + batch_size])
+    
+    start_time = time.time()
+    meta = write_nav_store(read_batches(), store_dir)
+    print(f"净值存储已保存到: {store_dir}，共 {meta['funds']} 只基金、{meta['dates']} 个交易日、"
+          f"{meta['rows']} 条记录，耗时 {time.time() - start_time:.1f}s")
+    return meta
+
+
+def read_nav_source_counts(backend, table_name):
+    """
+    统计数据源中每只基金的净值日期数，能用SQL聚合的后端在后端中统计，否则只读取基金代码和净值日期两列
+    
+    参数:
+        backend (StorageBackend): 数据源的存储后端
+        table_name (str): 净值数据表名
+    
+    返回:
+        pandas.Series: 以基金代码为索引的不重复净值日期数
+    """
+    relation = backend.get_relation(table_name)
+    if relation is None:
+        df = backend.read(table_name, columns=['基金代码', '净值日期'])
+        df = df.assign(基金代码=df['基金代码'].astype(str), 净值日期=pd.to_datetime(df['净值日期'], errors='coerce'))
+        return df.dropna(subset=['净值日期']).groupby('基金代码')['净值日期'].nunique()
+    result = backend.query(f'SELECT "基金代码", COUNT(DISTINCT "净值日期") AS count FROM {relation} '
+                           f'WHERE "净值日期" IS NOT NULL GROUP BY "基金代码"')
+    return pd.Series(result['count'].to_numpy(), index=result['基金代码'].astype(str))
+
+
+def update_nav_store(data_source, store_dir, table_name='fund_nav_info', batch_funds=None):
+    """
+    将净值数据中新增的记录追加到已有的净值存储，存储不存在时整体建立
+    
+    从数据源读取存储最新日期前NAV_STORE_APPEND_LOOKBACK_DAYS天以来的记录，与存储中的记录相同时不写入。
+    每只基金在此范围之前的净值日期数与存储中的不同时（存储中没有的新基金、之后补抓了历史净值的基金、
+    最后一条净值早于此范围又有了新净值的基金），重新读取该基金的全部净值替换存储中的记录；
+    数据源中此范围之前的净值被修改但日期数不变时不会发现，需用build_nav_store整体重建。
+    
+    有新记录时存储中的数据与新记录按基金分批合并写入新版本，所有数组整体重写，耗时与存储的总记录数成正比，
+    但不再重新读取数据源中的历史净值
+    
+    参数:
+        data_source (str): 数据源，可以是CSV文件路径、Parquet文件或数据集路径、DuckDB数据库文件或SQLite数据库名称
+        store_dir (str): 存储目录
+        table_name (str): 净值数据表名，默认为'fund_nav_info'
+        batch_funds (int): 每批写入的基金数，默认为None表示使用NAV_STORE_BATCH_FUNDS
+    
+    返回:
+        dict: 存储的元数据
+    """
+    if not nav_store_exists(store_dir):
+        return build_nav_store(data_source, store_dir, table_name, batch_funds)
+    store = NavStore(store_dir)
+    if store.meta['end_date'] is None:
+        return build_nav_store(data_source, store_dir, table_name, batch_funds)
+    
+    start_time = time.time()
+    columns = ['基金代码', '净值日期'] + list(NAV_STORE_COLUMNS)
+    start_date = str((pd.Timestamp(store.meta['end_date']) - pd.Timedelta(days=NAV_STORE_APPEND_LOOKBACK_DAYS)).date())
+    new_rows = read_data(data_source, table_name, columns=columns, start_date=start_date, date_column='净值日期')
+    new_rows = new_rows.assign(基金代码=new_rows['基金代码'].astype(str),
+                               净值日期=pd.to_datetime(new_rows['净值日期'], errors='coerce'))
+    new_rows = new_rows.dropna(subset=['净值日期']).drop_duplicates(subset=['基金代码', '净值日期'], keep='last')
+    
+    # 每只基金在读取范围之前的日期数：数据源中的总数减去范围内的数量，与存储中范围之前的记录数比较
+    backend = get_storage_backend(data_source)
+    source_counts = read_nav_source_counts(backend, table_name)
+    before_source = source_counts.sub(new_rows.groupby('基金代码').size(), fill_value=0)
+    first_position = int(np.searchsorted(store.dates, np.datetime64(start_date)))
+    stored_codes = store.codes.tolist()
+    if stored_codes:
+        before_flags = (np.asarray(store.date_index) < first_position).astype(np.int64)
+        before_stored = pd.Series(np.add.reduceat(before_flags, np.asarray(store.offsets[:-1])), index=stored_codes)
+    else:
+        before_stored = pd.Series(dtype=np.int64)
+    before_stored = before_stored.reindex(before_source.index, fill_value=0)
+    full_codes = set(before_source.index[before_source.to_numpy() != before_stored.to_numpy()])
+    new_rows = new_rows[~new_rows['基金代码'].isin(full_codes)]
+    
+    # 与存储中同一范围的记录比较，只保留存储中没有或净值不同的记录
+    merged = new_rows.merge(store.to_frame(start_date=start_date, columns=columns), on=['基金代码', '净值日期'],
+                            how='left', suffixes=('', '_存储'), indicator=True)
+    changed = (merged['_merge'] == 'left_only').to_numpy(copy=True)
+    for column in NAV_STORE_COLUMNS:
+        if column in merged.columns and f"{column}_存储" in merged.columns:
+            values = pd.to_numeric(merged[column], errors='coerce')
+            stored = merged[f"{column}_存储"]
+            changed |= ~((values == stored) | (values.isna() & stored.isna())).to_numpy()
+    new_rows = new_rows[changed]
+    if new_rows.empty and not full_codes:
+        print(f"净值存储 {store_dir} 已是最新，无需更新")
+        return store.meta
+    
+    def read_batches():
+        codes = sorted(set(stored_codes) | set(new_rows['基金代码']) | full_codes)
+        batch_size = batch_funds or NAV_STORE_BATCH_FUNDS
+        for i in range(0, len(codes), batch_size):
+            batch = codes[i:i + batch_size]
+            full_batch = [code for code in batch if code in full_codes]
+            frames = [store.to_frame([code for code in batch if code not in full_codes], columns=columns),
+                      new_rows[new_rows['基金代码'].isin(batch)]]
+            if full_batch:
+                # 需要重新读取的基金以数据源中的全部净值替换存储中的记录
+                frames.append(backend.read(table_name, columns=columns, fund_codes=full_batch))
+            # 新记录放在后面，write_nav_store去重时保留新记录
+            yield pd.concat(frames, ignore_index=True)
+    
+    meta = write_nav_store(read_batches(), store_dir)
+    print(f"净值存储 {store_dir} 已追加 {len(new_rows)} 条记录，重新读取 {len(full_codes)} 只基金的全部净值，"
+          f"共 {meta['funds']} 只基金、{meta['rows']} 条记录，耗时 {time.time() - start_time:.1f}s")
+    return meta
+
+
+class NavStore:
+    """
+    只读的净值存储，各数组以内存映射方式打开，多个进程共享操作系统的页缓存
+    
+    参数:
+        store_dir (str): 存储目录
+    """
+    
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        # 打开时解析CURRENT，之后切换版本不影响已打开的存储
+        self.data_dir = get_nav_store_data_dir(store_dir)
+        with open(os.path.join(self.data_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != NAV_STORE_VERSION:
+            raise ValueError(f"净值存储 {store_dir} 的版本 {self.meta.get('version')} 与当前版本 {NAV_STORE_VERSION} 不兼容")
+        
+        self.dates = self._open('dates.bin', 'datetime64[D]', self.meta['dates'])
+        self.codes = self._open('codes.bin', self.meta['code_dtype'], self.meta['funds'])
+        self.offsets = self._open('offsets.bin', np.int64, self.meta['funds'] + 1)
+        self.date_index = self._open('date_index.bin', np.int32, self.meta['rows'])
+        self.values = {column: self._open(file_name, np.float64, self.meta['rows'])
+                       for column, file_name in self.meta['columns'].items()}
+        self.positions = {code: i for i, code in enumerate(self.codes.tolist())}
+    
+    def _open(self, file_name, dtype, length):
+        """以只读内存映射打开数组文件，空数组直接返回"""
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.data_dir, file_name), dtype=dtype, mode='r', shape=(length,))
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __contains__(self, fund_code):
+        return str(fund_code) in self.positions
+    
+    def get_range(self, fund_code, start_date=None, end_date=None):
+        """
+        获取单只基金的记录在数值数组中的位置
+        
+        参数:
+            fund_code (str): 基金代码
+            start_date (str): 开始日期，默认为None表示不限
+            end_date (str): 结束日期（包含），默认为None表示不限
+        
+        返回:
+            tuple: (开始位置, 结束位置)，基金不存在时为(0, 0)
+        """
+        position = self.positions.get(str(fund_code))
+        if position is None:
+            return 0, 0
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        if start_date or end_date:
+            # 同一基金的记录按日期升序存放，按交易日索引位置二分查找
+            first, last = self.get_date_positions(start_date, end_date)
+            fund_dates = self.date_index[start:end]
+            start, end = start + int(np.searchsorted(fund_dates, first)), start + int(np.searchsorted(fund_dates, last))
+        return start, end
+    
+    def get_date_positions(self, start_date=None, end_date=None):
+        """
+        获取日期范围在交易日索引中的位置
+        
+        返回:
+            tuple: (开始位置, 结束位置)，左闭右开
+        """
+        start, end = get_date_range(start_date, end_date)
+        first = int(np.searchsorted(self.dates, np.datetime64(start.date()))) if start is not None else 0
+        last = int(np.searchsorted(self.dates, np.datetime64(end.date()))) if end is not None else len(self.dates)
+        return first, last
+    
+    def get_series(self, fund_code, column='单位净值', start_date=None, end_date=None):
+        """
+        获取单只基金的净值序列，返回内存映射数组的视图，不复制数据
+        
+        参数:
+            fund_code (str): 基金代码
+            column (str): 净值列，'单位净值'或'累计净值'，默认为'单位净值'
+            start_date (str): 开始日期，默认为None表示不限
+            end_date (str): 结束日期（包含），默认为None表示不限
+        
+        返回:
+            numpy.ndarray: 按日期升序排列的净值，基金不存在时为空数组
+        """
+        start, end = self.get_range(fund_code, start_date, end_date)
+        return self.values[column][start:end]
+    
+    def get_dates(self, fund_code, start_date=None, end_date=None):
+        """
+        获取单只基金各条净值记录的日期
+        
+        返回:
+            numpy.ndarray: datetime64[D]数组，与get_series返回的净值一一对应
+        """
+        start, end = self.get_range(fund_code, start_date, end_date)
+        return self.dates[self.date_index[start:end]]
+    
+    def get_panel(self, fund_codes=None, column='单位净值', start_date=None, end_date=None):
+        """
+        获取多只基金的净值面板，行为交易日、列为基金，没有净值的日期为NaN
+        
+        参数:
+            fund_codes (list): 基金代码列表，默认为None表示全部基金；不存在的基金整列为NaN
+            column (str): 净值列，默认为'单位净值'
+            start_date (str): 开始日期，默认为None表示不限
+            end_date (str): 结束日期（包含），默认为None表示不限
+        
+        返回:
+            pandas.DataFrame: 以净值日期为索引、基金代码为列的数据
+        """
+        fund_codes = self.codes.tolist() if fund_codes is None else [str(code) for code in fund_codes]
+        first, last = self.get_date_positions(start_date, end_date)
+        panel = np.full((last - first, len(fund_codes)), np.nan)
+        values = self.values[column]
+        for j, fund_code in enumerate(fund_codes):
+            start, end = self.get_range(fund_code, start_date, end_date)
+            panel[self.date_index[start:end] - first, j] = values[start:end]
+        return pd.DataFrame(panel, index=pd.DatetimeIndex(self.dates[first:last], name='净值日期'), columns=fund_codes)
+    
+    def to_frame(self, fund_codes=None, start_date=None, end_date=None, columns=None):
+        """
+        将存储中的净值转换为与净值表相同的长表
+        
+        参数:
+            fund_codes (list): 基金代码列表，默认为None表示全部基金
+            start_date (str): 开始日期，默认为None表示不限
+            end_date (str): 结束日期（包含），默认为None表示不限
+            columns (list): 输出的列，默认为None表示'基金代码'、'净值日期'和全部净值列；不存在的列会被忽略
+        
+        返回:
+            pandas.DataFrame: 净值数据
+        """
+        fund_codes = self.codes.tolist() if fund_codes is None else [str(code) for code in fund_codes]
+        ranges = [(code, *self.get_range(code, start_date, end_date)) for code in fund_codes]
+        ranges = [(code, start, end) for code, start, end in ranges if end > start]
+        rows = np.concatenate([np.arange(start, end) for _, start, end in ranges]) if ranges else np.empty(0, dtype=np.int64)
+        
+        data = {
+            '基金代码': np.repeat([code for code, _, _ in ranges], [end - start for _, start, end in ranges]).astype(object),
+            '净值日期': self.dates[self.date_index[rows]].astype('datetime64[ns]'),
+        }
+        for column, values in self.values.items():
+            data[column] = values[rows]
+        all_columns = list(data)
+        columns = [column for column in columns if column in all_columns] if columns is not None else all_columns
+        return pd.DataFrame({column: data[column] for column in columns})
+
+
+class NavStoreBackend(StorageBackend):
+    """
+    净值存储的存储后端，使read_data和分析模块可以直接以净值存储目录作为数据源
+    
+    参数:
+        store_dir (str): 存储目录
+    """
+    
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._store = None
+    
+    @property
+    def store(self):
+        """第一次使用时打开存储"""
+        if self._store is None:
+            self._store = NavStore(self.store_dir)
+        return self._store
+    
+    def save(self, df, table_name):
+        write_nav_store([df], self.store_dir)
+        self._store = None
+    
+    def read(self, table_name, columns=None, fund_codes=None, start_date=None, end_date=None, date_column=None):
+        return self.store.to_frame(fund_codes, start_date, end_date, columns)
+    
+    def get_columns(self, table_name):
+        return ['基金代码', '净值日期'] + list(self.store.values)
+    
+    def read_fund_codes(self, table_name):
+        return self.store.codes.tolist()
+
+
+STORAGE_BACKENDS[NAV_STORE_EXTENSION] = NavStoreBackend
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+抓取优先级模块，按关注列表、业绩排名和数据新旧程度为基金打分，
+使抓取中断或受限速影响时最重要的基金先完成
+"""
+import os
+import pandas as pd
+
+# 各项得分的默认权重：关注列表中的基金总是最先抓取，其次综合业绩排名和数据陈旧程度
+DEFAULT_PRIORITY_WEIGHTS = {
+    'watchlist': 100.0,
+    'performance': 1.0,
+    'staleness': 1.0,
+}
+
+# 数据陈旧程度达到该天数时得分为满分
+STALENESS_HORIZON_DAYS = 30.0
+
+# 业绩排名数据中用于打分的列，按顺序取第一个存在的列；有基金规模时优先按规模
+PERFORMANCE_COLUMNS = ['基金规模', '近1年', '今年来', '成立来']
+
+
+def parse_priority_weights(text):
+    """
+    解析命令行中的优先级权重，如"watchlist=100,performance=2,staleness=0.5"
+    
+    参数:
+        text (str): 权重字符串，未出现的项使用默认权重
+    
+    返回:
+        dict: 各项得分的权重
+    """
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    if not text:
+        return weights
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"未知的优先级权重: {name}，可选: {', '.join(weights)}")
+        weights[name] = float(value)
+    return weights
+
+
+def load_watchlist(file_path):
+    """
+    读取关注列表文件，每行一个基金代码，也可用逗号分隔，#开头的行为注释
+    
+    参数:
+        file_path (str): 关注列表文件路径
+    
+    返回:
+        set: 基金代码集合，文件不存在时返回空集合
+    """
+    if not file_path or not os.path.exists(file_path):
+        return set()
+    codes = set()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            codes.update(code.strip().zfill(6) for code in line.split(',') if code.strip())
+    return codes
+
+
+def get_performance_scores(performance_df):
+    """
+    将业绩排名数据转换为0到1之间的百分位得分
+    
+    参数:
+        performance_df (pandas.DataFrame): 基金业绩排名数据，需包含'基金代码'列
+    
+    返回:
+        dict: 基金代码到得分的映射，数据不可用时返回空字典
+    """
+    if performance_df is None or performance_df.empty or '基金代码' not in performance_df.columns:
+        return {}
+    column = next((c for c in PERFORMANCE_COLUMNS if c in performance_df.columns), None)
+    if column is None:
+        return {}
+    values = pd.to_numeric(performance_df[column], errors='coerce')
+    scores = values.rank(pct=True).fillna(0.0)
+    return dict(zip(performance_df['基金代码'].astype(str).str.zfill(6), scores))
+
+
+def get_staleness_scores(last_updated, fund_codes, now):
+    """
+    按数据最后更新时间计算陈旧程度得分，从未获取过的基金为满分
+    
+    参数:
+        last_updated (dict): 基金代码到最后更新时间戳（秒）的映射
+        fund_codes (list): 基金代码列表
+        now (float): 当前时间戳（秒）
+    
+    返回:
+        dict: 基金代码到0到1之间得分的映射
+    """
+    horizon = STALENESS_HORIZON_DAYS * 86400
+    scores = {}
+    for code in fund_codes:
+        updated_at = last_updated.get(code)
+        scores[code] = 1.0 if updated_at is None else min(max(now - updated_at, 0.0) / horizon, 1.0)
+    return scores
+
+
+def compute_priority_scores(fund_codes, weights=None, watchlist=None, performance_scores=None, staleness_scores=None):
+    """
+    计算每只基金的抓取优先级得分
+    
+    参数:
+        fund_codes (list): 基金代码列表
+        weights (dict): 各项得分的权重，默认为None表示使用DEFAULT_PRIORITY_WEIGHTS
+        watchlist (set): 关注列表中的基金代码，默认为None
+        performance_scores (dict): 业绩百分位得分，默认为None
+        staleness_scores (dict): 数据陈旧程度得分，默认为None
+    
+    返回:
+        dict: 基金代码到优先级得分的映射
+    """
+    weights = weights or DEFAULT_PRIORITY_WEIGHTS
+    watchlist = watchlist or set()
+    performance_scores = performance_scores or {}
+    staleness_scores = staleness_scores or {}
+    return {
+        code: (weights.get('watchlist', 0.0) * (code in watchlist)
+               + weights.get('performance', 0.0) * performance_scores.get(code, 0.0)
+               + weights.get('staleness', 0.0) * staleness_scores.get(code, 0.0))
+        for code in fund_codes
+    }
+
+
+def order_by_priority(fund_codes, scores):
+    """
+    按优先级得分从高到低排列基金代码，得分相同时保持原有顺序
+    
+    参数:
+        fund_codes (list): 基金代码列表
+        scores (dict): 基金代码到优先级得分的映射
+    
+    返回:
+        list: 排序后的基金代码列表
+    """
+    return sorted(fund_codes, key=lambda code: -scores.get(code, 0.0))
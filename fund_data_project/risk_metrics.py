@@ -0,0 +1,768 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基金风险指标模块，基于净值面板（行为交易日、列为基金）用NumPy一次计算所有基金的
+年化收益率、年化波动率、夏普比率、索提诺比率、最大回撤及其起止日期和卡玛比率
+
+指标由每只基金每个区间的运行状态（收益率之和、平方和、下行平方和、区间最高净值和最大回撤）
+得出。状态保存在净值存储旁边，每天只需用新增的净值记录更新状态，并减去移出滚动区间的记录
+"""
+import os
+import json
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+# 计算区间：区间名称到 (英文标识, 年数)，年数为None表示成立以来
+RISK_WINDOWS = {
+    '近1年': ('1y', 1),
+    '近3年': ('3y', 3),
+    '近5年': ('5y', 5),
+    '成立来': ('inception', None),
+}
+
+# 年化使用的每年交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 年化无风险利率
+RISK_FREE_RATE = 0.02
+
+# 区间内有效收益率少于该数时不计算指标
+MIN_OBSERVATIONS = 20
+
+# 每批计算的基金数，控制净值面板占用的内存
+RISK_BATCH_FUNDS = 2000
+
+# 指数加权波动率的衰减系数（RiskMetrics取0.94）
+EWMA_DECAY = 0.94
+
+# 输出的指标列：中文列名到供智能体读取的英文键名，收益率、波动率和回撤均为小数
+RISK_METRIC_COLUMNS = {
+    '观测数': 'observations',
+    '年化收益率': 'annual_return',
+    '年化波动率': 'volatility',
+    '指数加权波动率': 'ewma_volatility',
+    '夏普比率': 'sharpe_ratio',
+    '索提诺比率': 'sortino_ratio',
+    '最大回撤': 'max_drawdown',
+    '回撤开始日期': 'max_drawdown_start',
+    '回撤结束日期': 'max_drawdown_end',
+    '回撤修复日期': 'recovery_date',
+    '卡玛比率': 'calmar_ratio',
+}
+
+# 风险指标状态文件的版本号，格式变化后旧状态作废并重新计算
+RISK_STATE_VERSION = 1
+
+# 风险指标状态文件的后缀，保存在净值存储目录旁边
+RISK_STATE_SUFFIX = '.risk_state.npz'
+
+# 每只基金的状态字段及其类型
+RISK_STATE_FUND_FIELDS = {
+    'use_unit': bool,                     # 没有累计净值，使用单位净值
+    'records': np.int64,                  # 截至状态日期净值存储中的记录数
+    'last_record_date': 'datetime64[D]',  # 最后一条记录的日期
+    'last_price': np.float64,             # 最近一条有效净值
+    'last_date': 'datetime64[D]',         # 最近一条有效净值的日期
+    'ewma_var': np.float64,               # 日收益率平方的指数加权平均
+}
+
+# 每只基金每个区间的状态字段及其类型，数组形状为 (区间数, 基金数)
+RISK_STATE_WINDOW_FIELDS = {
+    'observations': np.int64,             # 区间内有效收益率个数
+    'sum_returns': np.float64,            # 收益率之和
+    'sum_squares': np.float64,            # 收益率平方和
+    'sum_downside': np.float64,           # 收益率低于无风险收益率部分的平方和
+    'base_price': np.float64,             # 区间起点净值
+    'base_date': 'datetime64[D]',         # 区间起点日期
+    'window_row': np.int64,               # 区间内第一条记录在该基金记录中的序号
+    'peak_value': np.float64,             # 区间内的最高净值
+    'peak_date': 'datetime64[D]',         # 最后一次达到最高净值的日期
+    'max_drawdown': np.float64,           # 最大回撤
+    'drawdown_peak': np.float64,          # 最大回撤开始时的净值
+    'drawdown_start': 'datetime64[D]',    # 最大回撤开始日期
+    'drawdown_end': 'datetime64[D]',      # 最大回撤结束日期
+    'recovery_date': 'datetime64[D]',     # 回撤修复日期
+}
+
+NAT = np.datetime64('NaT', 'D')
+
+
+def forward_fill(values):
+    """
+    沿交易日方向向前填充NaN，每只基金第一条净值之前仍为NaN
+    
+    参数:
+        values (numpy.ndarray): 二维数组，行为交易日、列为基金
+    
+    返回:
+        tuple: (填充后的数组, 每个位置对应的最近一条有效记录的行号)
+    """
+    rows = np.arange(values.shape[0])[:, None]
+    last_valid = np.maximum.accumulate(np.where(np.isnan(values), 0, rows), axis=0)
+    return np.take_along_axis(values, last_valid, axis=0), last_valid
+
+
+def get_returns(prices, filled=None):
+    """
+    计算日收益率：每个有净值的交易日相对于上一条有效净值的收益率，
+    缺失净值的交易日为NaN，不当作收益率为0，也不向后传播
+    
+    参数:
+        prices (numpy.ndarray): 二维净值数组，行为交易日、列为基金
+        filled (numpy.ndarray): 向前填充后的净值，默认为None表示在函数内计算
+    
+    返回:
+        numpy.ndarray: 与prices形状相同的收益率数组，第一行为NaN
+    """
+    if filled is None:
+        filled, _ = forward_fill(prices)
+    returns = np.full(prices.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = prices[1:] / filled[:-1] - 1.0
+    return returns
+
+
+def get_window_start(dates, as_of, years):
+    """
+    获取计算区间第一行的行号
+    
+    参数:
+        dates (numpy.ndarray): 交易日，datetime64[D]
+        as_of (numpy.datetime64): 区间结束日期
+        years (int): 区间年数，None表示成立以来
+    
+    返回:
+        int: 行号
+    """
+    if years is None:
+        return 0
+    start = (pd.Timestamp(as_of) - pd.DateOffset(years=int(years))).to_datetime64().astype('datetime64[D]')
+    return int(np.searchsorted(dates, start))
+
+
+def get_daily_risk_free(risk_free_rate):
+    """将年化无风险利率换算为日收益率"""
+    return (1.0 + risk_free_rate) ** (1.0 / TRADING_DAYS_PER_YEAR) - 1.0
+
+
+def new_risk_state(fund_codes, windows=None, risk_free_rate=None):
+    """
+    创建空的风险指标状态
+    
+    参数:
+        fund_codes (list): 基金代码列表
+        windows (dict): 计算区间，默认为None表示使用RISK_WINDOWS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        dict: 字段名到numpy数组的映射
+    """
+    windows = windows or RISK_WINDOWS
+    fund_codes = np.asarray([str(code) for code in fund_codes], dtype=str)
+    state = {
+        'version': np.int64(RISK_STATE_VERSION),
+        'as_of': NAT,
+        'risk_free_rate': np.float64(RISK_FREE_RATE if risk_free_rate is None else risk_free_rate),
+        'window_names': np.asarray(list(windows), dtype=str),
+        'window_keys': np.asarray([key for key, _ in windows.values()], dtype=str),
+        'window_years': np.asarray([np.nan if years is None else years for _, years in windows.values()],
+                                   dtype=np.float64),
+        'start_dates': np.full(len(windows), NAT),
+        'codes': fund_codes,
+    }
+    fields = [(RISK_STATE_FUND_FIELDS, len(fund_codes)), (RISK_STATE_WINDOW_FIELDS, (len(windows), len(fund_codes)))]
+    for field_types, shape in fields:
+        for field, dtype in field_types.items():
+            dtype = np.dtype(dtype)
+            fill_value = {'f': np.nan, 'M': NAT, 'b': False}.get(dtype.kind, 0)
+            state[field] = np.full(shape, fill_value, dtype=dtype)
+    return state
+
+
+def get_state_windows(state):
+    """从状态中还原计算区间，格式同RISK_WINDOWS"""
+    return {str(name): (str(key), None if np.isnan(years) else int(years))
+            for name, key, years in zip(state['window_names'], state['window_keys'], state['window_years'])}
+
+
+def concat_risk_states(states):
+    """按基金拼接多个区间和结束日期相同的风险指标状态"""
+    state = dict(states[0])
+    state['codes'] = np.concatenate([item['codes'] for item in states])
+    for field in RISK_STATE_FUND_FIELDS:
+        state[field] = np.concatenate([item[field] for item in states])
+    for field in RISK_STATE_WINDOW_FIELDS:
+        state[field] = np.concatenate([item[field] for item in states], axis=1)
+    return state
+
+
+def set_drawdown_state(state, window, filled, valid, dates):
+    """
+    在一个区间的向前填充净值上计算最高净值和最大回撤，写入状态
+    
+    参数:
+        state (dict): 风险指标状态
+        window (int): 区间序号
+        filled (numpy.ndarray): 区间起点开始的向前填充净值，行为交易日、列为基金
+        valid (numpy.ndarray): 各位置是否为实际净值，向前填充出的位置不作为峰值日期
+        dates (numpy.ndarray): 与filled各行对应的交易日
+    """
+    columns = np.arange(filled.shape[1])
+    rows = np.arange(filled.shape[0])[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        running_max = np.fmax.accumulate(filled, axis=0)
+        drawdown = filled / running_max - 1.0
+    # 峰值取回撤最低点之前最后一次创新高的日期
+    trough = np.argmin(np.where(np.isnan(drawdown), np.inf, drawdown), axis=0)
+    max_drawdown = np.maximum(-drawdown[trough, columns], 0.0)
+    last_high = np.maximum.accumulate(np.where(valid & (filled >= running_max), rows, -1), axis=0)
+    recovered = (filled >= running_max[trough, columns]) & (rows > trough)
+    recovery = np.where(recovered.any(axis=0), np.argmax(recovered, axis=0), -1)
+    has_drawdown = max_drawdown > 0
+    
+    def to_dates(positions, condition=True):
+        return np.where(condition & (positions >= 0), dates[np.maximum(positions, 0)], NAT)
+    
+    state['peak_value'][window] = running_max[-1]
+    state['peak_date'][window] = to_dates(last_high[-1])
+    state['max_drawdown'][window] = max_drawdown
+    state['drawdown_peak'][window] = np.where(has_drawdown, running_max[trough, columns], np.nan)
+    state['drawdown_start'][window] = to_dates(last_high[trough, columns], has_drawdown)
+    state['drawdown_end'][window] = to_dates(trough, has_drawdown)
+    state['recovery_date'][window] = to_dates(recovery, has_drawdown)
+
+
+def build_panel_state(panel, windows=None, risk_free_rate=None):
+    """
+    在净值面板上计算所有基金各区间的风险指标状态；向前填充和收益率对整个面板只计算一次，各区间取其中的一段
+    
+    参数:
+        panel (pandas.DataFrame): 净值面板，以交易日为索引、基金代码为列，缺失为NaN
+        windows (dict): 计算区间，默认为None表示使用RISK_WINDOWS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        dict: 风险指标状态，不含净值存储中的记录位置
+    """
+    state = new_risk_state(panel.columns, windows, risk_free_rate)
+    if panel.empty:
+        return state
+    
+    dates = panel.index.values.astype('datetime64[D]')
+    prices = panel.to_numpy(dtype=np.float64)
+    filled, last_valid = forward_fill(prices)
+    returns = get_returns(prices, filled)
+    valid = ~np.isnan(prices)
+    has_data = valid.any(axis=0)
+    columns = np.arange(prices.shape[1])
+    first_row = np.argmax(valid, axis=0)
+    daily_risk_free = get_daily_risk_free(float(state['risk_free_rate']))
+    
+    state['as_of'] = dates[-1]
+    state['last_price'] = filled[-1]
+    state['last_date'] = np.where(has_data, dates[last_valid[-1]], NAT)
+    squares = pd.DataFrame(returns * returns)
+    state['ewma_var'] = squares.ewm(alpha=1.0 - EWMA_DECAY, adjust=False, ignore_na=True).mean().to_numpy()[-1]
+    
+    for window, (_, years) in enumerate(get_state_windows(state).values()):
+        if years is None:
+            base_row = 0
+            base_price = np.where(has_data, prices[first_row, columns], np.nan)
+            base_date = np.where(has_data, dates[first_row], NAT)
+            window_returns = returns
+            window_valid = valid
+        else:
+            # 以区间开始前最近一条净值作为起点，区间开始后才成立的基金没有起点
+            start_row = get_window_start(dates, dates[-1], years)
+            state['start_dates'][window] = dates[start_row]
+            base_row = max(start_row - 1, 0)
+            base_price = filled[base_row] if start_row > 0 else np.full(len(columns), np.nan)
+            base_date = np.where(np.isnan(base_price), NAT, dates[base_row])
+            window_returns = returns[start_row:]
+            window_valid = valid[base_row:].copy()
+            window_valid[0] |= ~np.isnan(base_price)
+        
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            downside = np.minimum(window_returns - daily_risk_free, 0.0)
+            state['observations'][window] = np.sum(~np.isnan(window_returns), axis=0)
+            state['sum_returns'][window] = np.nansum(window_returns, axis=0)
+            state['sum_squares'][window] = np.nansum(window_returns * window_returns, axis=0)
+            state['sum_downside'][window] = np.nansum(downside * downside, axis=0)
+        state['base_price'][window] = base_price
+        state['base_date'][window] = base_date
+        set_drawdown_state(state, window, filled[base_row:], window_valid, dates[base_row:])
+    return state
+
+
+def get_risk_metrics(state):
+    """
+    由风险指标状态得出各基金各区间的指标
+    
+    参数:
+        state (dict): 风险指标状态
+    
+    返回:
+        pandas.DataFrame: 每只基金每个区间一行，包含基金代码、区间、开始日期、结束日期和各项指标
+    """
+    risk_free_rate = float(state['risk_free_rate'])
+    daily_risk_free = get_daily_risk_free(risk_free_rate)
+    frames = []
+    for window, (window_name, (_, years)) in enumerate(get_state_windows(state).items()):
+        observations = state['observations'][window]
+        base_price = state['base_price'][window]
+        max_drawdown = state['max_drawdown'][window]
+        eligible = (observations >= MIN_OBSERVATIONS) & ~np.isnan(base_price)
+        
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # 年化收益率按首尾净值和日历天数计算，不受缺失交易日影响
+            growth = state['last_price'] / base_price
+            span = (state['last_date'] - state['base_date'][window]).astype(np.int64) / 365.25
+            annual_return = np.where(span > 0, np.power(growth, 1.0 / np.where(span > 0, span, 1.0)) - 1.0, np.nan)
+            
+            # 方差和下行偏差由收益率之和及平方和得出，与逐日计算的结果相同
+            mean = state['sum_returns'][window] / observations
+            variance = np.maximum(state['sum_squares'][window] - state['sum_returns'][window] * mean, 0.0)
+            volatility = np.sqrt(variance / (observations - 1) * TRADING_DAYS_PER_YEAR)
+            downside_deviation = np.sqrt(state['sum_downside'][window] / observations * TRADING_DAYS_PER_YEAR)
+            ewma_volatility = np.sqrt(state['ewma_var'] * TRADING_DAYS_PER_YEAR)
+            excess_return = annual_return - risk_free_rate
+            sharpe_ratio = np.where(volatility > 0, excess_return / volatility, np.nan)
+            sortino_ratio = np.where(downside_deviation > 0, excess_return / downside_deviation, np.nan)
+            calmar_ratio = np.where(max_drawdown > 0, annual_return / max_drawdown, np.nan)
+        
+        frame = pd.DataFrame({
+            '基金代码': state['codes'],
+            '区间': window_name,
+            '开始日期': state['base_date'][window] if years is None else state['start_dates'][window],
+            '结束日期': state['as_of'],
+            '观测数': observations,
+            '年化收益率': annual_return,
+            '年化波动率': volatility,
+            '指数加权波动率': ewma_volatility,
+            '夏普比率': sharpe_ratio,
+            '索提诺比率': sortino_ratio,
+            '最大回撤': max_drawdown,
+            '回撤开始日期': state['drawdown_start'][window],
+            '回撤结束日期': state['drawdown_end'][window],
+            '回撤修复日期': state['recovery_date'][window],
+            '卡玛比率': calmar_ratio,
+        })
+        frames.append(frame[eligible])
+    
+    result = pd.concat(frames, ignore_index=True)
+    for column in ['开始日期', '结束日期', '回撤开始日期', '回撤结束日期', '回撤修复日期']:
+        result[column] = pd.to_datetime(result[column]).dt.date
+    return result
+
+
+def compute_risk_metrics(panel, as_of=None, windows=None, risk_free_rate=None):
+    """
+    计算净值面板中所有基金在各区间的风险指标
+    
+    参数:
+        panel (pandas.DataFrame): 净值面板，以交易日为索引、基金代码为列，缺失为NaN；
+                                  应使用累计净值，分红不会被当作下跌
+        as_of (str): 区间结束日期，默认为None表示面板中的最后一个交易日
+        windows (dict): 计算区间，默认为None表示使用RISK_WINDOWS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        pandas.DataFrame: 每只基金每个区间一行，包含基金代码、区间、开始日期、结束日期和各项指标
+    """
+    if as_of is not None:
+        dates = panel.index.values.astype('datetime64[D]')
+        end_row = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(as_of).date()), side='right'))
+        panel = panel.iloc[:end_row]
+    if panel.empty:
+        return pd.DataFrame(columns=['基金代码', '区间', '开始日期', '结束日期'] + list(RISK_METRIC_COLUMNS))
+    return get_risk_metrics(build_panel_state(panel, windows, risk_free_rate))
+
+
+def get_store_panel(store, fund_codes):
+    """
+    从净值存储中取出净值面板：有累计净值的基金使用累计净值，否则使用单位净值
+    
+    参数:
+        store (nav_store.NavStore): 净值存储
+        fund_codes (list): 基金代码列表
+    
+    返回:
+        tuple: (以交易日为索引、基金代码为列的净值面板, 各基金是否使用单位净值的布尔数组)
+    """
+    panel = store.get_panel(fund_codes, column='累计净值')
+    use_unit = panel.isna().all().to_numpy()
+    if use_unit.any():
+        panel[panel.columns[use_unit]] = store.get_panel(list(panel.columns[use_unit]), column='单位净值')
+    return panel, use_unit
+
+
+def init_risk_state(store, fund_codes=None, batch_funds=None, windows=None, risk_free_rate=None):
+    """
+    按批从净值存储计算风险指标状态，并记录每只基金在存储中的记录数和各区间第一条记录的序号
+    
+    参数:
+        store (nav_store.NavStore): 净值存储
+        fund_codes (list): 基金代码列表，默认为None表示全部基金
+        batch_funds (int): 每批计算的基金数，默认为None表示使用RISK_BATCH_FUNDS
+        windows (dict): 计算区间，默认为None表示使用RISK_WINDOWS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        dict: 风险指标状态
+    """
+    fund_codes = store.codes.tolist() if fund_codes is None else [str(code) for code in fund_codes]
+    batch_size = batch_funds or RISK_BATCH_FUNDS
+    states = []
+    for i in range(0, len(fund_codes), batch_size):
+        panel, use_unit = get_store_panel(store, fund_codes[i:i + batch_size])
+        batch_state = build_panel_state(panel, windows, risk_free_rate)
+        batch_state['use_unit'] = use_unit
+        states.append(batch_state)
+    if not states:
+        return new_risk_state([], windows, risk_free_rate)
+    state = concat_risk_states(states)
+    
+    positions = np.asarray([store.positions[code] for code in fund_codes], dtype=np.int64)
+    starts, ends = store.offsets[positions], store.offsets[positions + 1]
+    state['records'] = ends - starts
+    state['last_record_date'] = store.dates[store.date_index[np.maximum(ends - 1, 0)]]
+    for window, start_date in enumerate(state['start_dates']):
+        if not np.isnat(start_date):
+            start_position = np.searchsorted(store.dates, start_date)
+            state['window_row'][window] = [np.searchsorted(store.date_index[start:end], start_position)
+                                           for start, end in zip(starts, ends)]
+    return state
+
+
+def apply_new_prices(state, funds, prices, dates, daily_risk_free):
+    """
+    将每只基金的一条新增有效净值计入所有区间的状态
+    
+    参数:
+        state (dict): 风险指标状态
+        funds (numpy.ndarray): 基金在状态中的序号，不重复
+        prices (numpy.ndarray): 新增净值
+        dates (numpy.ndarray): 新增净值的日期
+        daily_risk_free (float): 日无风险收益率
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = prices / state['last_price'][funds] - 1.0
+    has_return = ~np.isnan(returns)
+    return_funds, returns = funds[has_return], returns[has_return]
+    downside = np.minimum(returns - daily_risk_free, 0.0)
+    state['observations'][:, return_funds] += 1
+    state['sum_returns'][:, return_funds] += returns
+    state['sum_squares'][:, return_funds] += returns * returns
+    state['sum_downside'][:, return_funds] += downside * downside
+    ewma_var = state['ewma_var'][return_funds]
+    state['ewma_var'][return_funds] = np.where(np.isnan(ewma_var), returns * returns,
+                                               EWMA_DECAY * ewma_var + (1.0 - EWMA_DECAY) * returns * returns)
+    
+    # 成立以来区间以第一条有效净值为起点
+    for window, years in enumerate(state['window_years']):
+        if np.isnan(years):
+            first = np.isnan(state['base_price'][window, funds])
+            state['base_price'][window, funds[first]] = prices[first]
+            state['base_date'][window, funds[first]] = dates[first]
+    
+    # 新净值不低于区间最高净值时更新峰值，回撤超过原最大回撤时更新最大回撤并清除修复日期
+    peak = state['peak_value'][:, funds]
+    new_high = np.isnan(peak) | (prices >= peak)
+    peak = np.where(new_high, prices, peak)
+    peak_date = np.where(new_high, dates, state['peak_date'][:, funds])
+    drawdown = 1.0 - prices / peak
+    max_drawdown = np.nan_to_num(state['max_drawdown'][:, funds])
+    deeper = drawdown > max_drawdown
+    recovered = ~deeper & (max_drawdown > 0) & np.isnat(state['recovery_date'][:, funds]) & \
+        (prices >= state['drawdown_peak'][:, funds])
+    state['peak_value'][:, funds] = peak
+    state['peak_date'][:, funds] = peak_date
+    state['max_drawdown'][:, funds] = np.where(deeper, drawdown, max_drawdown)
+    state['drawdown_peak'][:, funds] = np.where(deeper, peak, state['drawdown_peak'][:, funds])
+    state['drawdown_start'][:, funds] = np.where(deeper, peak_date, state['drawdown_start'][:, funds])
+    state['drawdown_end'][:, funds] = np.where(deeper, dates, state['drawdown_end'][:, funds])
+    state['recovery_date'][:, funds] = np.where(deeper, NAT, np.where(recovered, dates,
+                                                                       state['recovery_date'][:, funds]))
+    state['last_price'][funds] = prices
+    state['last_date'][funds] = dates
+
+
+def refresh_window_drawdown(state, store, window, funds, start_row, batch_funds=None):
+    """
+    从净值存储中取出区间起点之后的净值，重新计算部分基金在一个滚动区间内的最高净值和最大回撤
+    
+    参数:
+        state (dict): 风险指标状态，区间起点净值已更新
+        store (nav_store.NavStore): 净值存储
+        window (int): 区间序号
+        funds (numpy.ndarray): 基金在状态中的序号
+        start_row (int): 区间第一个交易日在净值存储交易日索引中的位置，大于0
+        batch_funds (int): 每批计算的基金数，默认为None表示使用RISK_BATCH_FUNDS
+    """
+    batch_size = batch_funds or RISK_BATCH_FUNDS
+    base_date = str(store.dates[start_row - 1])
+    for i in range(0, len(funds), batch_size):
+        batch = funds[i:i + batch_size]
+        codes = state['codes'][batch].tolist()
+        use_unit = state['use_unit'][batch]
+        prices = store.get_panel(codes, column='累计净值', start_date=base_date).to_numpy(copy=True)
+        if use_unit.any():
+            unit_codes = [code for code, unit in zip(codes, use_unit) if unit]
+            prices[:, use_unit] = store.get_panel(unit_codes, column='单位净值', start_date=base_date).to_numpy()
+        # 起点位置取向前填充到区间开始前的净值，与全量计算一致
+        valid = ~np.isnan(prices)
+        prices[0] = state['base_price'][window, batch]
+        valid[0] |= ~np.isnan(prices[0])
+        filled, _ = forward_fill(prices)
+        batch_state = new_risk_state(codes, get_state_windows(state), float(state['risk_free_rate']))
+        set_drawdown_state(batch_state, window, filled, valid, store.dates[start_row - 1:])
+        for field in ['peak_value', 'peak_date', 'max_drawdown', 'drawdown_peak', 'drawdown_start', 'drawdown_end',
+                      'recovery_date']:
+            state[field][window, batch] = batch_state[field][window]
+
+
+def update_risk_state(state, store, batch_funds=None):
+    """
+    用净值存储中新增的记录增量更新风险指标状态：每只基金只读取上次状态日期之后的记录，
+    各滚动区间减去移出区间的记录。区间最高净值或最大回撤的开始日期移出滚动区间时只重新计算该区间的回撤；
+    新基金和上次状态日期之前的记录有变化的基金从完整净值重新计算
+    
+    参数:
+        state (dict): 上次的风险指标状态
+        store (nav_store.NavStore): 净值存储
+        batch_funds (int): 重新计算时每批的基金数，默认为None表示使用RISK_BATCH_FUNDS
+    
+    返回:
+        dict: 更新后的风险指标状态
+    """
+    windows = get_state_windows(state)
+    risk_free_rate = float(state['risk_free_rate'])
+    as_of, old_as_of = store.dates[-1], state['as_of']
+    window_years = [years for _, years in windows.values()]
+    start_rows = [get_window_start(store.dates, as_of, years) for years in window_years]
+    start_dates = [NAT if years is None else store.dates[row] for row, years in zip(start_rows, window_years)]
+    rolling = [window for window, years in enumerate(window_years) if years is not None]
+    if np.isnat(old_as_of) or as_of < old_as_of or any(start_dates[window] > old_as_of for window in rolling):
+        # 距上次更新超过一个滚动区间时无法增量更新
+        return init_risk_state(store, batch_funds=batch_funds, windows=windows, risk_free_rate=risk_free_rate)
+    
+    codes = store.codes.tolist()
+    new_state = new_risk_state(codes, windows, risk_free_rate)
+    new_state['as_of'] = as_of
+    new_state['start_dates'][:] = start_dates
+    old_positions = {code: i for i, code in enumerate(state['codes'].tolist())}
+    source = np.asarray([old_positions.get(code, -1) for code in codes], dtype=np.int64)
+    matched = source >= 0
+    for field in RISK_STATE_FUND_FIELDS:
+        new_state[field][matched] = state[field][source[matched]]
+    for field in RISK_STATE_WINDOW_FIELDS:
+        new_state[field][:, matched] = state[field][:, source[matched]]
+    
+    # 截至上次状态日期的记录条数、最后一条的日期和净值都不变的基金才能增量更新
+    fund_start, fund_rows = store.offsets[:-1], np.diff(store.offsets)
+    records, use_unit = new_state['records'], new_state['use_unit']
+    acc_nav, unit_nav = store.values['累计净值'], store.values['单位净值']
+    
+    def get_values(rows, funds):
+        return np.where(use_unit[funds], unit_nav[rows], acc_nav[rows])
+    
+    def get_dates(rows):
+        return store.dates[store.date_index[rows]]
+    
+    funds = np.arange(len(codes))
+    incremental = matched & (records > 0) & (records <= fund_rows)
+    last_rows = fund_start + np.where(incremental, records - 1, 0)
+    next_rows = np.minimum(fund_start + records, len(store.date_index) - 1)
+    last_values = get_values(last_rows, funds)
+    incremental &= get_dates(last_rows) == new_state['last_record_date']
+    incremental &= np.isnan(last_values) | (last_values == new_state['last_price'])
+    incremental &= (records == fund_rows) | (get_dates(next_rows) > old_as_of)
+    
+    # 按新增记录的顺序逐条计入，每一步同时处理所有还有新增记录的基金
+    daily_risk_free = get_daily_risk_free(risk_free_rate)
+    new_rows = np.where(incremental, fund_rows - records, 0)
+    for step in range(int(new_rows.max()) if len(new_rows) else 0):
+        step_funds = funds[new_rows > step]
+        rows = fund_start[step_funds] + records[step_funds] + step
+        prices = get_values(rows, step_funds)
+        keep = ~np.isnan(prices)
+        apply_new_prices(new_state, step_funds[keep], prices[keep], get_dates(rows[keep]), daily_risk_free)
+    records[incremental] = fund_rows[incremental]
+    new_state['last_record_date'][incremental] = get_dates(fund_start[incremental] + fund_rows[incremental] - 1)
+    
+    # 滚动区间的开始日期后移时，逐条减去移出区间的记录，并以最后一条移出的净值作为新的起点
+    refresh = ~incremental
+    drawdown_windows = 0
+    for window in rolling:
+        start_date, old_start_date = start_dates[window], state['start_dates'][window]
+        window_row, base_price = new_state['window_row'][window], new_state['base_price'][window]
+        leaving = funds[incremental]
+        while len(leaving):
+            leaving = leaving[window_row[leaving] < fund_rows[leaving]]
+            rows = fund_start[leaving] + window_row[leaving]
+            inside = get_dates(rows) < start_date
+            leaving, rows = leaving[inside], rows[inside]
+            prices = get_values(rows, leaving)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = prices / base_price[leaving] - 1.0
+            has_return = ~np.isnan(returns)
+            return_funds, returns = leaving[has_return], returns[has_return]
+            downside = np.minimum(returns - daily_risk_free, 0.0)
+            new_state['observations'][window, return_funds] -= 1
+            new_state['sum_returns'][window, return_funds] -= returns
+            new_state['sum_squares'][window, return_funds] -= returns * returns
+            new_state['sum_downside'][window, return_funds] -= downside * downside
+            base_price[leaving[~np.isnan(prices)]] = prices[~np.isnan(prices)]
+            window_row[leaving] += 1
+        base_date = store.dates[start_rows[window] - 1] if start_rows[window] > 0 else NAT
+        new_state['base_date'][window] = np.where(np.isnan(base_price), NAT, base_date)
+        
+        # 最高净值或最大回撤的开始日期移出区间后，无法只凭状态得出新区间的回撤，对这些基金重新计算该区间的回撤
+        if start_date > old_start_date:
+            drawdown_left = (new_state['max_drawdown'][window] > 0) & \
+                (new_state['drawdown_start'][window] < start_date)
+            peak_left = incremental & ((new_state['peak_date'][window] < start_date) | drawdown_left)
+            refresh_window_drawdown(new_state, store, window, funds[peak_left], start_rows[window], batch_funds)
+            drawdown_windows += int(peak_left.sum())
+    
+    refresh_funds = funds[refresh]
+    if len(refresh_funds):
+        refreshed = init_risk_state(store, [codes[i] for i in refresh_funds], batch_funds, windows, risk_free_rate)
+        for field in RISK_STATE_FUND_FIELDS:
+            new_state[field][refresh_funds] = refreshed[field]
+        for field in RISK_STATE_WINDOW_FIELDS:
+            new_state[field][:, refresh_funds] = refreshed[field]
+    print(f"风险指标状态增量更新：{len(codes) - len(refresh_funds)} 只基金增量更新，"
+          f"其中 {drawdown_windows} 个基金区间重新计算回撤；{len(refresh_funds)} 只基金重新计算")
+    return new_state
+
+
+def get_risk_state_file(store_dir):
+    """获取净值存储对应的风险指标状态文件路径"""
+    return os.path.normpath(store_dir) + RISK_STATE_SUFFIX
+
+
+def save_risk_state(state, file_path):
+    """
+    保存风险指标状态，先写临时文件再替换
+    
+    参数:
+        state (dict): 风险指标状态
+        file_path (str): 状态文件路径
+    """
+    tmp_file = f"{file_path}.tmp"
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, **state)
+    os.replace(tmp_file, file_path)
+
+
+def load_risk_state(file_path):
+    """
+    读取风险指标状态
+    
+    参数:
+        file_path (str): 状态文件路径
+    
+    返回:
+        dict: 风险指标状态，文件不存在、损坏或版本不一致时返回None
+    """
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with np.load(file_path) as data:
+            state = {key: data[key] for key in data.files}
+    except (OSError, ValueError) as e:
+        print(f"读取风险指标状态 {file_path} 失败，将重新计算: {e}")
+        return None
+    if int(state.get('version', -1)) != RISK_STATE_VERSION:
+        return None
+    return state
+
+
+def refresh_risk_state(store, state_file, batch_funds=None, risk_free_rate=None):
+    """
+    读取上次保存的风险指标状态并用净值存储增量更新，没有可用状态或计算参数变化时全部重新计算，然后保存状态
+    
+    参数:
+        store (nav_store.NavStore): 净值存储
+        state_file (str): 状态文件路径
+        batch_funds (int): 每批计算的基金数，默认为None表示使用RISK_BATCH_FUNDS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        dict: 更新后的风险指标状态
+    """
+    risk_free_rate = RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+    start_time = time.time()
+    state = load_risk_state(state_file)
+    if state is not None and (get_state_windows(state) != RISK_WINDOWS
+                              or float(state['risk_free_rate']) != risk_free_rate):
+        state = None
+    if state is None:
+        state = init_risk_state(store, batch_funds=batch_funds, risk_free_rate=risk_free_rate)
+    else:
+        state = update_risk_state(state, store, batch_funds)
+    save_risk_state(state, state_file)
+    print(f"风险指标状态已保存到: {state_file}，共 {len(state['codes'])} 只基金，耗时 {time.time() - start_time:.1f}s")
+    return state
+
+
+def compute_store_risk_metrics(store, fund_codes=None, batch_funds=None, risk_free_rate=None):
+    """
+    按批计算净值存储中所有基金的风险指标，各批使用相同的区间结束日期
+    
+    参数:
+        store (nav_store.NavStore): 净值存储
+        fund_codes (list): 基金代码列表，默认为None表示全部基金
+        batch_funds (int): 每批计算的基金数，默认为None表示使用RISK_BATCH_FUNDS
+        risk_free_rate (float): 年化无风险利率，默认为None表示使用RISK_FREE_RATE
+    
+    返回:
+        pandas.DataFrame: 风险指标，格式同compute_risk_metrics
+    """
+    start_time = time.time()
+    state = init_risk_state(store, fund_codes, batch_funds, risk_free_rate=risk_free_rate)
+    result = get_risk_metrics(state)
+    print(f"风险指标计算完成，共 {len(state['codes'])} 只基金、{len(result)} 条记录，耗时 {time.time() - start_time:.1f}s")
+    return result
+
+
+def save_risk_metrics_json(metrics_df, file_path, risk_free_rate=None):
+    """
+    将风险指标保存为供智能体读取的JSON文件，先写临时文件再替换
+    
+    参数:
+        metrics_df (pandas.DataFrame): compute_risk_metrics返回的风险指标
+        file_path (str): JSON文件路径
+        risk_free_rate (float): 计算时使用的年化无风险利率，默认为None表示RISK_FREE_RATE
+    """
+    window_keys = {name: key for name, (key, _) in RISK_WINDOWS.items()}
+    funds = {}
+    for values in metrics_df.to_dict('records'):
+        metrics = {'start_date': str(values['开始日期']), 'end_date': str(values['结束日期'])}
+        for column, key in RISK_METRIC_COLUMNS.items():
+            value = values[column]
+            if pd.isna(value):
+                metrics[key] = None
+            elif isinstance(value, (np.integer, int)):
+                metrics[key] = int(value)
+            elif isinstance(value, (np.floating, float)):
+                metrics[key] = round(float(value), 6)
+            else:
+                metrics[key] = str(value)
+        funds.setdefault(str(values['基金代码']), {})[window_keys.get(values['区间'], values['区间'])] = metrics
+    
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_file = f"{file_path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'as_of': str(metrics_df['结束日期'].max()) if not metrics_df.empty else None,
+            'risk_free_rate': RISK_FREE_RATE if risk_free_rate is None else risk_free_rate,
+            'last_update': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'funds': funds,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_file, file_path)
+    print(f"风险指标已保存到: {file_path}")
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分布式任务队列模块，多台机器通过共享存储上的SQLite文件分配同一批基金的抓取任务
+每个工作进程按批领取基金代码并获得有时限的租约，处理期间定期续租，
+处理完成后标记完成，失败时释放租约，进程异常退出时租约到期后由其他进程重新领取
+各进程共用的抓取状态（如内容哈希和净值高水位）也按键保存在队列中，每个进程只写入自己更新过的键
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# 默认租约时长（秒）和每批领取的基金数
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_BATCH_SIZE = 20
+
+# 同一只基金最多领取的次数，超过后标记为失败，不再分配
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def get_default_worker_id():
+    """
+    生成默认的工作进程标识
+    
+    返回:
+        str: 主机名-进程号
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    基于SQLite的租约式任务队列，线程安全，可由多台机器上的多个进程同时使用
+    
+    每条任务以 (任务名称, 基金代码) 为主键，状态为pending（待领取）、leased（已领取）、
+    done（已完成）或failed（超过最大领取次数）；租约到期的leased任务可被重新领取
+    
+    参数:
+        db_path (str): SQLite文件路径，多台机器共用时应位于共享存储上
+        worker_id (str): 工作进程标识，默认为None表示使用主机名和进程号
+        lease_seconds (float): 租约时长（秒），默认为DEFAULT_LEASE_SECONDS
+        max_attempts (int): 同一只基金最多领取的次数，默认为DEFAULT_MAX_ATTEMPTS
+    """
+    
+    def __init__(self, db_path, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.worker_id = worker_id or get_default_worker_id()
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    task TEXT NOT NULL,
+                    fund_code TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL,
+                    priority REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (task, fund_code)
+                )
+            """)
+            # 早期版本创建的队列没有priority列
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(work_items)")]
+            if 'priority' not in columns:
+                conn.execute("ALTER TABLE work_items ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items (task, status)")
+            # version在每次有任务完成时增加，merged_version记录最近一次合并完成时的version，
+            # 合并租约保证同一时间只有一个进程合并，合并进程异常退出时租约到期后由其他进程重新合并
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_state (
+                    task TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    merged_version INTEGER NOT NULL DEFAULT 0,
+                    merge_worker TEXT,
+                    merge_lease_expires REAL,
+                    merged_at REAL
+                )
+            """)
+            # 各进程共用的抓取状态，按 (状态名称, 键) 逐条写入，不同进程更新不同的键时互不覆盖
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    name TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (name, key)
+                )
+            """)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        打开一个立即加写锁的事务，退出时提交，出现异常时回滚
+        
+        返回:
+            sqlite3.Connection: 数据库连接
+        """
+        # 共享存储上的文件锁可能较慢，每次操作使用独立连接并设置较长的等待时间
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+    
+    def enqueue(self, task_name, fund_codes, priorities=None):
+        """
+        将基金代码加入队列，已存在的任务保持原状态，只更新优先级
+        
+        参数:
+            task_name (str): 任务名称，如'nav', 'position'等
+            fund_codes (list): 基金代码列表
+            priorities (dict): 基金代码到优先级得分的映射，得分高的先被领取，默认为None
+        
+        返回:
+            int: 新加入的任务数
+        """
+        now = time.time()
+        priorities = priorities or {}
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_items (task, fund_code, updated_at, priority) VALUES (?, ?, ?, ?)",
+                [(task_name, code, now, priorities.get(code, 0.0)) for code in fund_codes])
+            added = conn.total_changes - before
+            if priorities:
+                conn.executemany("UPDATE work_items SET priority = ? WHERE task = ? AND fund_code = ?",
+                                 [(priority, task_name, code) for code, priority in priorities.items()])
+            conn.execute("INSERT OR IGNORE INTO task_state (task) VALUES (?)", (task_name,))
+        return added
+    
+    def reset(self, task_name):
+        """
+        将任务的所有基金重新标记为待领取，用于开始新一轮抓取
+        
+        参数:
+            task_name (str): 任务名称
+        """
+        with self.transaction() as conn:
+            conn.execute("""
+                UPDATE work_items SET status = 'pending', worker = NULL, lease_expires = NULL,
+                    attempts = 0, last_error = NULL, updated_at = ?
+                WHERE task = ?
+            """, (time.time(), task_name))
+    
+    def reset_round(self, task_name, started_before):
+        """
+        上一轮抓取已全部结束、且在started_before之后没有进程开始新一轮时，将任务重新标记为待领取；
+        多个常驻进程按同一计划运行时只有第一个进程重置队列，其他进程直接加入这一轮
+        
+        参数:
+            task_name (str): 任务名称
+            started_before (float): 本轮计划开始的时间戳
+        
+        返回:
+            bool: 是否重置了队列
+        """
+        with self.transaction() as conn:
+            unfinished, last_update = conn.execute("""
+                SELECT SUM(status IN ('pending', 'leased')), MAX(updated_at) FROM work_items WHERE task = ?
+            """, (task_name,)).fetchone()
+            if unfinished or last_update is None or last_update >= started_before:
+                return False
+            conn.execute("""
+                UPDATE work_items SET status = 'pending', worker = NULL, lease_expires = NULL,
+                    attempts = 0, last_error = NULL, updated_at = ?
+                WHERE task = ?
+            """, (time.time(), task_name))
+        return True
+    
+    def claim(self, task_name, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        领取一批待处理或租约已到期的基金，领取次数少的优先，其次按优先级从高到低
+        
+        参数:
+            task_name (str): 任务名称
+            batch_size (int): 最多领取的基金数
+        
+        返回:
+            list: 领取到的基金代码列表，没有可领取的任务时为空列表
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            # 租约到期且领取次数已达上限的任务标记为失败
+            conn.execute("""
+                UPDATE work_items SET status = 'failed', worker = NULL, updated_at = ?
+                WHERE task = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, task_name, now, self.max_attempts))
+            rows = conn.execute("""
+                SELECT fund_code FROM work_items
+                WHERE task = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY attempts, priority DESC, fund_code
+                LIMIT ?
+            """, (task_name, now, batch_size)).fetchall()
+            fund_codes = [row[0] for row in rows]
+            conn.executemany("""
+                UPDATE work_items SET status = 'leased', worker = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE task = ? AND fund_code = ?
+            """, [(self.worker_id, now + self.lease_seconds, now, task_name, code) for code in fund_codes])
+        return fund_codes
+    
+    def heartbeat(self, task_name, fund_codes):
+        """
+        为本进程持有的租约续期
+        
+        参数:
+            task_name (str): 任务名称
+            fund_codes (list): 基金代码列表
+        
+        返回:
+            int: 续期成功的租约数，租约已被其他进程领取的基金不会续期
+        """
+        if not fund_codes:
+            return 0
+        now = time.time()
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                UPDATE work_items SET lease_expires = ?, updated_at = ?
+                WHERE task = ? AND fund_code = ? AND status = 'leased' AND worker = ?
+            """, [(now + self.lease_seconds, now, task_name, code, self.worker_id) for code in fund_codes])
+            return conn.total_changes - before
+    
+    def complete(self, task_name, fund_codes):
+        """
+        将本进程持有的基金标记为已完成
+        
+        参数:
+            task_name (str): 任务名称
+            fund_codes (list): 基金代码列表
+        """
+        if not fund_codes:
+            return
+        now = time.time()
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                UPDATE work_items SET status = 'done', worker = NULL, lease_expires = NULL,
+                    last_error = NULL, updated_at = ?
+                WHERE task = ? AND fund_code = ? AND status = 'leased' AND worker = ?
+            """, [(now, task_name, code, self.worker_id) for code in fund_codes])
+            completed = conn.total_changes - before
+            conn.execute("UPDATE task_state SET version = version + ? WHERE task = ?", (completed, task_name))
+    
+    def release(self, task_name, fund_code, error=None):
+        """
+        释放处理失败的基金的租约，使其可被重新领取；领取次数达到上限时标记为失败
+        
+        参数:
+            task_name (str): 任务名称
+            fund_code (str): 基金代码
+            error (Exception): 失败原因，默认为None
+        """
+        with self.transaction() as conn:
+            conn.execute("""
+                UPDATE work_items
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+                WHERE task = ? AND fund_code = ? AND status = 'leased' AND worker = ?
+            """, (self.max_attempts, str(error) if error is not None else None, time.time(),
+                  task_name, fund_code, self.worker_id))
+    
+    def get_counts(self, task_name):
+        """
+        统计任务各状态的基金数
+        
+        参数:
+            task_name (str): 任务名称
+        
+        返回:
+            dict: 状态到基金数的映射
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM work_items WHERE task = ? GROUP BY status",
+                                (task_name,)).fetchall()
+        finally:
+            conn.close()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+    
+    def next_lease_expiry(self, task_name):
+        """
+        获取其他进程持有的租约中最早到期的时间
+        
+        参数:
+            task_name (str): 任务名称
+        
+        返回:
+            float: 到期时间戳，没有进行中的租约时返回None
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            row = conn.execute("SELECT MIN(lease_expires) FROM work_items WHERE task = ? AND status = 'leased'",
+                               (task_name,)).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+    
+    def claim_merge(self, task_name):
+        """
+        所有基金都已处理完时，选出一个进程负责合并数据：自上次合并后有新完成的任务、
+        且没有其他进程持有未到期的合并租约时，第一个调用的进程获得合并租约
+        
+        参数:
+            task_name (str): 任务名称
+        
+        返回:
+            bool: 本进程是否获得了合并租约，获得后需调用finish_merge()
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            unfinished = conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE task = ? AND status IN ('pending', 'leased')",
+                (task_name,)).fetchone()[0]
+            if unfinished:
+                return False
+            before = conn.total_changes
+            conn.execute("""
+                UPDATE task_state SET merge_worker = ?, merge_lease_expires = ?
+                WHERE task = ? AND merged_version < version
+                    AND (merge_lease_expires IS NULL OR merge_lease_expires < ?)
+            """, (self.worker_id, now + self.lease_seconds, task_name, now))
+            return conn.total_changes > before
+    
+    def renew_merge(self, task_name):
+        """
+        为本进程持有的合并租约续期
+        
+        参数:
+            task_name (str): 任务名称
+        """
+        with self.transaction() as conn:
+            conn.execute("""
+                UPDATE task_state SET merge_lease_expires = ?
+                WHERE task = ? AND merge_worker = ? AND merge_lease_expires IS NOT NULL
+            """, (time.time() + self.lease_seconds, task_name, self.worker_id))
+    
+    def finish_merge(self, task_name, success=True):
+        """
+        结束合并并释放合并租约，合并成功时记录本次合并对应的版本
+        
+        参数:
+            task_name (str): 任务名称
+            success (bool): 合并是否成功，失败时其他进程可以立即重新合并
+        """
+        with self.transaction() as conn:
+            if success:
+                conn.execute("""
+                    UPDATE task_state SET merged_version = version, merged_at = ?, merge_lease_expires = NULL
+                    WHERE task = ? AND merge_worker = ?
+                """, (time.time(), task_name, self.worker_id))
+            else:
+                conn.execute("""
+                    UPDATE task_state SET merge_lease_expires = NULL
+                    WHERE task = ? AND merge_worker = ?
+                """, (task_name, self.worker_id))
+    
+    def get_state(self, name, keys=None, include_updated=False):
+        """
+        读取共享状态
+        
+        参数:
+            name (str): 状态名称，如'nav_watermarks'
+            keys (list): 只读取这些键，默认为None表示全部
+            include_updated (bool): 是否同时返回各键的更新时间，默认为False
+        
+        返回:
+            dict: 键到值的映射，include_updated为True时值为 (值, 更新时间戳)
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            if keys is None:
+                rows = conn.execute("SELECT key, value, updated_at FROM shared_state WHERE name = ?", (name,)).fetchall()
+            else:
+                rows = []
+                keys = list(keys)
+                # SQLite单条语句的参数个数有限，分批查询
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    rows.extend(conn.execute(
+                        f"SELECT key, value, updated_at FROM shared_state WHERE name = ? "
+                        f"AND key IN ({', '.join('?' * len(batch))})", [name] + batch).fetchall())
+        finally:
+            conn.close()
+        if include_updated:
+            return {key: (json.loads(value), updated_at) for key, value, updated_at in rows}
+        return {key: json.loads(value) for key, value, _ in rows}
+    
+    def update_state(self, name, items):
+        """
+        按键写入共享状态，只写入给出的键，其他进程写入的键保持不变
+        
+        参数:
+            name (str): 状态名称
+            items (dict): 键到值的映射，值需可序列化为JSON，为None时删除该键
+        """
+        if not items:
+            return
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO shared_state (name, key, value, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (name, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """, [(name, key, json.dumps(value, ensure_ascii=False), now)
+                  for key, value in items.items() if value is not None])
+            conn.executemany("DELETE FROM shared_state WHERE name = ? AND key = ?",
+                             [(name, key) for key, value in items.items() if value is None])
+    
+    @contextmanager
+    def heartbeat_thread(self, name, beat):
+        """
+        在后台线程中每三分之一租约时长调用一次beat，退出时停止
+        
+        参数:
+            name (str): 线程名称
+            beat (callable): 续租函数，失败时只打印错误，租约到期后由其他进程接手
+        """
+        stop = threading.Event()
+        
+        def run():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    beat()
+                except Exception as e:
+                    print(f"任务队列续租失败: {e}")
+        
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+    
+    @contextmanager
+    def keep_alive(self, task_name, fund_codes):
+        """
+        在后台线程中定期为一批基金续租，退出时停止；处理成功的基金应在with块内调用complete，
+        提交前租约一直有效
+        
+        用法:
+            with queue.keep_alive('nav', codes) as active:
+                ...
+                queue.release('nav', code, error)
+                active.discard(code)  # 已释放的基金不再续租
+                ...
+                queue.complete('nav', succeeded)
+        
+        参数:
+            task_name (str): 任务名称
+            fund_codes (list): 基金代码列表
+        
+        返回:
+            set: 仍需续租的基金代码集合，调用方释放一只基金的租约后可将其移除
+        """
+        active = set(fund_codes)
+        with self.heartbeat_thread(f"lease-heartbeat-{task_name}",
+                                   lambda: self.heartbeat(task_name, list(active.copy()))):
+            yield active
+    
+    @contextmanager
+    def merge_lease(self, task_name):
+        """
+        尝试获得合并租约，合并期间在后台续租，正常退出时记录合并完成，出现异常时释放租约
+        
+        用法:
+            with queue.merge_lease('nav') as acquired:
+                if acquired:
+                    ...
+        
+        参数:
+            task_name (str): 任务名称
+        
+        返回:
+            bool: 本进程是否获得了合并租约
+        """
+        if not self.claim_merge(task_name):
+            yield False
+            return
+        
+        try:
+            with self.heartbeat_thread(f"merge-heartbeat-{task_name}", lambda: self.renew_merge(task_name)):
+                yield True
+        except BaseException:
+            self.finish_merge(task_name, success=False)
+            raise
+        self.finish_merge(task_name)